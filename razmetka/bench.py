@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Time each stage of Razmetka's pipeline on a synthetic corpus.
+
+       python -m razmetka.bench --tokens 1000000 --output baseline.json
+       python -m razmetka.bench --tokens 1000000 --baseline baseline.json
+
+   A hand-tagged corpus of any size is generated from the statistics of a
+   real one (uyghurtagger.train by default): its tag trigrams, the words
+   seen with each tag, and how often a word is seen only once. The corpus
+   is then split into folds, loaded, used to train n-gram and Brill
+   taggers, tagged and scored, and each stage is timed, with its
+   throughput and the peak resident memory of the process (and of any
+   tagger processes it runs) while it lasts; a stage that is over in less
+   than a second is run again until that much time has passed, and its
+   fastest run is kept. The unknown-word guessers
+   the backoff chain can sit on (see razmetka.tag.brill.GUESSERS) are
+   each timed tagging the test fold on their own, with their accuracy on
+   all words and on words missing from the training folds, and so is an
+   AveragedPerceptronTagger trained on the same folds. The Stanford
+   tagger's stage runs the stub tagger (razmetka.tag.stub) in its place,
+   so no Java is needed.
+
+   Results are written as JSON. Given a baseline written the same way,
+   every stage whose throughput fell, or whose peak memory grew, by more
+   than the tolerance is reported and the command exits with status 1.
+   Throughputs are compared in proportion to the speed of a fixed piece
+   of Python work timed in each run (see reference_speed()), so that a
+   baseline holds on a slower machine or a busier moment, and stages
+   faster than --min-seconds are too short to time and are left out.
+"""
+
+import argparse
+import bisect
+import codecs
+import collections
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from nltk.tag import brill
+
+from razmetka.tag import ten
+from razmetka.tag.brill import GUESSERS, backoff_chain, guesser_tagger, \
+                                tag_counts
+from razmetka.tag.config import PATH_TO_SAMPLE_FILE
+from razmetka.tag.encoded import EncodedCorpus
+from razmetka.tag.files import TrainingFile
+from razmetka.tag.fused import FusedBackoffTagger
+from razmetka.tag.perceptron import AveragedPerceptronTagger
+from razmetka.tag.pool import TaggerPool, stub_command
+from razmetka.tag.rules import CompiledBrillTagger
+from razmetka.tag.score import FoldScorer
+from razmetka.tag.tbl import IndexedBrillTrainer
+from razmetka.util.memory import PeakSampler, format_bytes
+
+STAGES = ('generate', 'split_groups', 'load', 'guess_suffix',
+          'guess_regexp', 'perceptron_train', 'perceptron_tag',
+          'ngram_train', 'brill_train', 'tag', 'score', 'stanford_tag')
+"""The stages timed by run(), in the order they run."""
+
+_START = u'<s>'
+_END = u'</s>'
+
+class _Choice(object):
+    """Draw items at random in proportion to their counts."""
+
+    def __init__(self, counts):
+        self.items = []
+        self.cumulative = []
+        total = 0
+        for item, count in sorted(counts.iteritems()):
+            total += count
+            self.items.append(item)
+            self.cumulative.append(total)
+        self.total = total
+
+    def draw(self, rnd):
+        return self.items[bisect.bisect_right(self.cumulative,
+                                              rnd.random() * self.total)]
+
+class CorpusModel(object):
+    """Word, tag and tag trigram statistics of a hand-tagged corpus."""
+
+    def __init__(self, file_name, separator='_', encoding='utf-8'):
+        """Read the statistics of a one-sentence-per-line tagged file.
+
+           Parameters
+           ----------
+             file_name (str) : the hand-tagged file
+             separator (basestring) : word/tag separator in the file
+             encoding (str) : encoding of the file
+        """
+        self.separator = separator
+        transitions = collections.defaultdict(collections.Counter)
+        emissions = collections.defaultdict(collections.Counter)
+        with codecs.open(file_name, mode='r', encoding=encoding) as f:
+            for line in f:
+                tokens = [t.rpartition(separator) for t in line.split()]
+                tokens = [(w, t) for w, _, t in tokens if w]
+                if not tokens:
+                    continue
+                previous = (_START, _START)
+                for word, tag in tokens:
+                    transitions[previous][tag] += 1
+                    emissions[tag][word] += 1
+                    previous = (previous[1], tag)
+                transitions[previous][_END] += 1
+
+        self.tokens = sum(sum(c.values()) for c in emissions.itervalues())
+        # share of tokens whose word occurs only once, for each tag: such
+        # words stand for the new words a larger corpus would hold
+        self.new_word_rate = dict(
+                (tag, float(sum(1 for n in c.itervalues() if n == 1)) /
+                 sum(c.values()))
+                for tag, c in emissions.iteritems())
+        self.transitions = dict((k, _Choice(c))
+                                for k, c in transitions.iteritems())
+        self.emissions = dict((k, _Choice(c))
+                              for k, c in emissions.iteritems())
+
+    def sentences(self, tokens, seed=0):
+        """Yield random tagged sentences until about `tokens` are made.
+
+           Tags follow the corpus's tag trigrams. Words are drawn from
+           those seen with each tag, or are new (a known word with a
+           number put in front, so it keeps the word's ending) at the rate
+           of once-seen words in the corpus,
+           falling off with the square root of the size generated so far
+           so that the vocabulary grows as it does in real text.
+
+           Returns
+           -------
+             (generator) : lists of (word, tag) tuples
+        """
+        rnd = random.Random(seed)
+        transitions, emissions = self.transitions, self.emissions
+        made = 0
+        new_words = 0
+        while made < tokens:
+            sentence = []
+            previous = (_START, _START)
+            while True:
+                tag = transitions[previous].draw(rnd)
+                if tag == _END:
+                    break
+                word = emissions[tag].draw(rnd)
+                scale = (float(self.tokens) / max(made, self.tokens)) ** 0.5
+                if rnd.random() < self.new_word_rate[tag] * scale:
+                    new_words += 1
+                    word = u'{}{}'.format(new_words, word)
+                sentence.append((word, tag))
+                previous = (previous[1], tag)
+            made += len(sentence)
+            yield sentence
+
+    def write(self, path, tokens, seed=0, encoding='utf-8'):
+        """Write a synthetic corpus of about `tokens` tokens to a file.
+
+           Returns
+           -------
+             (int) : the number of tokens written
+        """
+        written = 0
+        sep = self.separator
+        with codecs.open(path, mode='w', encoding=encoding) as f:
+            for sentence in self.sentences(tokens, seed=seed):
+                f.write(u' '.join(w + sep + t for w, t in sentence))
+                f.write(u'\n')
+                written += len(sentence)
+        return written
+
+class Benchmark(object):
+    """Time stages and record their throughput and peak memory."""
+
+    def __init__(self, sample_interval=0.01, min_seconds=1.0,
+                 max_repeats=50):
+        """Initialize an empty set of results.
+
+           Parameters
+           ----------
+             sample_interval (float) : seconds between memory samples
+             min_seconds (float) : a stage is run again until it has taken
+               this long in all (see stage())
+             max_repeats (int) : most times a stage is run
+        """
+        self.sample_interval = sample_interval
+        self.min_seconds = min_seconds
+        self.max_repeats = max_repeats
+        self.stages = collections.OrderedDict()
+
+    def stage(self, name, tokens=0, pids=None):
+        """Time the body of a `for` loop as one stage.
+
+           The loop is given the stage's record (a dict), and its body may
+           set the record's 'tokens' once they are known. A stage that is
+           over quickly is run again, until min_seconds have passed (at
+           most max_repeats times), and its fastest run is recorded, so
+           that a stage of a few milliseconds is not timed by one unlucky
+           run:
+
+               for record in bench.stage('tag', tokens=n):
+                   tagged = tagger.tag_sents(sentences)
+
+           Parameters
+           ----------
+             name (str) : the stage's name
+             tokens (int) : number of tokens the stage handles
+             pids (callable) : returns the ids of other processes whose
+               memory counts towards the stage's peak
+        """
+        record = {'tokens': tokens}
+        sampler = PeakSampler(pids=pids, interval=self.sample_interval)
+        sampler.start()
+        best = None
+        total = 0.0
+        repeats = 0
+        try:
+            while True:
+                start = time.time()
+                yield record
+                seconds = time.time() - start
+                best = seconds if best is None else min(best, seconds)
+                total += seconds
+                repeats += 1
+                if (total >= self.min_seconds or
+                        repeats >= self.max_repeats):
+                    break
+        finally:
+            record['peak_rss'] = sampler.stop()
+        record['seconds'] = best
+        record['repeats'] = repeats
+        record['tokens_per_second'] = \
+                record['tokens'] / best if best else None
+        self.stages[name] = record
+
+def _reference_work():
+    """A fixed piece of pure-Python work: counting, splitting, joining."""
+    counts = collections.defaultdict(int)
+    words = u' '.join(u'w{}'.format(i % 997) for i in xrange(20000)).split()
+    for word in words:
+        counts[word[-2:]] += 1
+    return len(counts)
+
+def reference_speed(min_seconds=1.0):
+    """Return how many times a second this machine does _reference_work().
+
+       The best of repeated runs over at least min_seconds. Throughputs
+       measured on different machines, or on one machine at a busier
+       moment, are compared in proportion to it.
+    """
+    best = None
+    total = 0.0
+    while total < min_seconds:
+        start = time.time()
+        _reference_work()
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+        total += seconds
+    return 1.0 / best if best else None
+
+def run(tokens=100000, source=PATH_TO_SAMPLE_FILE, seed=0, max_rules=50,
+        min_score=3, workers=1, skip=(), work_dir=None, verbose=False):
+    """Generate a synthetic corpus and time every stage of the pipeline.
+
+       The synthetic corpus and its fold files (prefixed 'bench_') are
+       written to work_dir.
+
+       Parameters
+       ----------
+         tokens (int) : size of the synthetic corpus
+         source (str) : hand-tagged file whose statistics are used
+         seed (int) : seed for generating and splitting the corpus
+         max_rules (int) : number of Brill rules to learn
+         min_score (int) : minimum score of a Brill rule
+         workers (int) : stub tagger processes run in 'stanford_tag'
+         skip (set) : names of stages to leave out: 'guess' (both
+           guessers), 'perceptron' (training and tagging),
+           'brill_train' (the n-gram chain then tags on its own), 'tag',
+           'score' or 'stanford_tag'
+         work_dir (str) : directory for the corpus and its folds (a
+           temporary one that is removed afterwards if None)
+         verbose (boolean) : print each stage as it finishes
+
+       Returns
+       -------
+         (dict) : the settings and a record of each stage
+    """
+    bench = Benchmark()
+    speed = reference_speed()
+    temporary = work_dir is None
+    if temporary:
+        work_dir = tempfile.mkdtemp(prefix='razmetka-bench-')
+
+    def report(name):
+        if verbose:
+            record = bench.stages[name]
+            print "{:<17}{:>10} tokens {:>8.2f}s {:>12.0f} tokens/s " \
+                  "{:>10} peak".format(name, record['tokens'],
+                                       record['seconds'],
+                                       record['tokens_per_second'] or 0,
+                                       format_bytes(record['peak_rss'])),
+            if record.get('accuracy') is not None:
+                print "  accuracy {:.4f}".format(record['accuracy']),
+                if record.get('unknown_accuracy') is not None:
+                    print "(unknown words {:.4f})".format(
+                            record['unknown_accuracy']),
+            print
+
+    try:
+        corpus_path = os.path.join(work_dir, 'synthetic.train')
+        for record in bench.stage('generate'):
+            record['tokens'] = CorpusModel(source).write(corpus_path, tokens,
+                                                         seed=seed)
+        report('generate')
+
+        training_file = TrainingFile(corpus_path)
+        for record in bench.stage('split_groups'):
+            record['tokens'] = training_file.store.total_tokens()
+            training_file.split_groups(
+                    num_of_groups=10, verbose=False, seed=seed,
+                    manifest_name='bench_folds.json',
+                    test_name='bench_test_', train_name='bench_train_',
+                    dest_dir=work_dir)
+        report('split_groups')
+        train_path = os.path.join(work_dir, 'bench_train_01.train')
+        test_path = os.path.join(work_dir, 'bench_test_01.txt')
+
+        for record in bench.stage('load'):
+            train_corpus = EncodedCorpus.from_file(train_path, lower=True)
+            test_corpus = EncodedCorpus.from_file(test_path, lower=True)
+            record['tokens'] = (train_corpus.token_count() +
+                                test_corpus.token_count())
+        report('load')
+        training_data = list(train_corpus.tagged_sents())
+        train_tokens = train_corpus.token_count()
+        test_tokens = test_corpus.token_count()
+
+        def score_guesses(name, test_data, guessed):
+            known = set(train_corpus.word_vocab.items)
+            correct = unknown = unknown_correct = 0
+            for sentence, tagged in zip(test_data, guessed):
+                for (word, tag), (_, guess) in zip(sentence, tagged):
+                    correct += guess == tag
+                    if word not in known:
+                        unknown += 1
+                        unknown_correct += guess == tag
+            bench.stages[name]['accuracy'] = \
+                    float(correct) / test_tokens if test_tokens else None
+            bench.stages[name]['unknown_accuracy'] = \
+                    float(unknown_correct) / unknown if unknown else None
+
+        if 'guess' not in skip:
+            test_data = list(test_corpus.tagged_sents())
+            for guesser in GUESSERS:
+                name = 'guess_' + guesser
+                guesser_name, tagger = guesser_tagger(training_data,
+                                                      guesser=guesser)
+                for record in bench.stage(name, tokens=test_tokens):
+                    guessed = [tagger.tag([w for w, t in sentence])
+                               for sentence in test_data]
+                score_guesses(name, test_data, guessed)
+                report(name)
+            del test_data, guessed
+
+        if 'perceptron' not in skip:
+            for record in bench.stage('perceptron_train',
+                                      tokens=train_tokens):
+                tagger = AveragedPerceptronTagger(training_data)
+            report('perceptron_train')
+            test_data = list(test_corpus.tagged_sents())
+            for record in bench.stage('perceptron_tag',
+                                      tokens=test_tokens):
+                guessed = [tagger.tag([w for w, t in sentence])
+                           for sentence in test_data]
+            score_guesses('perceptron_tag', test_data, guessed)
+            report('perceptron_tag')
+            del tagger, test_data, guessed
+
+        for record in bench.stage('ngram_train', tokens=train_tokens):
+            ngram_tagger = FusedBackoffTagger(
+                    backoff_chain(training_data)[-1][1])
+        report('ngram_train')
+        tagger = ngram_tagger
+
+        if 'brill_train' not in skip:
+            for record in bench.stage('brill_train', tokens=train_tokens):
+                trainer = IndexedBrillTrainer(initial_tagger=ngram_tagger,
+                                              templates=brill.nltkdemo18())
+                tagger = CompiledBrillTagger.from_brill_tagger(
+                        trainer.train(training_data, max_rules=max_rules,
+                                      min_score=min_score),
+                        tag_counts=tag_counts(training_data))
+            report('brill_train')
+        del training_data
+
+        if 'tag' not in skip:
+            for record in bench.stage('tag', tokens=test_tokens):
+                predicted = [[t for w, t in tagger.tag([w for w, t in s])]
+                             for s in test_corpus.tagged_sents()]
+            report('tag')
+
+            if 'score' not in skip:
+                for record in bench.stage('score', tokens=test_tokens):
+                    scorer = FoldScorer(known_words=set(
+                            train_corpus.word_vocab.items))
+                    for sentence, tags in zip(test_corpus.tagged_sents(),
+                                              predicted):
+                        scorer.add([t for w, t in sentence], tags,
+                                   words=[w for w, t in sentence])
+                    scorer.score()
+                report('score')
+            del predicted
+
+        if 'stanford_tag' not in skip:
+            pool = TaggerPool(train_path, num_workers=workers,
+                              batch_size=1000,
+                              command=stub_command(train_path))
+            pids = lambda: [w.proc.pid for w in pool.workers if w.proc]
+            try:
+                # start the workers first, so that every run of the stage
+                # times the same thing: tagging with warm workers
+                pool.tag_sents([[u'.']] * workers)
+                for record in bench.stage('stanford_tag',
+                                          tokens=test_tokens, pids=pids):
+                    for positions in ten.chunks(range(len(test_corpus)),
+                                                n=10000):
+                        pool.tag_sents(
+                                [[w for w, t in s] for s in
+                                 test_corpus.tagged_sents(positions)])
+            finally:
+                pool.close()
+            report('stanford_tag')
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    # measured before and after, in case the machine was busy at first
+    speed = max(speed, reference_speed())
+
+    return {'tokens': tokens, 'source': os.path.basename(source),
+            'seed': seed, 'max_rules': max_rules, 'min_score': min_score,
+            'workers': workers, 'python': platform.python_version(),
+            'reference_speed': speed, 'stages': bench.stages}
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.05):
+    """Return the regressions of a benchmark against a baseline.
+
+       Parameters
+       ----------
+         results (dict) : as returned by run()
+         baseline (dict) : an earlier result, with the same settings
+         tolerance (float) : fraction by which throughput may fall, or
+           peak memory grow, before it counts as a regression
+         min_seconds (float) : a stage whose fastest run took less than
+           this in both results is too short to time reliably, and only
+           its memory is compared
+
+       The baseline's throughputs are first scaled by the ratio of the two
+       runs' reference_speed(), so a baseline from another machine (or a
+       run on a busier one) is held to what that machine can do.
+
+       Returns
+       -------
+         (list) : a message for each regression (empty if there are none)
+    """
+    for setting in ('tokens', 'source', 'seed', 'max_rules', 'min_score',
+                    'workers'):
+        if results.get(setting) != baseline.get(setting):
+            raise ValueError('the baseline was run with {} = {!r}, not '
+                             '{!r}'.format(setting, baseline.get(setting),
+                                           results.get(setting)))
+    scale = 1.0
+    if results.get('reference_speed') and baseline.get('reference_speed'):
+        scale = results['reference_speed'] / baseline['reference_speed']
+    regressions = []
+    for name, record in results['stages'].iteritems():
+        old = baseline['stages'].get(name)
+        if old is None:
+            continue
+        expected = (old['tokens_per_second'] or 0) * scale
+        if max(record['seconds'], old['seconds']) < min_seconds:
+            expected = None
+        if expected and record['tokens_per_second'] < \
+                expected * (1 - tolerance):
+            regressions.append(
+                    '{}: {:.0f} tokens/s, down from {:.0f} (at this '
+                    'machine\'s speed)'.format(
+                        name, record['tokens_per_second'], expected))
+        if old['peak_rss'] and record['peak_rss'] > \
+                old['peak_rss'] * (1 + tolerance):
+            regressions.append('{}: peak memory {}, up from {}'.format(
+                    name, format_bytes(record['peak_rss']),
+                    format_bytes(old['peak_rss'])))
+    return regressions
+
+def main(argv=None):
+    """Run the benchmark; exit with status 1 if it regressed."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tokens', type=int, default=100000,
+                        help='size of the synthetic corpus')
+    parser.add_argument('--source', default=PATH_TO_SAMPLE_FILE,
+                        help='hand-tagged file to draw statistics from '
+                             '(the sample uyghurtagger.train by default)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-rules', type=int, default=50)
+    parser.add_argument('--min-score', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='stub tagger processes')
+    parser.add_argument('--skip', action='append', default=[],
+                        choices=['guess', 'perceptron', 'brill_train',
+                                 'tag', 'score', 'stanford_tag'],
+                        help='leave out a stage (may be repeated)')
+    parser.add_argument('--work-dir', default=None,
+                        help='keep the synthetic corpus and its folds in '
+                             'this directory')
+    parser.add_argument('--output', default=None,
+                        help='write the results here (JSON)')
+    parser.add_argument('--baseline', default=None,
+                        help='results (JSON) to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown or memory growth')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='compare only the memory of stages faster '
+                             'than this')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(tokens=args.tokens, source=args.source, seed=args.seed,
+                  max_rules=args.max_rules, min_score=args.min_score,
+                  workers=args.workers, skip=set(args.skip),
+                  work_dir=args.work_dir, verbose=not args.quiet)
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print text
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, tolerance=args.tolerance,
+                              min_seconds=args.min_seconds)
+        for message in regressions:
+            sys.stderr.write('REGRESSION {}\n'.format(message))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Command line interface to Razmetka.
+
+       razmetka tag MODEL [FILE ...] > tagged.txt
+
+   tags whitespace-tokenized text, one sentence per line, from the given
+   files (or stdin) with a Brill tagger saved by
+   TTBrillTaggerTrainer.train_tagger() or a Stanford model trained by
+   TaggerTester.
+"""
+
+import argparse
+import sys
+
+from razmetka.tag.brill import load_tagger
+from razmetka.tag.config import PATH_TO_JAR
+from razmetka.tag.model import ModelFile, is_model_file
+from razmetka.tag.pool import TaggerPool, stub_command
+from razmetka.tag.stream import read_sentences, tag_stream, write_tagged
+from razmetka.util.memory import format_bytes
+
+def model_type(path):
+    """Guess whether a model file is a saved Brill tagger or not."""
+    with open(path, 'rb') as f:
+        start = f.read(1)
+    # save_tagger() writes model files, or pickles (protocol 2 or higher)
+    if start == b'\x80' or is_model_file(path):
+        return 'brill'
+    return 'stanford'
+
+def open_tagger(args):
+    """Return the tagger a `tag` command line asks for."""
+    kind = args.model_type
+    if kind == 'auto':
+        kind = model_type(args.model)
+    if kind == 'brill':
+        if not is_model_file(args.model):
+            return load_tagger(args.model)
+        model = ModelFile(args.model)
+        if args.verbose:
+            sys.stderr.write('Loaded {} ({}) in {:.1f} ms; resident memory '
+                             '{}\n'.format(args.model,
+                                           format_bytes(model.size),
+                                           1000 * model.load_seconds,
+                                           format_bytes(model.rss)))
+        return model.tagger
+    command = None
+    if kind == 'stub':
+        command = stub_command(args.model, separator=args.separator)
+    return TaggerPool(args.model, num_workers=args.workers,
+                      batch_size=args.batch_size, separator=args.separator,
+                      jar_path=args.jar, heap_size=args.heap_size,
+                      encoding=args.encoding, command=command)
+
+def open_inputs(files):
+    """Yield each input file ('-' for stdin) open, closing it after use.
+
+       Only one file is open at a time; stdin is yielded if there are no
+       files.
+    """
+    if not files:
+        yield sys.stdin
+    for path in files:
+        if path == '-':
+            yield sys.stdin
+        else:
+            with open(path, 'rb') as f:
+                yield f
+
+def tag(args):
+    """Tag the input files (or stdin) and write to stdout."""
+    tagger = open_tagger(args)
+    streams = open_inputs(args.files)
+    try:
+        tagged = tag_stream(tagger, read_sentences(streams, args.encoding),
+                            batch_size=args.batch_size,
+                            processes=args.processes)
+        write_tagged(tagged, sys.stdout, separator=args.separator,
+                     encoding=args.encoding, flush_every=args.batch_size)
+    finally:
+        # closes the file being read, if tagging stopped partway
+        streams.close()
+        if isinstance(tagger, TaggerPool):
+            tagger.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='razmetka',
+                                     description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command')
+
+    tag_parser = commands.add_parser(
+            'tag', help='tag text, one whitespace-tokenized sentence '
+            'per line')
+    tag_parser.add_argument('model', help='saved Brill tagger or Stanford '
+                            'tagger model')
+    tag_parser.add_argument('files', nargs='*', help="input files ('-' "
+                            "for stdin); stdin if none are given")
+    tag_parser.add_argument('--model-type', default='auto',
+                            choices=['auto', 'brill', 'stanford', 'stub'])
+    tag_parser.add_argument('--separator', default='_',
+                            help='written between each word and its tag')
+    tag_parser.add_argument('--encoding', default='utf-8')
+    tag_parser.add_argument('--batch-size', type=int, default=1000,
+                            help='sentences tagged (and held) at once')
+    tag_parser.add_argument('--processes', type=int, default=1,
+                            help='processes tagging with a Brill tagger')
+    tag_parser.add_argument('--workers', type=int, default=1,
+                            help='Stanford tagger processes to run')
+    tag_parser.add_argument('--heap-size', default='-mx1g',
+                            help='Java heap option for each worker')
+    tag_parser.add_argument('--jar', default=PATH_TO_JAR,
+                            help='path to stanford-postagger.jar')
+    tag_parser.add_argument('--verbose', action='store_true',
+                            help='report model load time and memory use')
+    tag_parser.set_defaults(function=tag)
+
+    args = parser.parse_args(argv)
+    args.function(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-__all__ = ['MODEL_DIR_NAME', 'PATH_TO_MODEL_DIR']
+__all__ = ['MODEL_DIR_NAME', 'PATH_TO_MODEL_DIR', 'MorphModel', 'Segmenter',
+           'SegmenterStats', 'load_model']
 
 __version__ = '0.0.1'
 __author__ = 'Matt Menzenski'
@@ -11,3 +12,4 @@ def get_version():
     return __version__
 
 from .config import MODEL_DIR_NAME, PATH_TO_MODEL_DIR
+from .morph import MorphModel, Segmenter, SegmenterStats, load_model
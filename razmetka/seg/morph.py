@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Segment words into morphs with a Morfessor Baseline model.
+
+   A model is read from a Morfessor segmentation file (as written by
+   `morfessor-train -S model.segm`, one "count morph + morph ..." line per
+   training word) in the model directory, and words are segmented by
+   Viterbi decoding: the cheapest split of a word into morphs, where a
+   known morph costs -log of its share of all morph tokens and an unknown
+   one costs as much as a morph seen once plus the code length of its
+   letters. Binary Morfessor models can be used too if the morfessor
+   package is installed.
+
+   Uyghur text is heavily Zipfian, so a Segmenter remembers the
+   segmentations of recent word types in a bounded LRU cache and, given a
+   batch of sentences, decodes each distinct word of the batch only once:
+
+       segmenter = Segmenter.load('uyghur.segm')
+       for sentence in segmenter.segment_stream(sentences):
+           ...
+       print segmenter.stats().hit_rate
+"""
+
+import codecs
+import collections
+import math
+import os
+import time
+
+try:
+    import morfessor
+except ImportError:
+    morfessor = None
+
+from razmetka.util import trace
+
+from .config import PATH_TO_MODEL_DIR
+
+SegmenterStats = collections.namedtuple('SegmenterStats', [
+    'tokens', 'types', 'hits', 'misses', 'seconds', 'tokens_per_second',
+    'hit_rate', 'cached'])
+"""How much a Segmenter has done, and how much its cache saved.
+
+   tokens (int) : words segmented
+   types (int) : distinct words looked up (once per batch)
+   hits (int) : lookups answered from the cache
+   misses (int) : lookups decoded with the model
+   seconds (float) : time spent segmenting
+   tokens_per_second (float) : tokens / seconds
+   hit_rate (float) : hits / (hits + misses)
+   cached (int) : segmentations in the cache now
+"""
+
+class MorphModel(object):
+    """Morph counts of a Morfessor Baseline model, for Viterbi decoding."""
+
+    def __init__(self, counts, add_count=1.0, max_length=30):
+        """Initialize the model.
+
+           Parameters
+           ----------
+             counts (dict) : morph: number of times it occurs in the
+               segmented training words
+             add_count (float) : pseudo-count of an unknown morph
+             max_length (int) : length of the longest morph tried
+        """
+        self.counts = dict(counts)
+        self.add_count = add_count
+        self.max_length = max_length
+        tokens = sum(self.counts.itervalues())
+        letters = set(letter for morph in self.counts for letter in morph)
+        log_tokens = math.log(tokens + add_count) if tokens else 0.0
+        # the cost of each known morph, and of each letter of an unknown
+        # one (on top of the cost of a morph seen add_count times)
+        self.costs = dict((morph, log_tokens - math.log(count))
+                          for morph, count in self.counts.iteritems()
+                          if count > 0)
+        self.unknown_cost = log_tokens - math.log(add_count)
+        self.letter_cost = math.log(len(letters) + 1)
+
+    @classmethod
+    def from_segmentation_file(cls, path, encoding='utf-8', separator=' + ',
+                               **kwargs):
+        """Read a Morfessor segmentation file ("count morph + morph ...").
+
+           Lines starting with '#' are comments; a line without a count
+           counts once.
+        """
+        counts = collections.Counter()
+        with codecs.open(path, mode='r', encoding=encoding) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                count, _, analysis = line.partition(' ')
+                try:
+                    count = int(count)
+                except ValueError:
+                    count, analysis = 1, line
+                for morph in analysis.split(separator):
+                    morph = morph.strip()
+                    if morph:
+                        counts[morph] += count
+        return cls(counts, **kwargs)
+
+    def viterbi(self, word):
+        """Return the cheapest segmentation of a word and its cost.
+
+           Returns
+           -------
+             (tuple) : (list of morphs, cost)
+        """
+        length = len(word)
+        if not length:
+            return [], 0.0
+        costs = self.costs
+        max_length = self.max_length
+        unknown_cost, letter_cost = self.unknown_cost, self.letter_cost
+        # best[t] is (cost, start of the last morph) of word[:t]
+        best = [(0.0, None)]
+        for t in xrange(1, length + 1):
+            best_cost = best_start = None
+            for start in xrange(max(0, t - max_length), t):
+                cost = best[start][0]
+                morph_cost = costs.get(word[start:t])
+                if morph_cost is None:
+                    morph_cost = unknown_cost + (t - start) * letter_cost
+                cost += morph_cost
+                if best_cost is None or cost < best_cost:
+                    best_cost, best_start = cost, start
+            best.append((best_cost, best_start))
+        morphs = []
+        t = length
+        while t > 0:
+            start = best[t][1]
+            morphs.append(word[start:t])
+            t = start
+        morphs.reverse()
+        return morphs, best[length][0]
+
+    def segment(self, word):
+        """Return the morphs of a word."""
+        return self.viterbi(word)[0]
+
+class MorfessorModel(object):
+    """A binary Morfessor model, decoded by Morfessor's own Viterbi."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def segment(self, word):
+        return self.model.viterbi_segment(word)[0]
+
+def load_model(path, encoding='utf-8'):
+    """Load a model from a segmentation file, or a binary Morfessor model.
+
+       Parameters
+       ----------
+         path (str) : the model file; a bare name is looked for in the
+           model directory (PATH_TO_MODEL_DIR)
+    """
+    if not os.path.exists(path):
+        path = os.path.join(PATH_TO_MODEL_DIR, path)
+    with open(path, 'rb') as f:
+        start = f.read(1)
+    # binary models are pickles (protocol 2 or higher)
+    if start != b'\x80':
+        return MorphModel.from_segmentation_file(path, encoding=encoding)
+    if morfessor is None:
+        raise ValueError('{} is a binary Morfessor model; install '
+                         'morfessor to use it'.format(path))
+    return MorfessorModel(morfessor.MorfessorIO().read_binary_model_file(
+            path))
+
+class Segmenter(object):
+    """Segment words with a model, remembering recent word types."""
+
+    def __init__(self, model, cache_size=100000):
+        """Initialize the segmenter.
+
+           Parameters
+           ----------
+             model (MorphModel) : anything with a segment(word) method
+             cache_size (int) : number of word types whose segmentation
+               is remembered; the least recently used are forgotten first
+        """
+        self.model = model
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.tokens = 0
+        self.types = 0
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def load(cls, path, cache_size=100000, encoding='utf-8'):
+        """Return a Segmenter for a model file (see load_model())."""
+        return cls(load_model(path, encoding=encoding),
+                   cache_size=cache_size)
+
+    def _lookup(self, word):
+        """Return the segmentation of a word type, from the cache if there."""
+        cache = self.cache
+        if self.cache_size <= 0:
+            self.misses += 1
+            return tuple(self.model.segment(word))
+        try:
+            morphs = cache.pop(word)
+            self.hits += 1
+        except KeyError:
+            morphs = tuple(self.model.segment(word))
+            self.misses += 1
+            if 0 < self.cache_size <= len(cache):
+                cache.popitem(last=False)
+        cache[word] = morphs
+        return morphs
+
+    def segment(self, word):
+        """Return the morphs of a word (a tuple)."""
+        start = time.time()
+        morphs = self._lookup(word)
+        self.tokens += 1
+        self.types += 1
+        self.seconds += time.time() - start
+        return morphs
+
+    def segment_sents(self, sentences):
+        """Segment a batch of sentences (lists of words).
+
+           Each distinct word of the batch is looked up once.
+
+           Returns
+           -------
+             (list) : for each sentence, a list of tuples of morphs
+        """
+        with trace.span('seg.batch') as span:
+            start = time.time()
+            hits = self.hits
+            sentences = list(sentences)
+            batch = {}
+            for sentence in sentences:
+                for word in sentence:
+                    if word not in batch:
+                        batch[word] = None
+            for word in batch:
+                batch[word] = self._lookup(word)
+            segmented = [[batch[word] for word in sentence]
+                         for sentence in sentences]
+            tokens = sum(len(sentence) for sentence in sentences)
+            self.tokens += tokens
+            self.types += len(batch)
+            self.seconds += time.time() - start
+            span.set(tokens=tokens, types=len(batch),
+                     hits=self.hits - hits)
+        return segmented
+
+    def segment_stream(self, sentences, batch_size=10000):
+        """Segment any number of sentences, a batch at a time.
+
+           Returns
+           -------
+             (generator) : for each sentence, a list of tuples of morphs
+        """
+        batch = []
+        for sentence in sentences:
+            batch.append(sentence)
+            if len(batch) >= batch_size:
+                for segmented in self.segment_sents(batch):
+                    yield segmented
+                batch = []
+        if batch:
+            for segmented in self.segment_sents(batch):
+                yield segmented
+
+    def stats(self):
+        """Return a SegmenterStats of everything segmented so far."""
+        lookups = self.hits + self.misses
+        return SegmenterStats(
+                tokens=self.tokens, types=self.types, hits=self.hits,
+                misses=self.misses, seconds=self.seconds,
+                tokens_per_second=self.tokens / self.seconds
+                                  if self.seconds else None,
+                hit_rate=float(self.hits) / lookups if lookups else 0.0,
+                cached=len(self.cache))
+
+    def clear(self):
+        """Forget every cached segmentation (the stats are kept)."""
+        self.cache.clear()
@@ -5,7 +5,13 @@
 __all__ = ['DATA_DIR_NAME', 'PATH_TO_DATA_DIR', 'PATH_TO_JAR',
            'TrainingFile', 'TestingOutputFile', 'FilePair',
            'TaggerTester', 'SentencePair', 'repeat_tagger_tests',
-           'train_tagger', 'TTBrillTaggerTrainer', 'TTTaggedCorpusReader']
+           'train_tagger', 'TTBrillTaggerTrainer', 'TTTaggedCorpusReader',
+           'TaggerPool', 'TaggerWorkerError', 'get_pool', 'EncodedCorpus',
+           'IndexedBrillTrainer', 'FoldScorer', 'load_model',
+           'save_model', 'FusedBackoffTagger', 'IncrementalBackoffChain',
+           'ModelCache', 'SuffixTagger', 'AveragedPerceptronTagger',
+           'TaggerBackend', 'StanfordBackend', 'PerceptronBackend',
+           'HeapManager', 'TrainingError']
 
 __version__ = '0.0.1'
 __author__ = 'Matthew Menzenski'
@@ -14,9 +20,21 @@ __author_email__ = 'menzenski@ku.edu'
 def get_version():
     return __version__
 
+from .backends import TaggerBackend, StanfordBackend, PerceptronBackend
 from .brill import TTBrillTaggerTrainer
 from .config import DATA_DIR_NAME, PATH_TO_DATA_DIR, PATH_TO_JAR
+from .curve import IncrementalBackoffChain
+from .encoded import EncodedCorpus
 from .files import TrainingFile, TestingOutputFile, TTTaggedCorpusReader
+from .fused import FusedBackoffTagger
+from .heap import HeapManager
+from .model import load_model, save_model
+from .perceptron import AveragedPerceptronTagger
+from .modelcache import ModelCache
+from .pool import TaggerPool, TaggerWorkerError, get_pool
+from .score import FoldScorer
+from .suffix import SuffixTagger
 from .tag import FilePair
+from .tbl import IndexedBrillTrainer
 from .testing import TaggerTester, SentencePair, repeat_tagger_tests
-from .train import train_tagger
+from .train import TrainingError, train_tagger
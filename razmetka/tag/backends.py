@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Train and run the taggers a TaggerTester cross-validates.
+
+   A backend turns one fold of a TaggerTester's split into a trained
+   tagger with a tag_sents() method, which the tester scores on the fold's
+   test file, and says how much memory a fold needs so the FoldScheduler
+   can run folds side by side. The Stanford backend trains a MaxentTagger
+   in Java from a props file, with a heap sized for the fold by a
+   HeapManager; the perceptron backend trains an
+   AveragedPerceptronTagger in this process, with no files and no Java.
+"""
+
+import contextlib
+import os
+
+from nltk.tag.stanford import StanfordPOSTagger
+
+from razmetka.util import trace
+
+from .config import PATH_TO_DATA_DIR, PATH_TO_JAR
+from .heap import HeapManager, fold_stats
+from .perceptron import FEATURE_BITS, ITERATIONS, AveragedPerceptronTagger
+from .pool import TaggerPool
+from .schedule import JVM_OVERHEAD, heap_bytes
+from .tag import FilePair
+from .train import TrainingError
+
+def _fold_names(tester, n):
+    """Return the names of fold n's test, training and model files."""
+    str_idx = str(n).rjust(2, '0')
+    return ('{}{}.txt'.format(tester.test_name, str_idx),
+            '{}{}.train'.format(tester.train_name, str_idx),
+            '{}{}.model'.format(tester.model_name, str_idx))
+
+class TaggerBackend(object):
+    """How a TaggerTester trains and runs the tagger of a fold."""
+
+    name = None
+
+    def fold_memory(self, tester, n, heap_size=None, workers=None):
+        """Return the memory (in bytes) fold n claims while it runs.
+
+           The parameters are those of tagger().
+        """
+        raise NotImplementedError
+
+    def tagger(self, tester, n, heap_size=None, workers=None):
+        """Return a context manager giving fold n's trained tagger.
+
+           Parameters
+           ----------
+             tester (TaggerTester) : the tester whose split is used
+             n (int) : the fold, numbered from 1
+             heap_size (str) : Java heap option for training (sized for
+               the fold if None)
+             workers (int) : number of warm tagger processes to tag with
+        """
+        raise NotImplementedError
+
+class StanfordBackend(TaggerBackend):
+    """Train Stanford MaxentTagger models with the tester's trainer.
+
+       Models are trained from the fold's props file by tester.trainer
+       (through tester.model_cache, if it has one), with a heap chosen by
+       the backend's HeapManager from the fold's training file and raised
+       if the JVM runs out of memory; the test file is tagged by a
+       StanfordPOSTagger or a TaggerPool. A fold whose training fails
+       raises a TrainingError.
+    """
+
+    name = 'stanford'
+
+    def __init__(self, heap_manager=None, arch='generic'):
+        """Initialize the backend.
+
+           Parameters
+           ----------
+             heap_manager (HeapManager) : sizes the training heap (a
+               HeapManager() with the default history file if None)
+             arch (str) : the feature architecture of the props files
+        """
+        if heap_manager is None:
+            heap_manager = HeapManager()
+        self.heap_manager = heap_manager
+        self.arch = arch
+        # training file path: ((size, mtime), FoldStats)
+        self._stats = {}
+
+    def fold_stats(self, tester, n):
+        """Return the FoldStats of fold n's training file."""
+        train_path = os.path.join(PATH_TO_DATA_DIR, _fold_names(tester, n)[1])
+        stat = os.stat(train_path)
+        version = (stat.st_size, stat.st_mtime)
+        cached = self._stats.get(train_path)
+        if cached is None or cached[0] != version:
+            cached = (version, fold_stats(train_path, separator=tester.sep,
+                                          encoding=tester.encoding,
+                                          arch=self.arch))
+            self._stats[train_path] = cached
+        return cached[1]
+
+    def fold_memory(self, tester, n, heap_size=None, workers=None):
+        memory = self.heap_manager.fold_memory(self.fold_stats(tester, n),
+                                               heap_size=heap_size)
+        if workers is not None:
+            # the training JVM has exited before the pool starts, so a
+            # fold needs whichever of the two is bigger, not both
+            memory = max(memory,
+                         workers * (heap_bytes('-mx1g') + JVM_OVERHEAD))
+        return memory
+
+    @contextlib.contextmanager
+    def tagger(self, tester, n, heap_size=None, workers=None):
+        test_file, train_file, model_file = _fold_names(tester, n)
+        fp = FilePair(idx=n, testfile=test_file, trainfile=train_file,
+                      separator=tester.sep, props=tester.props_name)
+        with trace.span('tester.write_props', fold=n):
+            fp.write_props(arch=self.arch)
+
+        model_path = os.path.join(PATH_TO_DATA_DIR, model_file)
+        stats = self.fold_stats(tester, n)
+        runs = []
+
+        def train():
+            runs.append(self.heap_manager.train(
+                    stats, lambda heap: tester.trainer(
+                        props_file=fp.props_name, heap_size=heap),
+                    heap_size=heap_size))
+            return runs[-1].returncode
+
+        if tester.model_cache is None:
+            train()
+        else:
+            tester.model_cache.train(os.path.join(PATH_TO_DATA_DIR,
+                                                  train_file),
+                                     fp.props_params, model_path, train)
+        if runs and runs[-1].returncode:
+            run = runs[-1]
+            raise TrainingError(
+                    'training fold {} failed with exit status {} ({}{})'
+                    .format(n, run.returncode, run.heap_size,
+                            ', out of memory' if run.out_of_memory else ''))
+        if workers is None:
+            yield StanfordPOSTagger(model_path, PATH_TO_JAR)
+        else:
+            with TaggerPool(model_path, num_workers=workers,
+                            separator=tester.sep) as pool:
+                yield pool
+
+class PerceptronBackend(TaggerBackend):
+    """Train an AveragedPerceptronTagger in-process for each fold.
+
+       The training sentences come straight from the tester's split (see
+       TaggerTester.fold_training_sentences()); nothing is written to disk
+       and no Java is needed. Folds share one process, so running them in
+       parallel saves little time.
+    """
+
+    name = 'perceptron'
+
+    fold_overhead = 256 * 1024 ** 2
+    """Memory (in bytes) a fold is assumed to need, whatever its size."""
+
+    def __init__(self, iterations=ITERATIONS, feature_bits=FEATURE_BITS,
+                 seed=0):
+        """Initialize the backend.
+
+           Parameters
+           ----------
+             iterations, feature_bits, seed : passed on to each fold's
+               AveragedPerceptronTagger
+        """
+        self.iterations = iterations
+        self.feature_bits = feature_bits
+        self.seed = seed
+
+    def fold_memory(self, tester, n, heap_size=None, workers=None):
+        return self.fold_overhead
+
+    @contextlib.contextmanager
+    def tagger(self, tester, n, heap_size=None, workers=None):
+        with trace.span('tester.read_train', fold=n) as span:
+            sentences = tester.fold_training_sentences(n)
+            span.set(sentences=len(sentences))
+        yield AveragedPerceptronTagger(
+                sentences, iterations=self.iterations,
+                feature_bits=self.feature_bits, seed=self.seed)
+
+BACKENDS = {'stanford': StanfordBackend, 'perceptron': PerceptronBackend}
+"""Backends a TaggerTester can use, by name."""
+
+def get_backend(backend):
+    """Return a TaggerBackend, given one or the name of one in BACKENDS."""
+    if isinstance(backend, TaggerBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend {!r} (expected one of {})'.format(
+                backend, ', '.join(sorted(BACKENDS))))
+    return BACKENDS[backend]()
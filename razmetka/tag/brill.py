@@ -3,115 +3,606 @@
 
 """Brill Tagger classes."""
 
+import array
 import codecs
+import collections
+import cPickle as pickle
+import hashlib
+import itertools
+import multiprocessing
 import os
 import random
+import sys
+import tempfile
+import time
 
 from nltk.tag import brill
+from nltk.tag.api import TaggerI
 from nltk.tag.brill_trainer import BrillTaggerTrainer
 from nltk.tag.sequential import RegexpTagger, UnigramTagger, BigramTagger, \
                                 TrigramTagger
+from nltk.tag.util import untag
+
+from razmetka.util import trace
+from razmetka.util.cache import DiskCache
 
 from . import ten
-from .config import DATA_DIR_NAME
+from .config import DATA_DIR_NAME, PATH_TO_CACHE_DIR
+from .curve import IncrementalBackoffChain, LearningCurvePoint, accuracy
 from .files import to_unicode_or_bust as tuob
-from .files import TTTaggedCorpusReader
+from .fused import FusedBackoffTagger
+from .encoded import EncodedCorpus
+from .model import LowercasingTagger, is_model_file, load_model, save_model
+from .rules import CompiledBrillTagger
+from .suffix import SUFFIX_LENGTH, SuffixCounts, SuffixTagger
+from .tbl import IndexedBrillTrainer
+
+PATH_TO_BASELINE_CACHE = os.path.join(PATH_TO_CACHE_DIR, 'baseline')
+"""Default directory for cached backoff chains."""
+
+BRILL_ENGINES = {'indexed': IndexedBrillTrainer,
+                 'nltk': BrillTaggerTrainer}
+"""Rule learners TTBrillTaggerTrainer can use, by name."""
+
+BrillFoldResult = collections.namedtuple('BrillFoldResult', [
+    'fold', 'baseline_accuracy', 'accuracy', 'rules', 'seconds'])
+"""Outcome of training and testing a Brill tagger on one split.
+
+   fold (int) : 0 for the initial split, 1..n for the folds
+   baseline_accuracy (list) : (name, accuracy) for each backoff tagger
+   accuracy (float) : accuracy of the Brill tagger on the test data
+   rules (int) : number of rules the Brill tagger learned
+   seconds (float) : wall time spent on the split
+"""
+
+BACKOFF_PATTERNS = [
+    (r'^-?[0-9]+(.[0-9]+)?$', 'PUNCT'),
+    (r'.*', 'N')
+    ]
+"""Patterns of the regular expression guesser ('regexp')."""
+
+GUESSERS = ('suffix', 'regexp')
+"""Unknown-word guessers the bottom of the backoff chain can be: a
+   SuffixTagger learned from the training data, or the regular expression
+   tagger of BACKOFF_PATTERNS."""
+
+BACKOFF_CHAIN_VERSION = 2
+"""Bump whenever backoff_chain() changes, to invalidate cached chains."""
+
+def guesser_tagger(training_data, guesser='suffix'):
+    """Return (name, tagger) for the bottom of the backoff chain."""
+    if guesser == 'suffix':
+        return 'Suffix', SuffixTagger(train=training_data,
+                                      max_length=SUFFIX_LENGTH)
+    if guesser == 'regexp':
+        return 'Regular expression', RegexpTagger(BACKOFF_PATTERNS)
+    raise ValueError('unknown guesser {!r} (expected one of {})'.format(
+            guesser, ', '.join(GUESSERS)))
+
+def backoff_chain(training_data, guesser='suffix'):
+    """Train the Guesser -> Unigram -> Bigram -> Trigram backoff chain.
+
+       Returns a list of (name, tagger) pairs, from the bottom of the
+       chain to the top; the last tagger is the Brill initial tagger.
+
+       Parameters
+       ----------
+         training_data (list) : tagged sentences
+         guesser (str) : the unknown-word guesser at the bottom, one of
+           GUESSERS
+    """
+    tokens = None
+    if trace.enabled():
+        tokens = sum(len(sentence) for sentence in training_data)
+    with trace.span('brill.backoff', level=guesser, tokens=tokens):
+        chain = [guesser_tagger(training_data, guesser)]
+    for name, tagger_class in [('Unigram', UnigramTagger),
+                               ('Bigram', BigramTagger),
+                               ('Trigram', TrigramTagger)]:
+        with trace.span('brill.backoff', level=name, tokens=tokens):
+            chain.append((name, tagger_class(train=training_data,
+                                             backoff=chain[-1][1])))
+    return chain
+
+def baseline_key(training_data, guesser='suffix'):
+    """Return a digest of a split's training data and the chain config."""
+    digest = hashlib.sha1()
+    digest.update('{}\n{}\n{!r}\n{}\n'.format(
+            BACKOFF_CHAIN_VERSION, guesser, BACKOFF_PATTERNS, SUFFIX_LENGTH))
+    for sentence in training_data:
+        for word, tag in sentence:
+            digest.update(u'{}\x1f{}\x1e'.format(word, tag).encode('utf-8'))
+        digest.update('\n')
+    return digest.hexdigest()
+
+def tag_counts(tagged_sents):
+    """Return a Counter of the tags in a list of tagged sentences."""
+    return collections.Counter(t for sentence in tagged_sents
+                               for w, t in sentence)
+
+def cached_backoff_chain(training_data, cache=None, guesser='suffix'):
+    """Return backoff_chain(training_data), reusing it from cache if there.
+
+       Parameters
+       ----------
+         training_data (list) : tagged sentences to train the chain on
+         cache (DiskCache) : where trained chains are kept, keyed by
+           baseline_key(); if None, the chain is always trained
+         guesser (str) : the unknown-word guesser, one of GUESSERS
+    """
+    if cache is None:
+        return backoff_chain(training_data, guesser=guesser)
+    with trace.span('brill.chain_cache') as span:
+        key = baseline_key(training_data, guesser=guesser)
+        chain = cache.get(key)
+        span.set(hit=chain is not None)
+    if chain is None:
+        chain = backoff_chain(training_data, guesser=guesser)
+        cache.put(key, chain)
+    return chain
+
+TEMPLATE_SETS = [('nltkdemo18', brill.nltkdemo18),
+                 ('nltkdemo18plus', brill.nltkdemo18plus),
+                 ('brill24', brill.brill24),
+                 ('fntbl37', brill.fntbl37)]
+"""(name, factory) for the template sets compare_templates() tries."""
+
+class MemoTagger(TaggerI):
+    """A tagger answering from tags computed once for known sentences.
+
+       Used as the Brill initial tagger when several template sets are
+       trained on the same split, so the backoff chain tags each sentence
+       only once. Unknown sentences are passed on to the wrapped tagger.
+    """
+
+    def __init__(self, tagger, sentences=()):
+        """Tag the given (untagged) sentences and remember the result."""
+        self.tagger = tagger
+        self.memo = {}
+        for tokens in sentences:
+            key = tuple(tokens)
+            if key not in self.memo:
+                self.memo[key] = tuple(t for w, t in tagger.tag(tokens))
+
+    def tag(self, tokens):
+        tags = self.memo.get(tuple(tokens))
+        if tags is None:
+            return self.tagger.tag(tokens)
+        return zip(tokens, tags)
+
+def save_tagger(tagger, path):
+    """Write a tagger (e.g., from TTBrillTaggerTrainer.train_tagger).
+
+       Taggers built from n-gram, regular expression and Brill taggers are
+       written as model files (see razmetka.tag.model), which load almost
+       instantly; any other tagger is pickled.
+    """
+    try:
+        save_model(tagger, path)
+    except ValueError:
+        with open(path, 'wb') as f:
+            pickle.dump(tagger, f, pickle.HIGHEST_PROTOCOL)
+
+def load_tagger(path):
+    """Read a tagger written by save_tagger()."""
+    if is_model_file(path):
+        return load_model(path).tagger
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+# corpus, splits and initial taggers shared with pool workers: set in the
+# parent before the pool forks (so they are shared copy-on-write, never
+# pickled), or handed once to each worker where fork isn't available
+_SHARED = {}
+
+def _init_worker(corpus_path=None, shared=None):
+    """Load the shared corpus in a worker process that wasn't forked."""
+    if corpus_path is not None:
+        _SHARED.update(shared)
+        _SHARED['corpus'] = EncodedCorpus.load(corpus_path)
+
+def _imap_shared(function, jobs, processes, corpus, **shared):
+    """Yield function(job) for each job, sharing corpus and data with it.
+
+       With processes > 1 the jobs run in a multiprocessing pool and the
+       results are yielded in job order as they become available.
+    """
+    _SHARED.update(shared)
+    _SHARED['corpus'] = corpus
+    pool = None
+    corpus_path = None
+    try:
+        if processes > 1 and len(jobs) > 1:
+            initargs = ()
+            if sys.platform == 'win32':
+                # no fork: each worker loads the corpus once from disk
+                handle, corpus_path = tempfile.mkstemp(suffix='.enc')
+                os.close(handle)
+                corpus.save(corpus_path)
+                initargs = (corpus_path, shared)
+            pool = multiprocessing.Pool(
+                    processes=min(processes, len(jobs)),
+                    initializer=_init_worker, initargs=initargs)
+            for result in pool.imap(function, jobs):
+                yield result
+            pool.close()
+        else:
+            for job in jobs:
+                yield function(job)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if corpus_path is not None:
+            os.remove(corpus_path)
+        _SHARED.clear()
+
+def _train_fold(job):
+    """Train and test a Brill tagger on one shared split (pool task)."""
+    fold, templates, max_rules, min_score, cache_dir, cache_size, \
+        engine, guesser = job
+    train_positions, test_positions = _SHARED['splits'][fold]
+    cache = None
+    if cache_dir is not None:
+        cache = DiskCache(cache_dir, max_bytes=cache_size)
+    return train_fold(_SHARED['corpus'], fold, train_positions,
+                      test_positions, templates, max_rules=max_rules,
+                      min_score=min_score, cache=cache, engine=engine,
+                      guesser=guesser)
+
+def _learn_rules(job):
+    """Train one template set on one shared, pre-tagged split (pool task)."""
+    name, templates, fold, max_rules, min_score, engine = job
+    train_positions, test_positions = _SHARED['splits'][fold]
+    return name, train_fold(_SHARED['corpus'], fold, train_positions,
+                            test_positions, templates, max_rules=max_rules,
+                            min_score=min_score,
+                            baseline=_SHARED['baselines'][fold],
+                            engine=engine)
+
+def train_fold(corpus, fold, train_positions, test_positions, templates,
+               max_rules=300, min_score=3, cache=None, baseline=None,
+               engine='indexed', guesser='suffix'):
+    """Train and test a Brill tagger on one split of an EncodedCorpus.
+
+       The split's backoff chain comes from cache when one was already
+       trained on exactly the same sentences.
+
+       Parameters
+       ----------
+         baseline (tuple) : (baseline_accuracy, initial_tagger) already
+           worked out for this split; if given, no chain is trained
+         engine (str) : 'indexed' to learn rules with IndexedBrillTrainer,
+           'nltk' to use NLTK's BrillTaggerTrainer
+         guesser (str) : the unknown-word guesser, one of GUESSERS
+
+       Returns
+       -------
+         (BrillFoldResult) : accuracies, rule count and timing of the split
+    """
+    start = time.time()
+    with trace.span('brill.fold', fold=fold) as fold_span:
+        training_data = list(corpus.tagged_sents(train_positions))
+        test_data = corpus.tagged_sents(test_positions)
+
+        if baseline is None:
+            chain = cached_backoff_chain(training_data, cache=cache,
+                                         guesser=guesser)
+            with trace.span('brill.baseline', fold=fold):
+                baseline = (
+                        [(name, FusedBackoffTagger(tagger).evaluate(test_data))
+                         for name, tagger in chain],
+                        FusedBackoffTagger(chain[-1][1]))
+        baseline_accuracy, initial_tagger = baseline
+
+        with trace.span('brill.learn', fold=fold, engine=engine) as span:
+            trainer = BRILL_ENGINES[engine](initial_tagger=initial_tagger,
+                                            templates=templates)
+            # note that .train method returns a BrillTagger() object
+            brill_tagger = CompiledBrillTagger.from_brill_tagger(
+                    trainer.train(train_sents=training_data,
+                                  max_rules=max_rules, min_score=min_score),
+                    tag_counts=tag_counts(training_data))
+            if span.enabled:
+                span.set(rules=len(brill_tagger.rules()), tokens=sum(
+                        len(sentence) for sentence in training_data))
+        with trace.span('brill.evaluate', fold=fold):
+            accuracy = brill_tagger.evaluate(test_data)
+        fold_span.set(baseline=baseline_accuracy, accuracy=accuracy)
+    return BrillFoldResult(fold=fold,
+                           baseline_accuracy=baseline_accuracy,
+                           accuracy=accuracy,
+                           rules=len(brill_tagger.rules()),
+                           seconds=time.time() - start)
 
 class TTBrillTaggerTrainer(object):
     """A trainer for tbl taggers."""
 
     def __init__(self, file_name, language='', separator='_', ws_delim=True,
                  number_of_groups=10, train_size=0.65, max_rules=300,
-                 min_score=3):
-        """Construct a Brill tagger from baseline tagger and templates."""
-        self.tcr = TTTaggedCorpusReader(file_name=file_name,
-                                        language=language,
-                                        separator=separator,
-                                        ws_delim=ws_delim)
+                 min_score=3, cache_dir=PATH_TO_BASELINE_CACHE,
+                 cache_size=512 * 1024 ** 2, engine='indexed',
+                 guesser='suffix'):
+        """Construct a Brill tagger from baseline tagger and templates.
+
+           The corpus is kept integer-encoded (see EncodedCorpus); file_name
+           may name either a hand-tagged text file or a file written by
+           EncodedCorpus.save(), or be a glob or list of (possibly
+           compressed) shards of hand-tagged text, parsed in parallel.
+
+           Parameters
+           ----------
+             cache_dir (str) : directory where trained backoff chains are
+               cached between splits and runs; None disables the cache
+             cache_size (int) : size limit of the cache, in bytes
+             engine (str) : Brill rule learner, 'indexed' (see
+               razmetka.tag.tbl) or 'nltk'
+             guesser (str) : tagger for unknown words at the bottom of the
+               backoff chain, 'suffix' (see razmetka.tag.suffix) or
+               'regexp' (BACKOFF_PATTERNS)
+        """
+        if EncodedCorpus.is_encoded(file_name):
+            self.corpus = EncodedCorpus.load(file_name)
+        else:
+            self.corpus = EncodedCorpus.from_file(file_name,
+                                                  separator=separator,
+                                                  lower=True)
         self.num_groups = number_of_groups
-        self.dev_size = len(self.tcr.sents())
+        self.dev_size = len(self.corpus)
         self.train_size = train_size
         self.max_rules = max_rules
         self.min_score = min_score
-        self.tagged_data_list = [[(w.lower(), t) for w, t in s]
-                                   for s in self.tcr.tagged_sents()]
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.engine = engine
+        if guesser not in GUESSERS:
+            raise ValueError('unknown guesser {!r} (expected one of '
+                             '{})'.format(guesser, ', '.join(GUESSERS)))
+        self.guesser = guesser
+        # sentence numbers, shuffled in place to split the corpus
+        self.order = range(len(self.corpus))
+        self.results = []
+
+    def split_positions(self):
+        """Shuffle the corpus and return (training, test) sentence numbers.
+
+           Each call reshuffles the previous order with the same seed, so a
+           trainer always produces the same sequence of splits.
+        """
+        random.seed(len(self.order))
+        random.shuffle(self.order)
+        cutoff = int(self.dev_size * self.train_size)
+        return (array.array('L', self.order[:cutoff]),
+                array.array('L', self.order[cutoff:self.dev_size]))
+
+    def split(self):
+        """Shuffle the corpus and return (training_data, test_data).
 
-    def train(self, templates=None, verbose=True):
-        """Train a new Brill tagger."""
+           The training data is a list (NLTK's trainers index into it);
+           the test data is decoded lazily as it is evaluated.
+        """
+        train_positions, test_positions = self.split_positions()
+        return (list(self.corpus.tagged_sents(train_positions)),
+                self.corpus.tagged_sents(test_positions))
+
+    def train(self, templates=None, verbose=True, processes=1):
+        """Train a new Brill tagger on an initial split and on each fold.
+
+           Every split gets its own backoff chain, trained on that split's
+           training data, as the Brill initial tagger.
+
+           Parameters
+           ----------
+             templates (list) : Brill rule templates (nltkdemo18 if None)
+             verbose (boolean) : print each stage of each split, with
+               its accuracies, as it finishes (unless a trace sink is
+               already installed; see razmetka.util.trace)
+             processes (int) : number of worker processes to train splits
+               in; None means one per CPU, 1 trains them all in this process
+
+           Returns
+           -------
+             (list) : a BrillFoldResult for the initial split (fold 0) and
+               for each of the num_groups folds, in fold order
+        """
         if templates is None:
             templates = brill.nltkdemo18()
+        if processes is None:
+            processes = multiprocessing.cpu_count()
 
-        random.seed(len(self.tagged_data_list))
-        random.shuffle(self.tagged_data_list)
-        cutoff = int(self.dev_size * self.train_size)
+        # start from the same order every time, so that every call (e.g.,
+        # for each template set in compare_templates) sees the same splits
+        self.order = range(len(self.corpus))
+        splits = [self.split_positions()
+                  for i in xrange(self.num_groups + 1)]
+        jobs = [(fold, templates, self.max_rules, self.min_score,
+                 self.cache_dir, self.cache_size, self.engine, self.guesser)
+                for fold in xrange(self.num_groups + 1)]
 
-        training_data = self.tagged_data_list[:cutoff]
-        test_data = self.tagged_data_list[cutoff:self.dev_size]
+        self.results = []
+        with trace.printing(verbose == True):
+            self.results.extend(_imap_shared(_train_fold, jobs, processes,
+                                             self.corpus, splits=splits))
+        return self.results
 
-        # very simple regular expression tagger
-        regex_tagger = RegexpTagger([
-            (r'^-?[0-9]+(.[0-9]+)?$', 'PUNCT'),
-            (r'.*', 'N')
-            ])
-        if verbose == True:
-            print "Regular expression tagger accuracy:\n{}\n".format(
-                    regex_tagger.evaluate(test_data))
+    def train_tagger(self, templates=None, path=None):
+        """Train a Brill tagger for use on new text, on the whole corpus.
 
-        # unigram tagger
-        unigram_tagger = UnigramTagger(train=training_data,
-                                       backoff=regex_tagger)
-        if verbose == True:
-            print "Unigram tagger accuracy:\n{}\n".format(
-                    unigram_tagger.evaluate(test_data))
+           Parameters
+           ----------
+             templates (list) : Brill rule templates (nltkdemo18 if None)
+             path (str) : if given, save the tagger there (see save_tagger)
 
-        # bigram tagger
-        bigram_tagger = BigramTagger(train=training_data,
-                                     backoff=unigram_tagger)
-        if verbose == True:
-            print "Bigram tagger accuracy:\n{}\n".format(
-                    bigram_tagger.evaluate(test_data))
+           Returns
+           -------
+             (LowercasingTagger) : the Brill tagger, with its backoff chain
+               as the initial tagger, accepting words in any case
+        """
+        if templates is None:
+            templates = brill.nltkdemo18()
+        cache = None
+        if self.cache_dir is not None:
+            cache = DiskCache(self.cache_dir, max_bytes=self.cache_size)
+        training_data = list(self.corpus.tagged_sents())
+        chain = cached_backoff_chain(training_data, cache=cache,
+                                     guesser=self.guesser)
+        with trace.span('brill.learn', engine=self.engine) as span:
+            trainer = BRILL_ENGINES[self.engine](
+                    initial_tagger=FusedBackoffTagger(chain[-1][1]),
+                    templates=templates)
+            tagger = LowercasingTagger(CompiledBrillTagger.from_brill_tagger(
+                    trainer.train(train_sents=training_data,
+                                  max_rules=self.max_rules,
+                                  min_score=self.min_score),
+                    tag_counts=tag_counts(training_data)))
+            if span.enabled:
+                span.set(rules=len(tagger.tagger.rules()), tokens=sum(
+                        len(sentence) for sentence in training_data))
+        if path is not None:
+            save_tagger(tagger, path)
+        return tagger
 
-        # trigram tagger
-        trigram_tagger = TrigramTagger(train=training_data,
-                                       backoff=bigram_tagger)
-        if verbose == True:
-            print "Trigram tagger accuracy:\n{}\n".format(
-                    trigram_tagger.evaluate(test_data))
-
-        # first iteration
-        trainer = BrillTaggerTrainer(initial_tagger=trigram_tagger,
-                                     templates=templates)
-        brill_tagger = trainer.train(train_sents=training_data,
-                                     max_rules=self.max_rules,
-                                     min_score=self.min_score)
-        if verbose == True:
+    def print_fold(self, result):
+        """Print the accuracies of one BrillFoldResult."""
+        if result.fold == 0:
+            for name, accuracy in result.baseline_accuracy:
+                print "{} tagger accuracy:\n{}\n".format(name, accuracy)
             print "Initial Brill tagger accuracy:\n{}\n".format(
-                    brill_tagger.evaluate(test_data))
+                    result.accuracy)
+        else:
+            print "Brill tagger accuracy, fold {}:\n{}\n".format(
+                    result.fold, result.accuracy)
 
-        # folding
-        for i in range(0, self.num_groups):
-            # random splitting
-            random.seed(len(self.tagged_data_list))
-            random.shuffle(self.tagged_data_list)
-            cutoff = int(self.dev_size * self.train_size)
+    def learning_curve(self, points=20, levels=False, verbose=False):
+        """Score the backoff chain trained on growing slices of a split.
 
-            training_data = self.tagged_data_list[:cutoff]
-            test_data = self.tagged_data_list[cutoff:self.dev_size]
+           The corpus is split once, as train() splits it; the training
+           part is added to an IncrementalBackoffChain in `points` equal
+           slices, and after each the chain is scored on the same test
+           part. Counts are only ever added to, so the whole curve costs
+           little more than training on the largest slice.
 
-            # note that .train method returns a BrillTagger() object
-            brill_tagger = trainer.train(train_sents=training_data,
-                                         max_rules=self.max_rules,
-                                         min_score=self.min_score)
-
-            if verbose == True:
-                print "Brill tagger accuracy, fold {}:\n{}\n".format(
-                        i+1, brill_tagger.evaluate(test_data))
-
-    def compare_templates(self):
-        for i, t in enumerate([brill.nltkdemo18(), brill.nltkdemo18plus(),
-                               brill.brill24(), brill.fntbl37()]):
-            print "\nTEMPLATE {}==================\n".format(i)
-            self.train(templates=t)
+           Parameters
+           ----------
+             points (int) : number of points on the curve
+             levels (boolean) : score every tagger of the chain, not just
+               the whole chain (the trigram tagger)
+             verbose (boolean) : print each point as it is done (unless a
+               trace sink is already installed; see razmetka.util.trace)
+
+           Returns
+           -------
+             (list) : a LearningCurvePoint for each slice, smallest first
+        """
+        self.order = range(len(self.corpus))
+        train_positions, test_positions = self.split_positions()
+        test_words = []
+        test_tags = []
+        for sentence in self.corpus.tagged_sents(test_positions):
+            test_words.append([w for w, t in sentence])
+            test_tags.append([t for w, t in sentence])
+        if self.guesser == 'suffix':
+            bottom = SuffixCounts(max_length=SUFFIX_LENGTH)
+        else:
+            bottom = RegexpTagger(BACKOFF_PATTERNS)
+        chain = IncrementalBackoffChain(bottom)
+        curve = []
+        done = 0
+        with trace.printing(verbose == True):
+            for point in xrange(1, points + 1):
+                start = time.time()
+                size = len(train_positions) * point // points
+                with trace.span('brill.curve_point', point=point,
+                                sentences=size) as span:
+                    chain.add(self.corpus.tagged_sents(
+                            train_positions[done:size]))
+                    chain.update()
+                    done = size
+                    taggers = chain.chain()
+                    if not levels:
+                        taggers = taggers[-1:]
+                    scores = [(name, accuracy(FusedBackoffTagger(tagger),
+                                              test_words, test_tags))
+                              for name, tagger in taggers]
+                    span.set(tokens=chain.tokens, accuracy=scores)
+                curve.append(LearningCurvePoint(
+                        sentences=size, tokens=chain.tokens,
+                        accuracy=scores, seconds=time.time() - start))
+        return curve
+
+    def compare_templates(self, template_sets=None, processes=1,
+                          verbose=True):
+        """Train every template set on the same folds and compare them.
+
+           The splits, backoff chains and initial tagging of each fold are
+           worked out once and shared by all template sets; only the Brill
+           rule learning is repeated, as one job per template set and fold.
+
+           Parameters
+           ----------
+             template_sets (list) : (name, templates) pairs; defaults to
+               the sets in TEMPLATE_SETS
+             processes (int) : number of worker processes to learn rules
+               in; None means one per CPU
+             verbose (boolean) : print the comparison table
+
+           Returns
+           -------
+             (dict) : name: list of BrillFoldResult (folds 1..num_groups)
+        """
+        if template_sets is None:
+            template_sets = [(name, factory())
+                             for name, factory in TEMPLATE_SETS]
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        cache = None
+        if self.cache_dir is not None:
+            cache = DiskCache(self.cache_dir, max_bytes=self.cache_size)
+
+        # the same splits train() makes (its initial split 0 is skipped)
+        self.order = range(len(self.corpus))
+        splits = [self.split_positions()
+                  for i in xrange(self.num_groups + 1)]
+        baselines = {}
+        for fold in xrange(1, self.num_groups + 1):
+            training_data = list(self.corpus.tagged_sents(splits[fold][0]))
+            test_data = self.corpus.tagged_sents(splits[fold][1])
+            chain = cached_backoff_chain(training_data, cache=cache,
+                                         guesser=self.guesser)
+            initial_tagger = MemoTagger(
+                    FusedBackoffTagger(chain[-1][1]),
+                    (untag(s) for s in itertools.chain(training_data,
+                                                       test_data)))
+            baselines[fold] = (
+                    [(name, FusedBackoffTagger(tagger).evaluate(test_data))
+                     for name, tagger in chain], initial_tagger)
+
+        jobs = [(name, templates, fold, self.max_rules, self.min_score,
+                 self.engine)
+                for name, templates in template_sets
+                for fold in xrange(1, self.num_groups + 1)]
+        comparison = collections.OrderedDict(
+                (name, []) for name, templates in template_sets)
+        for name, result in _imap_shared(_learn_rules, jobs, processes,
+                                         self.corpus, splits=splits,
+                                         baselines=baselines):
+            comparison[name].append(result)
+        if verbose == True:
+            self.print_comparison(comparison)
+        return comparison
+
+    def print_comparison(self, comparison):
+        """Print mean accuracy, mean rule count and time per template set."""
+        print "{:<16}{:>10}{:>10}{:>10}".format(
+                'TEMPLATES', 'ACCURACY', 'RULES', 'SECONDS')
+        for name, results in comparison.iteritems():
+            if not results:
+                continue
+            print "{:<16}{:>10.4f}{:>10.1f}{:>10.1f}".format(
+                    name,
+                    sum(r.accuracy for r in results) / len(results),
+                    sum(r.rules for r in results) / float(len(results)),
+                    sum(r.seconds for r in results))
 
 class TaggerTesterBrill(object):
     """Collection of files for training/testing Brill taggers."""
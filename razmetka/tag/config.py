@@ -16,3 +16,18 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.join(script_dir, os.pardir)
 PATH_TO_DATA_DIR = os.path.join(parent_dir, DATA_DIR_NAME)
 """Absolute path to the directory where data files are located."""
+
+# no slashes '/' in this name (they'll be added as necessary later)
+CACHE_DIR_NAME = 'cache'
+"""Name of the directory (within the data directory) holding caches."""
+
+# absolute path to the cache directory
+PATH_TO_CACHE_DIR = os.path.join(PATH_TO_DATA_DIR, CACHE_DIR_NAME)
+"""Absolute path to the directory where cached taggers are kept."""
+
+# the sample training file shipped at the top of the repository
+SAMPLE_FILE_NAME = 'uyghurtagger.train'
+"""Name of the sample hand-tagged training file."""
+
+PATH_TO_SAMPLE_FILE = os.path.join(parent_dir, os.pardir, SAMPLE_FILE_NAME)
+"""Absolute path to the sample training file (see the README)."""
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Train the n-gram backoff chain a slice of sentences at a time.
+
+   NLTK's n-gram taggers count (context, tag) pairs over the whole of
+   their training data, then keep the most frequent tag of each context
+   in which the tagger below them in the chain (the backoff) is wrong at
+   least once. Retraining on a larger slice recounts everything. An
+   IncrementalBackoffChain keeps the counts, adds new sentences to them,
+   and re-decides only the contexts whose counts changed or whose backoff
+   now answers differently. Every context of a level shares one backoff
+   answer -- the unigram's depends only on the word, the bigram's on the
+   word and the tag before it -- so that decision needs only the counts.
+   A SuffixTagger at the bottom learns from the sentences too: it is
+   recompiled at each update, and the words it now guesses differently
+   are re-decided. After each update the tables equal those NLTK would
+   train from scratch on all the sentences added so far.
+"""
+
+import collections
+import itertools
+import operator
+
+from nltk.probability import ConditionalFreqDist
+from nltk.tag.sequential import BigramTagger, TrigramTagger, UnigramTagger
+
+from .suffix import SuffixCounts
+
+LearningCurvePoint = collections.namedtuple('LearningCurvePoint', [
+    'sentences', 'tokens', 'accuracy', 'seconds'])
+"""One point of a learning curve.
+
+   sentences (int) : number of training sentences
+   tokens (int) : number of training tokens
+   accuracy (list) : (name, accuracy) on the held-out set, for each tagger
+   seconds (float) : wall time spent on the point
+"""
+
+def accuracy(tagger, sentences, gold_tags):
+    """Return the share of tokens a tagger tags as in gold_tags.
+
+       Like TaggerI.evaluate(), but for test data already split into
+       lists of words and of tags, so it can be scored many times cheaply.
+    """
+    correct = total = 0
+    for words, gold in itertools.izip(sentences, gold_tags):
+        correct += sum(itertools.imap(operator.eq, gold,
+                                      (t for w, t in tagger.tag(words))))
+        total += len(gold)
+    return float(correct) / total if total else 0.0
+
+def _ngram_tagger(tagger_class, table, backoff):
+    """Return an n-gram tagger with a copy of a (possibly empty) table."""
+    # NLTK refuses an empty model, which a small slice may well give
+    tagger = tagger_class(model={None: None}, backoff=backoff)
+    tagger._context_to_tag = dict(table)
+    return tagger
+
+class IncrementalBackoffChain(object):
+    """A Guesser -> Unigram -> Bigram -> Trigram chain grown incrementally."""
+
+    def __init__(self, bottom):
+        """Initialize the chain with no training data.
+
+           Parameters
+           ----------
+             bottom (TaggerI / SuffixCounts) : the bottom of the chain, a
+               tagger whose answer depends only on the word (e.g., a
+               RegexpTagger), or SuffixCounts to learn a SuffixTagger
+               from the training sentences
+        """
+        self.suffix_counts = None
+        if isinstance(bottom, SuffixCounts):
+            self.suffix_counts = bottom
+            self.bottom_name = 'Suffix'
+            bottom = bottom.tagger()
+        else:
+            self.bottom_name = 'Regular expression'
+        self.bottom = bottom
+        # the bottom's tag of every word decided so far
+        self.bottom_tags = {}
+        self.sentences = 0
+        self.tokens = 0
+        # (context, tag) counts and context: tag tables, by n
+        self.counts = dict((n, ConditionalFreqDist()) for n in (1, 2, 3))
+        self.tables = dict((n, {}) for n in (1, 2, 3))
+        # contexts counted since the last update, by n
+        self.dirty = dict((n, set()) for n in (1, 2, 3))
+        # bigram contexts by word, and trigram contexts by the bigram
+        # context of the same token: the contexts whose backoff they are
+        self.bigrams_of = collections.defaultdict(set)
+        self.trigrams_of = collections.defaultdict(set)
+
+    def add(self, tagged_sents):
+        """Count the contexts of more training sentences.
+
+           The tables are not brought up to date until update() is called.
+        """
+        counts1, counts2, counts3 = (self.counts[1], self.counts[2],
+                                     self.counts[3])
+        dirty1, dirty2, dirty3 = self.dirty[1], self.dirty[2], self.dirty[3]
+        bigrams_of, trigrams_of = self.bigrams_of, self.trigrams_of
+        if self.suffix_counts is not None:
+            tagged_sents = list(tagged_sents)
+            self.suffix_counts.add(tagged_sents)
+        for sentence in tagged_sents:
+            self.sentences += 1
+            if not sentence:
+                continue
+            tokens, tags = zip(*sentence)
+            self.tokens += len(tokens)
+            for index, (word, tag) in enumerate(sentence):
+                # the contexts NLTK's n-gram taggers use
+                bigram = (tags[max(0, index - 1):index], word)
+                trigram = (tags[max(0, index - 2):index], word)
+                counts1[word][tag] += 1
+                counts2[bigram][tag] += 1
+                counts3[trigram][tag] += 1
+                dirty1.add(word)
+                dirty2.add(bigram)
+                dirty3.add(trigram)
+                bigrams_of[word].add(bigram)
+                trigrams_of[bigram].add(trigram)
+
+    def _guess(self, word):
+        """Return the bottom tagger's tag for a word (remembered)."""
+        try:
+            return self.bottom_tags[word]
+        except KeyError:
+            tag = self.bottom.choose_tag([word], 0, None)
+            self.bottom_tags[word] = tag
+            return tag
+
+    def _unigram(self, word):
+        """Return the tag the chain up to the unigram tagger gives a word."""
+        tag = self.tables[1].get(word)
+        return tag if tag is not None else self._guess(word)
+
+    def _update_bottom(self):
+        """Recompile a learned bottom tagger.
+
+           Returns
+           -------
+             (dict) : the words it now guesses differently, with the tag
+               the chain up to the unigram tagger gave them before
+        """
+        before = {}
+        if self.suffix_counts is None or not self.dirty[1]:
+            return before
+        self.bottom = self.suffix_counts.tagger()
+        for word, tag in self.bottom_tags.items():
+            guess = self.bottom.choose_tag([word], 0, None)
+            if guess != tag:
+                before[word] = self._unigram(word)
+                self.bottom_tags[word] = guess
+        return before
+
+    def _bigram(self, context):
+        """Return the tag the chain up to the bigram tagger gives a context."""
+        tag = self.tables[2].get(context)
+        return tag if tag is not None else self._unigram(context[1])
+
+    def _decide(self, n, context, backoff_tag):
+        """Keep or drop one context of level n, as NLTK's training would."""
+        counts = self.counts[n][context]
+        for tag in counts:
+            if tag != backoff_tag:
+                self.tables[n][context] = counts.max()
+                return
+        self.tables[n].pop(context, None)
+
+    def update(self):
+        """Bring the tables up to date with every sentence added so far."""
+        before = self._update_bottom()
+        self.dirty[1].update(before)
+        # words whose unigram answer changed, with the old answer
+        changed = {}
+        for word in self.dirty[1]:
+            old = before[word] if word in before else self._unigram(word)
+            self._decide(1, word, self._guess(word))
+            if self._unigram(word) != old:
+                changed[word] = old
+
+        todo = self.dirty[2]
+        for word in changed:
+            todo.update(self.bigrams_of[word])
+        # bigram contexts whose answer changed
+        changed_bigrams = set()
+        for context in todo:
+            word = context[1]
+            old = self.tables[2].get(context)
+            if old is None:
+                old = changed[word] if word in changed else \
+                      self._unigram(word)
+            self._decide(2, context, self._unigram(word))
+            if self._bigram(context) != old:
+                changed_bigrams.add(context)
+
+        todo = self.dirty[3]
+        for bigram in changed_bigrams:
+            todo.update(self.trigrams_of[bigram])
+        for context in todo:
+            self._decide(3, context,
+                         self._bigram((context[0][-1:], context[1])))
+
+        for n in self.dirty:
+            self.dirty[n] = set()
+
+    def chain(self):
+        """Return the chain as (name, tagger) pairs, like backoff_chain().
+
+           The taggers get copies of the tables, so they are unaffected by
+           later updates.
+        """
+        unigram_tagger = _ngram_tagger(UnigramTagger, self.tables[1],
+                                       self.bottom)
+        bigram_tagger = _ngram_tagger(BigramTagger, self.tables[2],
+                                      unigram_tagger)
+        trigram_tagger = _ngram_tagger(TrigramTagger, self.tables[3],
+                                       bigram_tagger)
+        return [(self.bottom_name, self.bottom),
+                ('Unigram', unigram_tagger),
+                ('Bigram', bigram_tagger),
+                ('Trigram', trigram_tagger)]
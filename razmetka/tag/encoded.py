@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Store a tagged corpus as compact columns of integer ids.
+
+   A corpus of N tokens in S sentences is kept as two arrays of N word and
+   tag ids plus an array of S + 1 sentence offsets, instead of a list of
+   lists of (word, tag) tuples. Words and tags are interned once in a
+   Vocabulary, so each distinct string is stored a single time.
+"""
+
+import array
+import functools
+import json
+import struct
+
+from razmetka.util.shards import expand_shards, open_corpus
+
+def parse_tagged_line(line, separator='_', lower=False, tagged=True):
+    """Split a line of 'word<separator>tag' tokens into a sentence.
+
+       Tokens are split on the rightmost separator and tags are upper-cased,
+       exactly as NLTK's TaggedCorpusReader does.
+
+       Returns
+       -------
+         (list) : (word, tag) tuples, or just the words if not tagged
+    """
+    sep_len = len(separator)
+    sentence = []
+    for token in line.split():
+        loc = token.rfind(separator)
+        if loc >= 0:
+            word, tag = token[:loc], token[loc+sep_len:].upper()
+        else:
+            word, tag = token, None
+        if lower:
+            word = word.lower()
+        sentence.append((word, tag) if tagged else word)
+    return sentence
+
+class Vocabulary(object):
+    """Two-way mapping between strings and consecutive integer ids."""
+
+    def __init__(self, items=()):
+        self.items = []
+        self.ids = {}
+        for item in items:
+            self.intern(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.ids
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def intern(self, item):
+        """Return the id of an item, adding it if it is new."""
+        try:
+            return self.ids[item]
+        except KeyError:
+            self.ids[item] = len(self.items)
+            self.items.append(item)
+            return self.ids[item]
+
+    def get(self, item, default=None):
+        """Return the id of an item, or default if it is unknown."""
+        return self.ids.get(item, default)
+
+class SentenceView(object):
+    """A read-only sequence of tagged sentences decoded on demand.
+
+       Behaves like the list of lists of (word, tag) tuples that NLTK
+       taggers and trainers expect, but holds nothing but sentence numbers.
+    """
+
+    def __init__(self, corpus, positions=None):
+        self.corpus = corpus
+        if positions is None:
+            positions = xrange(len(corpus))
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return SentenceView(self.corpus, self.positions[i])
+        return self.corpus.sentence(self.positions[i])
+
+    def __iter__(self):
+        sentence = self.corpus.sentence
+        for position in self.positions:
+            yield sentence(position)
+
+class EncodedCorpus(object):
+    """A tagged corpus held as integer-encoded columns."""
+
+    file_magic = b'RZMENC01'
+    file_header = struct.Struct('<8sBQQQ')
+
+    def __init__(self, words=None, tags=None, offsets=None,
+                 word_vocab=None, tag_vocab=None):
+        """Initialize the corpus (empty, unless columns are given).
+
+           Parameters
+           ----------
+             words (array) : word id of every token
+             tags (array) : tag id of every token
+             offsets (array) : index of the first token of every sentence,
+               plus the total number of tokens
+             word_vocab (Vocabulary) : strings for the word ids
+             tag_vocab (Vocabulary) : strings for the tag ids
+        """
+        self.words = words if words is not None else array.array('I')
+        self.tags = tags if tags is not None else array.array('I')
+        self.offsets = offsets if offsets is not None else \
+                array.array('L', [0])
+        self.word_vocab = word_vocab if word_vocab is not None else \
+                Vocabulary()
+        self.tag_vocab = tag_vocab if tag_vocab is not None else \
+                Vocabulary()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, tagged_sentence):
+        """Add one sentence given as a list of (word, tag) tuples."""
+        intern_word = self.word_vocab.intern
+        intern_tag = self.tag_vocab.intern
+        for word, tag in tagged_sentence:
+            self.words.append(intern_word(word))
+            self.tags.append(intern_tag(tag))
+        self.offsets.append(len(self.words))
+
+    @classmethod
+    def from_tagged_sents(cls, tagged_sents, lower=False):
+        """Encode an iterable of lists of (word, tag) tuples."""
+        corpus = cls()
+        for sentence in tagged_sents:
+            if lower:
+                sentence = [(w.lower(), t) for w, t in sentence]
+            corpus.append(sentence)
+        return corpus
+
+    @classmethod
+    def from_file(cls, file_name, separator='_', encoding='utf-8',
+                  lower=False, processes=None):
+        """Encode a one-sentence-per-line hand-tagged file.
+
+           Tokens are split as parse_tagged_line() does; lines without any
+           tokens are skipped.
+
+           Parameters
+           ----------
+             file_name (str / list) : the file, or a glob or list of
+               (possibly compressed) shards (see open_corpus())
+             processes (int) : number of processes shards are parsed in
+               (one per CPU if None)
+        """
+        corpus = cls()
+        parse = functools.partial(parse_tagged_line, separator=separator,
+                                  lower=lower)
+        with open_corpus(file_name, encoding=encoding,
+                         processes=processes) as store:
+            for sentence in store.parsed(parse):
+                if sentence:
+                    corpus.append(sentence)
+        return corpus
+
+    def sentence(self, i):
+        """Return sentence i as a list of (word, tag) tuples."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        words, tags = self.word_vocab.items, self.tag_vocab.items
+        return [(words[w], tags[t]) for w, t in
+                zip(self.words[start:end], self.tags[start:end])]
+
+    def tagged_sents(self, positions=None):
+        """Return a SentenceView of the given (or all) sentences."""
+        return SentenceView(self, positions)
+
+    def token_count(self):
+        """Return the number of tokens in the corpus."""
+        return len(self.words)
+
+    def save(self, path):
+        """Write the corpus to a compact binary file."""
+        vocab = json.dumps([self.word_vocab.items, self.tag_vocab.items],
+                           ensure_ascii=False).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(self.file_header.pack(self.file_magic,
+                                          self.offsets.itemsize, len(self),
+                                          len(self.words), len(vocab)))
+            f.write(vocab)
+            self.offsets.tofile(f)
+            self.words.tofile(f)
+            self.tags.tofile(f)
+
+    @classmethod
+    def is_encoded(cls, path):
+        """Return True if path is a file written by save()."""
+        paths = expand_shards(path)
+        if len(paths) != 1:
+            return False
+        with open(paths[0], 'rb') as f:
+            return f.read(len(cls.file_magic)) == cls.file_magic
+
+    @classmethod
+    def load(cls, path):
+        """Read a corpus written by save()."""
+        with open(path, 'rb') as f:
+            magic, itemsize, sentences, tokens, vocab_size = \
+                cls.file_header.unpack(f.read(cls.file_header.size))
+            if magic != cls.file_magic or \
+                    itemsize != array.array('L').itemsize:
+                raise ValueError('not an encoded corpus file: {}'.format(path))
+            words, tags = json.loads(f.read(vocab_size).decode('utf-8'))
+            corpus = cls(word_vocab=Vocabulary(words),
+                         tag_vocab=Vocabulary(tags))
+            corpus.offsets = array.array('L')
+            corpus.offsets.fromfile(f, sentences + 1)
+            corpus.words.fromfile(f, tokens)
+            corpus.tags.fromfile(f, tokens)
+        return corpus
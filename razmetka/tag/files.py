@@ -4,14 +4,20 @@
 """Provide file objects for training and testing part-of-speech taggers."""
 
 import codecs
+import functools
 import os
 
+from nltk.collections import LazyConcatenation
 from nltk.corpus.reader import TaggedCorpusReader
 
+from razmetka.util.corpus import SentenceSequence
+from razmetka.util.shards import (COMPRESSED_EXTENSIONS, expand_shards,
+                                  open_corpus)
 from razmetka.util.util import to_unicode_or_bust
 
 from . import ten
-from .config import DATA_DIR_NAME
+from .config import DATA_DIR_NAME, PATH_TO_DATA_DIR
+from .encoded import parse_tagged_line
 
 def write_to_directory(dir_name, file_name, a_string,
                        mode='w+', encoding='utf-8'):
@@ -36,7 +42,9 @@ class BaseFile(object):
 
            Parameters
            ----------
-             file_name (str) : name of the file, with extension
+             file_name (str / list) : name of the file, with extension; or
+               a glob or list of shards, read as one file in order (shards
+               ending in .gz, .bz2 or .xz are decompressed as they are read)
              language (str) : the language of the file (e.g., 'Uyghur')
              separator (basestring) : character used in the file to separate
                words from their part-of-speech tags, e.g.:
@@ -56,6 +64,7 @@ class BaseFile(object):
         self.ws_delim = ws_delim
         self.num_groups = number_of_groups
         self.enc = encoding
+        self._store = None
 
     def __str__(self):
         """Provide a human-readable representation of the object.
@@ -68,10 +77,29 @@ class BaseFile(object):
         return summary.format(
                 type(self).__name__,
                 self.language,
-                len(self.contents()),
-                sum([len(i[1].split(' ')) for i in self.contents()])
+                len(self.store),
+                self.store.total_tokens()
                 )
 
+    @property
+    def store(self):
+        """The CorpusStore (or ShardedStore) behind the file.
+
+           It is opened on first use and reopened if the file changes.
+        """
+        if self._store is None or self._store.changed():
+            if self._store is not None:
+                self._store.close()
+            self._store = open_corpus(self.file_name, encoding=self.enc)
+        return self._store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, key):
+        """Return a sentence (or a list of sentences, given a slice)."""
+        return self.store[key]
+
     def contents(self):
         """Create a list of sentences from the provided file.
 
@@ -81,89 +109,101 @@ class BaseFile(object):
                     (1, u'Sen_PN2si mantini_N-ACC yedim...'),
                     (2, u'Sen_PN2si manta_N yegenliking...'),
                 ]
+
+           Prefer sentences() or indexing the object itself for large
+           files: both read sentences from the store on demand.
         """
-        with codecs.open(self.file_name, mode='r+', encoding=self.enc) as f:
-            return [(i, to_unicode_or_bust(l)[:-1]) for i, l in
-                    enumerate(f.readlines())]
+        return list(self.sentences())
 
     def to_string(self):
         """Output the BaseFile object as a single unicode string."""
-        return u"\n".join([i[1] for i in self.contents()])
+        return u"\n".join(self.store)
 
     def write(self, save_name=None):
         """Write the training file to disk."""
         if save_name is None:
-            save_name = DATA+DIRECTORY + self.file_name
+            # named after the (first) file, less any compression extension
+            base_name = os.path.basename(expand_shards(self.file_name)[0])
+            if base_name.endswith(COMPRESSED_EXTENSIONS):
+                base_name = os.path.splitext(base_name)[0]
+            save_name = os.path.join(PATH_TO_DATA_DIR, base_name)
         with codecs.open(save_name, mode='w+', encoding='utf-8') as stream:
-            stream.write(self.to_string())
+            for i, sentence in self.sentences():
+                if i:
+                    stream.write(u"\n")
+                stream.write(sentence)
 
-    def groups(self, num_of_groups=None):
-        """Split the file into ten randomly assigned groups.
+    def sentences(self):
+        """Yield (position, sentence) pairs without reading the whole file."""
+        return enumerate(self.store)
+
+    def fold_plan(self, num_of_groups=None, seed=None):
+        """Return a FoldPlan assigning every sentence to a group.
 
            Parameters
            ----------
              num_of_groups (int) : the number of groups to be formed
+             seed (int) : seed for the random assignment (random if None)
         """
         if num_of_groups is None:
             num_of_groups = self.num_groups
-        return [g for g in ten.create_groups(len(self.contents()),
-                                             n=num_of_groups)]
+        return ten.FoldPlan.build(len(self.store), n=num_of_groups,
+                                  seed=seed)
 
-    def split_groups(self, num_of_groups=None, verbose=True):
+    def groups(self, num_of_groups=None, seed=None):
+        """Split the file into ten randomly assigned groups.
+
+           Parameters
+           ----------
+             num_of_groups (int) : the number of groups to be formed
+             seed (int) : seed for the random assignment (random if None)
+        """
+        return self.fold_plan(num_of_groups=num_of_groups,
+                              seed=seed).groups()
+
+    def split_groups(self, num_of_groups=None, verbose=True, seed=None,
+                     plan=None, manifest_name='folds.json',
+                     test_name='test_', train_name='train_', dest_dir=None):
         """Split the file into training and test files.
 
+           All test and training files are written in a single pass over
+           the file, and the plan's manifest is saved next to them so the
+           same split can be rebuilt with ten.FoldPlan.load().
+
            Parameters
            ----------
              num_of_groups (int) : the number of groups to be formed
              verbose (Boolean) : print the contents of each file
                to the console (if True), or not (if False)
+             seed (int) : seed for the random assignment (random if None)
+             plan (FoldPlan) : an existing plan to split by (overrides
+               num_of_groups and seed)
+             manifest_name (str) : file name of the saved manifest
+             test_name (str) : prefix for naming/saving test files
+             train_name (str) : prefix for naming/saving training files
+             dest_dir (str) : directory the files are written to
+               (PATH_TO_DATA_DIR if None)
+
+           Returns
+           -------
+             (FoldPlan) : the plan the file was split by
         """
-        if num_of_groups is None:
-            num_of_groups = self.num_groups
+        if dest_dir is None:
+            dest_dir = PATH_TO_DATA_DIR
+        if plan is None:
+            plan = self.fold_plan(num_of_groups=num_of_groups, seed=seed)
         # test_01 is the test file containing group 01
         # train_01 is the training file containing all groups EXCEPT 1
-        i = 1
-        group_list = self.groups()
-        while i <= num_of_groups:
-            idx = str(i).rjust(2, '0')
-            test_name = "test_{}.txt".format(idx)
-            train_name = "train_{}.train".format(idx)
-
-            # form lists (remember that they're zero-indexed!)
-            test_list = group_list[i-1]
-            # first produce a nested list of non-i lists
-            train_list_nested = [group_list[j] for j in range(
-                len(group_list)) if j != i-1]
-            # then collapse nested list into flat list
-            train_list = [k for l in train_list_nested for k in l]
-
-            test_sentences = []
-            train_sentences = []
-            for position, sentence in self.contents():
-                if position in test_list:
-                    test_sentences.append((position, sentence))
-                else:
-                    train_sentences.append((position, sentence))
-
-            if verbose == True:
-                print u"{}\tTEST SENTENCES:".format(i-1)
-                for s in test_sentences:
-                    print u"\t{}\t{}".format(s[0], s[1])
-                print u"\n\tTRAINING SENTENCES:"
-                for s in train_sentences:
-                    print u"\t{}\t{}".format(s[0], s[1])
-
-            test_output = u'\n'.join([s[1] for s in test_sentences])
-            write_to_directory(dir_name=DATA_DIR_NAME, file_name=test_name,
-                               a_string=test_output)
-
-            train_output = u'\n'.join([s[1] for s in train_sentences])
-            write_to_directory(dir_name=DATA_DIR_NAME, file_name=train_name,
-                               a_string=train_output)
-
-            # add index and matching filenames to all_files dict
-            # self.all_files[idx] = (test_name, train_name)
-            i += 1
+
+        def show(fold, position, sentence):
+            print u"{}\t{}\t{}".format(fold, position, sentence)
+
+        plan.write_folds(self.sentences(), dest_dir=dest_dir,
+                         test_name=test_name, train_name=train_name,
+                         encoding=self.enc,
+                         callback=show if verbose == True else None)
+        plan.save(os.path.join(dest_dir, manifest_name))
+        return plan
 
 class TrainingFile(BaseFile):
     """Training file consisting of hand-tagged sentences."""
@@ -188,15 +228,91 @@ class TestingOutputFile(BaseFile):
 
     def __init__(self, file_name, separator='_', idx=1):
         """Initialize the TestingOutputFile object."""
-        BaseFile.__init__(self, file_name, separator)
+        BaseFile.__init__(self, file_name=file_name, separator=separator)
         # one-digit numbers should be prefaced with a leading zero
         self.idx = str(idx).rjust(2, '0')
 
 class TTTaggedCorpusReader(TaggedCorpusReader):
-    """NLTK TaggedCorpusReader"""
+    """NLTK TaggedCorpusReader over one file or many (compressed) shards."""
 
     def __init__(self, file_name, language='', separator='_', ws_delim=True,
-                 number_of_groups=10, encoding='utf-8'):
-        """Initialize the corpus reader."""
-        TaggedCorpusReader.__init__(self, root='.', fileids=[file_name],
-                                    sep=separator, encoding=encoding)
+                 number_of_groups=10, encoding='utf-8', processes=None):
+        """Initialize the corpus reader.
+
+           Parameters
+           ----------
+             file_name (str / list) : name of the file, or a glob or list
+               of shards (see BaseFile); the shards are the reader's fileids
+             processes (int) : number of processes shards are indexed and
+               parsed in (one per CPU if None)
+        """
+        paths = [os.path.abspath(p) for p in expand_shards(file_name)]
+        root = os.path.dirname(os.path.commonprefix(paths))
+        TaggedCorpusReader.__init__(
+                self, root=root,
+                fileids=[os.path.relpath(p, root) for p in paths],
+                sep=separator, encoding=encoding)
+        self.file_name = file_name
+        self.language = language
+        self.ws_delim = ws_delim
+        self.num_groups = number_of_groups
+        self.processes = processes
+        self._stores = {}
+
+    def _store(self, fileids=None):
+        """Return the store of the given (or all) fileids."""
+        if fileids is None:
+            fileids = self._fileids
+        elif isinstance(fileids, basestring):
+            fileids = [fileids]
+        key = tuple(fileids)
+        store = self._stores.get(key)
+        if store is None or store.changed():
+            if store is not None:
+                store.close()
+            store = open_corpus([self.abspath(f).path for f in fileids],
+                                encoding=self._encoding,
+                                processes=self.processes)
+            self._stores[key] = store
+        return store
+
+    def _parser(self, tagged):
+        return functools.partial(parse_tagged_line, separator=self._sep,
+                                 tagged=tagged)
+
+    def raw(self, fileids=None):
+        """Return the text of the files as one unicode string."""
+        return u'\n'.join(self._store(fileids))
+
+    def sents(self, fileids=None):
+        """Return the sentences, lazily, as lists of words."""
+        return SentenceSequence([self._store(fileids)],
+                                parse=self._parser(tagged=False))
+
+    def tagged_sents(self, fileids=None):
+        """Return the sentences, lazily, as lists of (word, tag) tuples."""
+        return SentenceSequence([self._store(fileids)],
+                                parse=self._parser(tagged=True))
+
+    def words(self, fileids=None):
+        return LazyConcatenation(self.sents(fileids))
+
+    def tagged_words(self, fileids=None):
+        return LazyConcatenation(self.tagged_sents(fileids))
+
+    def parse(self, fileids=None, tagged=True):
+        """Parse every sentence at once, shards in parallel processes.
+
+           Returns
+           -------
+             (list) : the sentences, as tagged_sents() (or sents()) would
+               give them, in order
+        """
+        return list(self._store(fileids).parsed(self._parser(tagged)))
+
+    def fold_plan(self, num_of_groups=None, seed=None):
+        """Return a FoldPlan assigning every sentence to a group."""
+        if num_of_groups is None:
+            num_of_groups = self.num_groups
+        return ten.FoldPlan.build(len(self._store()), n=num_of_groups,
+                                  seed=seed)
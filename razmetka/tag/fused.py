@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tag with a whole n-gram backoff chain in one pass per sentence.
+
+   An NLTK backoff chain (e.g., Trigram -> Bigram -> Unigram -> Regexp) is
+   a linked list of taggers, and every token is passed down it, building a
+   context tuple of strings for each n-gram tagger on the way. A
+   FusedBackoffTagger holds the same information in one table keyed by
+   word: words the n-gram taggers only know without context map straight
+   to a tag id; the rest map to their bigram and trigram contexts, keyed
+   by the integer ids of the previous tags. Words missing from the table
+   go to the suffix, regular expression and default taggers at the bottom
+   of the chain, whose answer depends only on the word and is remembered.
+"""
+
+from nltk.tag.api import TaggerI
+from nltk.tag.sequential import DefaultTagger, NgramTagger, RegexpTagger, \
+                                UnigramTagger
+
+from .suffix import SuffixTagger
+
+_SHIFT = 32 # bits per previous tag in a context key
+
+class FusedBackoffTagger(TaggerI):
+    """A backoff chain of n-gram and guessing taggers, fused into one table."""
+
+    def __init__(self, chain, max_memo=100000):
+        """Fuse an NLTK backoff chain.
+
+           Parameters
+           ----------
+             chain (SequentialBackoffTagger) : the top of the chain, whose
+               taggers must be n-gram taggers (n <= 3) followed by suffix,
+               regular expression and default taggers
+             max_memo (int) : number of unknown words whose tag is
+               remembered at once
+        """
+        self.max_memo = max_memo
+        # kept so the chain can still be saved (see model.save_model)
+        self._taggers = list(chain._taggers)
+        # tag names by code: a tag's code is its id + 1, leaving 0 for
+        # "before the start of the sentence" in contexts
+        self.names = [None]
+        self.codes = {}
+        ngrams = []
+        self.tail = []
+        for tagger in chain._taggers:
+            if isinstance(tagger, NgramTagger) and tagger._n <= 3 \
+                    and not self.tail:
+                ngrams.append(tagger)
+            elif type(tagger) is SuffixTagger:
+                self.tail.append(tagger)
+            elif type(tagger) is RegexpTagger:
+                self.tail.append([(regexp, self._code(tag))
+                                  for regexp, tag in tagger._regexs])
+            elif type(tagger) is DefaultTagger:
+                self.tail.append(self._code(tagger.choose_tag(None, 0,
+                                                              None)))
+            else:
+                raise ValueError('cannot fuse a {} here'.format(
+                        type(tagger).__name__))
+
+        # the contexts of each word, in chain order: (n, {history: tag})
+        contexts = {}
+        # tag codes of words known without context (from a unigram tagger)
+        known = {}
+        for tagger in ngrams:
+            n = tagger._n
+            unigram = isinstance(tagger, UnigramTagger)
+            for context, tag in tagger._context_to_tag.iteritems():
+                if unigram:
+                    history, word = (), context
+                else:
+                    history, word = context
+                if word in known:
+                    continue # a unigram tagger above already answers
+                if n == 1:
+                    known[word] = self._code(tag)
+                    continue
+                key = self._key(n, history)
+                tables = contexts.setdefault(word, [])
+                if not tables or tables[-1][0] is not tagger:
+                    tables.append((tagger, {}))
+                tables[-1][1].setdefault(key, self._code(tag))
+
+        # words with contexts: (((n, table), ...), tag code or None)
+        self.contextual = {}
+        for word, tables in contexts.iteritems():
+            self.contextual[word] = (tuple((t._n, d) for t, d in tables),
+                                     known.pop(word, None))
+        # words always given the same tag
+        self.simple = known
+        # the tags the bottom of the chain gave unknown words
+        self.memo = {}
+
+    def _code(self, tag):
+        """Return the code of a tag, adding it if it is new."""
+        try:
+            return self.codes[tag]
+        except KeyError:
+            self.codes[tag] = len(self.names)
+            self.names.append(tag)
+            return self.codes[tag]
+
+    def _key(self, n, history):
+        """Return the integer key of a tuple of up to n - 1 previous tags.
+
+           The codes of the tags, padded on the left with 0 (before the
+           start of the sentence) to n - 1 of them, are read as a number.
+        """
+        codes = [0] * (n - 1 - len(history)) + \
+                [self._code(t) for t in history]
+        key = 0
+        for code in codes:
+            key = (key << _SHIFT) + code
+        return key
+
+    def _tail(self, word):
+        """Return the tag code the bottom of the chain gives a word."""
+        tag = self.memo.get(word)
+        if tag is None:
+            for step in self.tail:
+                if isinstance(step, list):
+                    for regexp, regexp_tag in step:
+                        if regexp.match(word):
+                            tag = regexp_tag
+                            break
+                elif isinstance(step, SuffixTagger):
+                    guess = step.guess(word)
+                    if guess is not None:
+                        tag = self._code(guess)
+                else:
+                    tag = step
+                if tag is not None:
+                    break
+            else:
+                tag = self._code(None)
+            if len(self.memo) >= self.max_memo:
+                self.memo.clear()
+            self.memo[word] = tag
+        return tag
+
+    def tag(self, tokens):
+        # tag codes (tag id + 1): most words need no context, so look them
+        # all up at once and then fill in the gaps from left to right
+        codes = map(self.simple.get, tokens)
+        if None in codes:
+            contextual, memo = self.contextual, self.memo
+            for i, code in enumerate(codes):
+                if code is not None:
+                    continue
+                word = tokens[i]
+                entry = contextual.get(word)
+                if entry is not None:
+                    tables, code = entry
+                    prev1 = codes[i - 1] if i > 0 else 0
+                    for n, contexts in tables:
+                        if n == 2:
+                            found = contexts.get(prev1)
+                        else:
+                            found = contexts.get(
+                                ((codes[i - 2] if i > 1 else 0) << _SHIFT)
+                                + prev1)
+                        if found is not None:
+                            code = found
+                            break
+                if code is None:
+                    code = memo.get(word)
+                    if code is None:
+                        code = self._tail(word)
+                codes[i] = code
+        return zip(tokens, map(self.names.__getitem__, codes))
+
+    def tag_sents(self, sentences):
+        """Tag a sequence of sentences (lists of tokens)."""
+        return [self.tag(tokens) for tokens in sentences]
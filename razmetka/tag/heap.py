@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Size the Java heap for training a Stanford model, and learn from it.
+
+   A MaxentTagger's memory grows with the number of training tokens times
+   the number of tags (it keeps a probability for every tag of every
+   context while it trains), with the number of features its arch
+   extracts per token, and with the vocabulary. A HeapManager estimates
+   the heap a fold needs from those statistics, runs the trainer with it,
+   and if the JVM runs out of memory, trains again with a larger heap.
+   The peak resident memory of every run (or the heap that proved too
+   small) is recorded in a history file, and later estimates for the same
+   arch are scaled so that they would have covered what was observed.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from razmetka.util import trace
+from razmetka.util.store import CorpusStore
+
+from .config import PATH_TO_CACHE_DIR
+from .schedule import JVM_OVERHEAD, heap_bytes, physical_memory
+from .train import TrainingRun
+
+PATH_TO_HEAP_HISTORY = os.path.join(PATH_TO_CACHE_DIR, 'heap_history.json')
+"""Default file where observed training memory is recorded."""
+
+BASE_HEAP = 64 * 1024 ** 2
+"""Heap (in bytes) a MaxentTagger needs before it reads any data."""
+
+TAG_BYTES = 8
+"""Bytes per training token per tag (one double per tag per context)."""
+
+FEATURE_BYTES = 48
+"""Bytes per training token per feature extractor."""
+
+WORD_BYTES = 256
+"""Bytes per word type of the training data."""
+
+ARCH_EXTRACTORS = {'generic': 12, 'left3words': 6, 'left5words': 8,
+                   'bidirectional': 12, 'bidirectional5words': 16,
+                   'naacl2003unknowns': 8, 'naacl2003conjunctions': 4,
+                   'lnaacl2003unknowns': 8, 'wordshapes': 2,
+                   'unicodeshapes': 2, 'chinesedictionaryfeatures': 6}
+"""Approximate number of feature extractors of each arch macro; any other
+   arch component (words(-1,1), suffix(4), ...) counts as one."""
+
+FoldStats = collections.namedtuple('FoldStats', [
+    'tokens', 'tags', 'word_types', 'arch'])
+"""What a heap estimate is based on.
+
+   tokens (int) : tokens in the training file
+   tags (int) : distinct tags in it
+   word_types (int) : distinct words in it
+   arch (str) : the props file's feature architecture, e.g. 'generic'
+"""
+
+def fold_stats(train_file_path, separator='_', encoding='utf-8',
+               arch='generic'):
+    """Return the FoldStats of a hand-tagged training file."""
+    tokens = 0
+    tags, words = set(), set()
+    with CorpusStore(train_file_path, encoding=encoding) as store:
+        for sentence in store:
+            for token in sentence.split():
+                parts = token.split(separator, 1)
+                words.add(parts[0])
+                if len(parts) > 1:
+                    tags.add(parts[1])
+                tokens += 1
+    return FoldStats(tokens=tokens, tags=len(tags), word_types=len(words),
+                     arch=arch)
+
+def arch_extractors(arch):
+    """Return the approximate number of feature extractors of an arch."""
+    components, depth, start = [], 0, 0
+    for i, c in enumerate(arch):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            components.append(arch[start:i])
+            start = i + 1
+    components.append(arch[start:])
+    count = 0
+    for component in components:
+        name = component.strip().partition('(')[0]
+        if name:
+            count += ARCH_EXTRACTORS.get(name, 1)
+    return max(count, 1)
+
+def model_bytes(stats):
+    """Return the heap (in bytes) the memory model gives a fold."""
+    return (BASE_HEAP + stats.tokens * max(stats.tags, 1) * TAG_BYTES +
+            stats.tokens * arch_extractors(stats.arch) * FEATURE_BYTES +
+            stats.word_types * WORD_BYTES)
+
+def heap_option(size):
+    """Return a Java heap option ('-mx1536m') for a size in bytes."""
+    return '-mx{}m'.format(-(-size // 1024 ** 2))
+
+class HeapManager(object):
+    """Choose heap sizes for training and retry runs that ran out.
+
+       Usage:
+
+           manager = HeapManager()
+           stats = fold_stats('train_01.train')
+           run = manager.train(stats, lambda heap_size: train_tagger(
+                   props_file='props_01.props', heap_size=heap_size))
+
+       A manager may be shared by folds trained in several threads.
+    """
+
+    def __init__(self, history_path=PATH_TO_HEAP_HISTORY, min_heap='256m',
+                 max_heap=None, headroom=1.25, growth=2.0, max_attempts=3,
+                 window=20, max_history=1000):
+        """Initialize the manager, reading the history file if there is one.
+
+           Parameters
+           ----------
+             history_path (str) : where observations are kept between
+               runs; None keeps them in memory only
+             min_heap (int / str) : smallest heap given (bytes, or e.g.
+               '256m')
+             max_heap (int / str) : largest heap given; defaults to 80% of
+               physical memory, less JVM_OVERHEAD
+             headroom (float) : factor an estimate is raised by, on top
+               of what earlier runs needed
+             growth (float) : factor the heap grows by (at least) when a
+               run runs out of memory
+             max_attempts (int) : most times a fold is trained
+             window (int) : number of recent observations of an arch its
+               estimates are scaled by
+             max_history (int) : number of observations kept
+        """
+        self.history_path = history_path
+        self.min_heap = heap_bytes(min_heap)
+        if max_heap is None:
+            memory = physical_memory()
+            max_heap = (int(memory * 0.8) - JVM_OVERHEAD if memory
+                        else 32 * 1024 ** 3)
+        self.max_heap = max(heap_bytes(max_heap), self.min_heap)
+        self.headroom = headroom
+        self.growth = growth
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_history = max_history
+        self.lock = threading.Lock()
+        self.history = self._load()
+
+    def _load(self):
+        """Read the observations in the history file (none if absent)."""
+        if self.history_path is None:
+            return []
+        try:
+            with open(self.history_path) as f:
+                history = json.load(f)
+        except (IOError, OSError, ValueError):
+            return []
+        return history if isinstance(history, list) else []
+
+    def _save(self):
+        """Write the observations to the history file (under the lock)."""
+        if self.history_path is None:
+            return
+        temp_name = '{}.{}.tmp'.format(self.history_path, os.getpid())
+        try:
+            directory = os.path.dirname(self.history_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(temp_name, 'w') as f:
+                json.dump(self.history, f)
+            os.rename(temp_name, self.history_path)
+        except (IOError, OSError):
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+
+    def factor(self, arch):
+        """Return how much the memory model underestimates an arch.
+
+           That is the largest ratio of needed to modelled heap among the
+           arch's recent observations, or 1.0 if there are none.
+        """
+        with self.lock:
+            ratios = [o['ratio'] for o in self.history
+                      if o.get('arch') == arch]
+        ratios = ratios[-self.window:]
+        return max(ratios) if ratios else 1.0
+
+    def estimate(self, stats):
+        """Return the heap (in bytes) to train a fold with."""
+        size = int(model_bytes(stats) * self.factor(stats.arch) *
+                   self.headroom)
+        return min(max(size, self.min_heap), self.max_heap)
+
+    def heap_size(self, stats):
+        """Return the Java heap option to train a fold with."""
+        return heap_option(self.estimate(stats))
+
+    def fold_memory(self, stats, heap_size=None):
+        """Return the memory (bytes) a fold's Java process may claim."""
+        if heap_size is None:
+            heap_size = self.estimate(stats)
+        return heap_bytes(heap_size) + JVM_OVERHEAD
+
+    def record(self, stats, run):
+        """Add what a training run needed to the history.
+
+           A run that ran out of memory needed more than its heap (growth
+           times as much is assumed); one that finished needed its peak
+           resident memory less JVM_OVERHEAD. Runs that failed otherwise,
+           or whose memory was not measured, teach nothing.
+        """
+        if run.out_of_memory:
+            needed = heap_bytes(run.heap_size) * self.growth
+        elif run.returncode == 0 and run.peak_rss:
+            needed = max(run.peak_rss - JVM_OVERHEAD, 0)
+        else:
+            return
+        observation = dict(stats._asdict(), heap=heap_bytes(run.heap_size),
+                           peak_rss=run.peak_rss,
+                           out_of_memory=run.out_of_memory,
+                           ratio=float(needed) / model_bytes(stats),
+                           time=time.time())
+        with self.lock:
+            self.history.append(observation)
+            del self.history[:-self.max_history]
+            self._save()
+
+    def train(self, stats, train, heap_size=None):
+        """Train a fold, with a larger heap each time it runs out.
+
+           Parameters
+           ----------
+             stats (FoldStats) : the fold's training data
+             train (function) : called as train(heap_size) to train the
+               model, e.g. with train_tagger(); returns a TrainingRun (or
+               just an exit status, which can't be told from running out
+               of memory)
+             heap_size (str) : the heap of the first attempt (estimated
+               from stats if None)
+
+           Returns
+           -------
+             (TrainingRun) : the last attempt
+        """
+        if heap_size is None:
+            heap_size = self.heap_size(stats)
+        with trace.span('heap.train', tokens=stats.tokens, tags=stats.tags,
+                        arch=stats.arch, heap_size=heap_size) as span:
+            for attempt in xrange(1, self.max_attempts + 1):
+                start = time.time()
+                run = train(heap_size)
+                if not isinstance(run, TrainingRun):
+                    run = TrainingRun(returncode=run, heap_size=heap_size,
+                                      peak_rss=None, out_of_memory=False,
+                                      seconds=time.time() - start)
+                self.record(stats, run)
+                if not run.out_of_memory:
+                    break
+                size = heap_bytes(heap_size)
+                if size >= self.max_heap:
+                    break
+                heap_size = heap_option(min(
+                        max(int(size * self.growth), self.estimate(stats)),
+                        self.max_heap))
+            span.set(attempts=attempt, final_heap_size=run.heap_size,
+                     returncode=run.returncode, peak_rss=run.peak_rss,
+                     out_of_memory=run.out_of_memory)
+        return run
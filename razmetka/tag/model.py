@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Save Brill/n-gram tagger stacks in a memory-mappable binary format.
+
+   A model file holds a fixed header, a short JSON description of the
+   stack (tags, backoff chain, regular expressions, word endings, Brill
+   rules) and
+   binary tables:
+
+     * the lexicon: every word as UTF-8, an offset table and an
+       open-addressing hash table from word to word id, and
+     * one open-addressing hash table per n-gram tagger, from an integer
+       (word id, previous tags) context key to a tag id.
+
+   Loading a model only parses the header and the JSON; the tables are
+   memory-mapped and searched in place, so a model loads in about the same
+   time whatever its size, and every process using the same model file
+   shares one copy of its pages.
+"""
+
+import itertools
+import json
+import mmap
+import re
+import struct
+import time
+import zlib
+
+from nltk.tag.api import TaggerI
+from nltk.tag.brill import BrillTagger, Pos, Word
+from nltk.tag.sequential import DefaultTagger, NgramTagger, RegexpTagger, \
+                                UnigramTagger
+from nltk.tbl.rule import Rule
+
+from razmetka.util.memory import rss_bytes
+
+from .rules import CompiledBrillTagger
+from .suffix import SuffixTagger
+
+MODEL_MAGIC = b'RZMMODEL'
+MODEL_VERSION = 2
+"""Bump whenever the layout of model files changes."""
+
+READABLE_VERSIONS = (1, 2)
+"""Versions of model files load_model() can still read."""
+
+_HEADER = struct.Struct('<8sHHQ') # magic, version, reserved, JSON size
+_SLOT = struct.Struct('<QI')      # key + 1 (0 for empty), tag id
+_WORD_SLOT = struct.Struct('<I')  # word id + 1 (0 for empty)
+_OFFSET = struct.Struct('<Q')
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+def is_model_file(path):
+    """Return True if path is a file written by save_model()."""
+    with open(path, 'rb') as f:
+        return f.read(len(MODEL_MAGIC)) == MODEL_MAGIC
+
+def _capacity(count):
+    """Return a power of two at least twice count."""
+    capacity = 8
+    while capacity < 2 * count:
+        capacity *= 2
+    return capacity
+
+def _word_hash(data):
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+def _key_hash(key, bits):
+    return ((key * _GOLDEN) & _MASK64) >> (64 - bits)
+
+def _as_unicode(word):
+    return word if isinstance(word, unicode) else word.decode('utf-8')
+
+def _pad(data):
+    """Pad a byte string to a multiple of eight bytes."""
+    return data + b'\0' * (-len(data) % 8)
+
+class LowercasingTagger(TaggerI):
+    """A tagger trained on lower-cased words, tagging words in any case.
+
+       TTBrillTaggerTrainer lower-cases its corpus, so the taggers it
+       trains only know lower-case words. This wraps one of them, passing
+       it lower-cased tokens and returning the tokens as they were given.
+    """
+
+    def __init__(self, tagger):
+        self.tagger = tagger
+
+    def tag(self, tokens):
+        tagged = self.tagger.tag([w.lower() for w in tokens])
+        return [(w, t) for w, (_, t) in itertools.izip(tokens, tagged)]
+
+def _unwrap(tagger):
+    """Split a tagger stack into (lower, rules, tag counts, chain)."""
+    lower = False
+    rules = ()
+    tag_counts = {}
+    if isinstance(tagger, LowercasingTagger):
+        lower = True
+        tagger = tagger.tagger
+    if isinstance(tagger, BrillTagger):
+        rules = tagger.rules()
+        if isinstance(tagger, CompiledBrillTagger):
+            tag_counts = tagger.tag_counts()
+        tagger = tagger._initial_tagger
+    taggers = getattr(tagger, '_taggers', None)
+    if taggers is None:
+        raise ValueError('cannot save a {}'.format(type(tagger).__name__))
+    for t in taggers:
+        if isinstance(t, NgramTagger) and t._n <= 3:
+            continue
+        if type(t) in (SuffixTagger, RegexpTagger, DefaultTagger):
+            continue
+        raise ValueError('cannot save a {}'.format(type(t).__name__))
+    return lower, rules, tag_counts, taggers
+
+class _Builder(object):
+    """Lay out the tables of a model file."""
+
+    def __init__(self):
+        self.tags = {}
+        self.tag_names = []
+        self.words = {}
+        self.word_names = []
+        self.sections = []
+        self.size = 0
+
+    def tag(self, tag):
+        if tag not in self.tags:
+            self.tags[tag] = len(self.tag_names)
+            self.tag_names.append(tag)
+        return self.tags[tag]
+
+    def word(self, word):
+        word = _as_unicode(word)
+        if word not in self.words:
+            self.words[word] = len(self.word_names)
+            self.word_names.append(word)
+        return self.words[word]
+
+    def section(self, data):
+        """Add a block of bytes and return its offset in the data."""
+        offset = self.size
+        data = _pad(data)
+        self.sections.append(data)
+        self.size += len(data)
+        return offset
+
+    def ngram_table(self, n, context_to_tag, unigram):
+        """Encode one n-gram tagger's contexts; return its description."""
+        entries = []
+        for context, tag in context_to_tag.iteritems():
+            if unigram:
+                history, word = (), context
+            else:
+                history, word = context
+            entries.append((self.word(word),
+                            [self.tag(t) + 1 for t in history], self.tag(tag)))
+        return {'type': 'ngram', 'n': n, 'entries': entries}
+
+    def hash_table(self, entries):
+        """Write an n-gram table's hash slots; return (offset, bits)."""
+        capacity = _capacity(len(entries))
+        bits = capacity.bit_length() - 1
+        slots = [(0, 0)] * capacity
+        for key, tag in entries:
+            slot = _key_hash(key, bits)
+            while slots[slot][0]:
+                slot = (slot + 1) & (capacity - 1)
+            slots[slot] = (key + 1, tag)
+        data = b''.join(_SLOT.pack(k, t) for k, t in slots)
+        return self.section(data), bits
+
+    def lexicon(self):
+        """Write the words, their offsets and their hash table."""
+        encoded = [w.encode('utf-8') for w in self.word_names]
+        offsets = [0]
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        capacity = _capacity(len(encoded))
+        slots = [0] * capacity
+        for i, data in enumerate(encoded):
+            slot = _word_hash(data) & (capacity - 1)
+            while slots[slot]:
+                slot = (slot + 1) & (capacity - 1)
+            slots[slot] = i + 1
+        return {
+            'strings': self.section(b''.join(encoded)),
+            'offsets': self.section(b''.join(_OFFSET.pack(o)
+                                             for o in offsets)),
+            'slots': self.section(b''.join(_WORD_SLOT.pack(s)
+                                           for s in slots)),
+            'bits': capacity.bit_length() - 1,
+            'count': len(encoded),
+            }
+
+def save_model(tagger, path):
+    """Write a tagger stack to a model file.
+
+       Parameters
+       ----------
+         tagger (TaggerI) : a LowercasingTagger, BrillTagger or backoff
+           chain (from TTBrillTaggerTrainer.train_tagger() or
+           backoff_chain()) made of n-gram taggers (n <= 3), suffix
+           taggers, regular expression taggers and default taggers
+         path (str) : where to write it
+    """
+    lower, rules, tag_counts, taggers = _unwrap(tagger)
+    builder = _Builder()
+    chain = []
+    for t in taggers:
+        if isinstance(t, NgramTagger):
+            chain.append(builder.ngram_table(
+                    t._n, t._context_to_tag, isinstance(t, UnigramTagger)))
+        elif isinstance(t, SuffixTagger):
+            chain.append({'type': 'suffix', 'max_length': t.max_length,
+                          'endings': dict(
+                              (ending, builder.tag(tag))
+                              for ending, tag in t.table().iteritems())})
+        elif isinstance(t, RegexpTagger):
+            chain.append({'type': 'regexp', 'patterns': [
+                [r.pattern, r.flags, builder.tag(tag)]
+                for r, tag in t._regexs]})
+        else:
+            chain.append({'type': 'default',
+                          'tag': builder.tag(t.choose_tag(None, 0, None))})
+    encoded_rules = []
+    for rule in rules:
+        encoded_rules.append([
+            rule.templateid, rule.original_tag, rule.replacement_tag,
+            [[type(feature).__name__, list(feature.positions), value]
+             for feature, value in rule._conditions]])
+        for feature, value in rule._conditions:
+            if not isinstance(feature, (Word, Pos)):
+                raise ValueError('cannot save a rule with a {}'.format(
+                        type(feature).__name__))
+
+    # contexts pack (word id, tag id + 1 ...) into one integer key, in
+    # base len(tags) + 1 so that 0 can stand for "no tag"
+    base = len(builder.tag_names) + 1
+    for link in chain:
+        if link['type'] != 'ngram':
+            continue
+        entries = []
+        for word, history, tag in link.pop('entries'):
+            history = [0] * (link['n'] - 1 - len(history)) + history
+            key = word
+            for t in history:
+                key = key * base + t
+            entries.append((key, tag))
+        link['offset'], link['bits'] = builder.hash_table(entries)
+    lexicon = builder.lexicon()
+
+    meta = json.dumps({
+        'lower': lower, 'tags': builder.tag_names, 'chain': chain,
+        'rules': encoded_rules, 'tag_counts': tag_counts,
+        'lexicon': lexicon,
+        }, ensure_ascii=False).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(_pad(_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, 0, len(meta))
+                     + meta))
+        for data in builder.sections:
+            f.write(data)
+
+class MappedBackoffTagger(TaggerI):
+    """A backoff chain answered from a memory-mapped model file."""
+
+    def __init__(self, data, base, tags, chain, lexicon):
+        """Set up the tagger (normally done by load_model())."""
+        self.data = data
+        self.tags = tags
+        self.tag_base = len(tags) + 1
+        self.chain = []
+        for link in chain:
+            if link['type'] == 'ngram':
+                link = dict(link, offset=base + link['offset'],
+                            mask=(1 << link['bits']) - 1)
+            elif link['type'] == 'suffix':
+                link = dict(link, tagger=SuffixTagger.from_table(
+                        link['endings'], max_length=link['max_length']))
+            elif link['type'] == 'regexp':
+                link = dict(link, patterns=[
+                    (re.compile(pattern, flags), tag)
+                    for pattern, flags, tag in link['patterns']])
+            self.chain.append(link)
+        self.strings = base + lexicon['strings']
+        self.offsets = base + lexicon['offsets']
+        self.slots = base + lexicon['slots']
+        self.word_mask = (1 << lexicon['bits']) - 1
+        self.word_count = lexicon['count']
+
+    def word_id(self, word):
+        """Return the id of a word, or None if the model doesn't know it."""
+        encoded = _as_unicode(word).encode('utf-8')
+        data, mask = self.data, self.word_mask
+        slot = _word_hash(encoded) & mask
+        while True:
+            entry = _WORD_SLOT.unpack_from(data, self.slots + 4 * slot)[0]
+            if not entry:
+                return None
+            start, end = struct.unpack_from('<QQ', data, self.offsets +
+                                            8 * (entry - 1))
+            if data[self.strings + start:self.strings + end] == encoded:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def lookup(self, link, key):
+        """Return the tag id an n-gram table gives a context key, or None."""
+        data, mask, offset = self.data, link['mask'], link['offset']
+        slot = _key_hash(key, link['bits'])
+        key += 1
+        while True:
+            entry, tag = _SLOT.unpack_from(data, offset + _SLOT.size * slot)
+            if entry == key:
+                return tag
+            if not entry:
+                return None
+            slot = (slot + 1) & mask
+
+    def tag(self, tokens):
+        tags = []
+        base = self.tag_base
+        for i, token in enumerate(tokens):
+            word = self.word_id(token)
+            tag = None
+            for link in self.chain:
+                kind = link['type']
+                if kind == 'ngram':
+                    if word is None:
+                        continue
+                    key = word
+                    for j in xrange(i - link['n'] + 1, i):
+                        if j < 0:
+                            key *= base
+                        elif tags[j] is None:
+                            break # no context holds an untagged word
+                        else:
+                            key = key * base + tags[j] + 1
+                    else:
+                        tag = self.lookup(link, key)
+                elif kind == 'suffix':
+                    tag = link['tagger'].guess(token)
+                elif kind == 'regexp':
+                    for regexp, regexp_tag in link['patterns']:
+                        if regexp.match(token):
+                            tag = regexp_tag
+                            break
+                else:
+                    tag = link['tag']
+                if tag is not None:
+                    break
+            tags.append(tag)
+        names = self.tags
+        return [(token, names[t] if t is not None else None)
+                for token, t in zip(tokens, tags)]
+
+class ModelFile(object):
+    """An open model file and the tagger stack it holds."""
+
+    def __init__(self, path):
+        """Map the file and build its tagger, timing how long it takes."""
+        rss_before = rss_bytes()
+        start = time.time()
+        self.path = path
+        self._file = open(path, 'rb')
+        self.data = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+        magic, version, reserved, meta_size = _HEADER.unpack_from(self.data)
+        if magic != MODEL_MAGIC:
+            raise ValueError('not a model file: {}'.format(path))
+        if version not in READABLE_VERSIONS:
+            raise ValueError('{} is a version {} model file; this is '
+                             'version {}'.format(path, version,
+                                                 MODEL_VERSION))
+        self.version = version
+        self.size = len(self.data)
+        meta_end = _HEADER.size + meta_size
+        meta = json.loads(self.data[_HEADER.size:meta_end].decode('utf-8'))
+        base = meta_end + (-meta_end % 8)
+
+        tagger = MappedBackoffTagger(self.data, base, meta['tags'],
+                                     meta['chain'], meta['lexicon'])
+        if meta['rules']:
+            features = {'Word': Word, 'Pos': Pos}
+            rules = [Rule(templateid, original, replacement,
+                          [(features[name](positions), value)
+                           for name, positions, value in conditions])
+                     for templateid, original, replacement, conditions
+                     in meta['rules']]
+            tagger = CompiledBrillTagger(tagger, rules,
+                                         tag_counts=meta.get('tag_counts'))
+        if meta['lower']:
+            tagger = LowercasingTagger(tagger)
+        self.tagger = tagger
+        self.load_seconds = time.time() - start
+        rss_after = rss_bytes()
+        self.rss = rss_after
+        self.rss_increase = None
+        if rss_before is not None and rss_after is not None:
+            self.rss_increase = rss_after - rss_before
+
+    def close(self):
+        """Unmap the file; its tagger can't be used afterwards."""
+        self.data.close()
+        self._file.close()
+
+def load_model(path):
+    """Return the ModelFile at path (see ModelFile.tagger)."""
+    return ModelFile(path)
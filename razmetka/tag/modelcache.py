@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Keep trained Stanford tagger models, keyed by what went into them.
+
+   Training a MaxentTagger takes minutes, and repeated cross-validation
+   runs retrain the same models from byte-identical training files. A
+   ModelCache stores each trained model in a DiskCache under a key made
+   from the contents of the training file, the settings written to the
+   props file (see FilePair.write_props) and the version of the tagger
+   jar, so a later run with the same inputs copies the model instead of
+   starting Java at all.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from razmetka.util import trace
+from razmetka.util.cache import DiskCache, content_key
+
+from .config import PATH_TO_CACHE_DIR, PATH_TO_JAR
+
+PATH_TO_MODEL_CACHE = os.path.join(PATH_TO_CACHE_DIR, 'models')
+"""Default directory for cached Stanford tagger models."""
+
+MODEL_CACHE_VERSION = 1
+"""Bump whenever the way models are trained changes, to invalidate them."""
+
+def file_digest(path, block_size=1024 ** 2):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+_JAR_VERSIONS = {}
+
+def jar_version(jar_path=PATH_TO_JAR):
+    """Return a string identifying the version of a tagger jar.
+
+       The Implementation-Version of the jar's manifest if it has one,
+       plus a digest of the jar itself (remembered while the file is
+       unchanged); '' if there is no jar.
+    """
+    try:
+        stat = os.stat(jar_path)
+    except OSError:
+        return ''
+    key = (jar_path, stat.st_size, stat.st_mtime)
+    if key not in _JAR_VERSIONS:
+        version = ''
+        try:
+            with zipfile.ZipFile(jar_path) as jar:
+                for line in jar.read('META-INF/MANIFEST.MF').splitlines():
+                    if line.startswith('Implementation-Version:'):
+                        version = line.split(':', 1)[1].strip()
+        except (KeyError, IOError, zipfile.BadZipfile):
+            pass
+        _JAR_VERSIONS[key] = '{}:{}'.format(version, file_digest(jar_path))
+    return _JAR_VERSIONS[key]
+
+class ModelCache(object):
+    """A size-bounded cache of trained tagger models."""
+
+    def __init__(self, directory=PATH_TO_MODEL_CACHE,
+                 max_bytes=4 * 1024 ** 3):
+        """Initialize the cache.
+
+           Parameters
+           ----------
+             directory (str) : where models are kept (created if needed)
+             max_bytes (int) : total size the models may take up; the
+               least recently used are removed when it is exceeded
+        """
+        self.cache = DiskCache(directory, max_bytes=max_bytes)
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    def key(self, train_file_path, props_params, jar_path=PATH_TO_JAR):
+        """Return the cache key of a model.
+
+           Parameters
+           ----------
+             train_file_path (str) : the training file
+             props_params (dict) : the props file settings, other than
+               paths (FilePair.props_params)
+             jar_path (str) : the tagger jar the model is trained with
+        """
+        return content_key(str(MODEL_CACHE_VERSION),
+                           file_digest(train_file_path),
+                           json.dumps(props_params, sort_keys=True),
+                           jar_version(jar_path))
+
+    def fetch(self, key, model_path):
+        """Copy a cached model to model_path; return False on a miss.
+
+           The copy is written next to model_path and renamed into place,
+           so model_path never holds a partly copied model.
+        """
+        cached_path = self.cache.get_path(key)
+        if cached_path is None:
+            return False
+        handle, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(model_path)),
+                prefix='.tmp-')
+        os.close(handle)
+        try:
+            shutil.copyfile(cached_path, temp_path)
+            os.rename(temp_path, model_path)
+        except (IOError, OSError):
+            os.remove(temp_path)
+            # evicted by another process meanwhile: treat as a miss
+            self.cache.hits -= 1
+            self.cache.misses += 1
+            return False
+        return True
+
+    def train(self, train_file_path, props_params, model_path, train,
+              jar_path=PATH_TO_JAR):
+        """Put a trained model at model_path, from the cache if possible.
+
+           Parameters
+           ----------
+             train_file_path (str) : the training file
+             props_params (dict) : the props file settings, other than
+               paths (FilePair.props_params)
+             model_path (str) : where the trained model belongs
+             train (function) : called with no arguments to train the
+               model on a miss (e.g., a call of train_tagger()); it
+               returns a TrainingRun or an exit status, and a nonzero
+               status means training failed
+             jar_path (str) : the tagger jar the model is trained with
+
+           Returns
+           -------
+             (boolean) : True if the model came from the cache
+        """
+        with trace.span('model_cache',
+                        model=os.path.basename(model_path)) as span:
+            key = self.key(train_file_path, props_params, jar_path)
+            hit = self.fetch(key, model_path)
+            span.set(hit=hit)
+        if hit:
+            return True
+        if os.path.exists(model_path):
+            # never mistake a model left from an earlier run for this one
+            os.remove(model_path)
+        result = train()
+        if (not getattr(result, 'returncode', result) and
+                os.path.exists(model_path)):
+            self.cache.put_file(key, model_path)
+        return False
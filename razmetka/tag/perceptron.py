@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tag with a greedy averaged perceptron, trained and run in-process.
+
+   Each word is tagged left to right from a dozen features of the word
+   (itself, its endings and beginning, its shape), its neighbours and the
+   two tags already chosen before it. Features are never stored as
+   strings: each is hashed straight to one of 2 ** feature_bits buckets,
+   so the model needs no feature dictionary and its size is bounded
+   whatever the corpus. Weights are learned sparsely (a bucket holds
+   weights only for the tags it was ever updated for) and averaged over
+   every training step, then packed into a pair of typed arrays per
+   bucket: the tag numbers and their float weights.
+
+   Frequent words that (nearly) always have the same tag are looked up in
+   a tag dictionary instead, and are skipped in training.
+
+   Buckets come from Python's own hash(), so a trained model belongs to
+   the Python that trained it; it is meant to be trained and used in one
+   run, e.g. by razmetka.tag.backends.PerceptronBackend.
+"""
+
+import array
+import collections
+import random
+from itertools import izip
+
+from nltk.tag.api import TaggerI
+
+from razmetka.util import trace
+
+FEATURE_BITS = 20
+"""Default number of bits of a feature bucket (about a million buckets)."""
+
+ITERATIONS = 5
+"""Default number of passes over the training data."""
+
+TAGDICT_MIN_COUNT = 20
+"""Number of times a word must be seen to go in the tag dictionary."""
+
+TAGDICT_MIN_SHARE = 0.97
+"""Share of its occurrences a word's commonest tag must have to go in the
+   tag dictionary."""
+
+SUFFIX_LENGTHS = (1, 2, 3, 4, 5)
+"""Lengths of the word endings used as features."""
+
+def _shape(word):
+    """Return a coarse class of a word's spelling."""
+    if not word:
+        return 0
+    if word.isdigit():
+        return 1
+    if not any(c.isalnum() for c in word):
+        return 2
+    if any(c.isdigit() for c in word):
+        return 3
+    if word[0].isupper():
+        return 4
+    return 5
+
+class AveragedPerceptronTagger(TaggerI):
+    """A greedy averaged perceptron tagger (see the module docstring)."""
+
+    def __init__(self, train=None, iterations=ITERATIONS,
+                 feature_bits=FEATURE_BITS, seed=0):
+        """Initialize the tagger, training it if data is given.
+
+           Parameters
+           ----------
+             train (list) : tagged sentences, lists of (word, tag) tuples
+             iterations (int) : number of passes over the training data
+             feature_bits (int) : features are hashed to 2 ** feature_bits
+               buckets
+             seed (int) : seed for shuffling the sentences between passes
+        """
+        self.iterations = iterations
+        self.feature_bits = feature_bits
+        self.seed = seed
+        self.mask = (1 << feature_bits) - 1
+        # tag number: tag
+        self.tags = []
+        self.tagdict = {}
+        # bucket: (array of tag numbers, array of their weights)
+        self.rows = {}
+        if train is not None:
+            self.train(train)
+
+    def __repr__(self):
+        return '<AveragedPerceptronTagger: {} tags, {} buckets>'.format(
+                len(self.tags), len(self.rows))
+
+    def _features(self, words, i, prev, prev2):
+        """Return the buckets of the features of words[i]."""
+        word = words[i]
+        lower = word.lower()
+        before = words[i - 1].lower() if i > 0 else None
+        after = words[i + 1].lower() if i + 1 < len(words) else None
+        features = [(0,), (1, lower), (2, lower[:3]), (3, _shape(word)),
+                    (4, prev), (5, prev, prev2), (6, before), (7, after)]
+        for n in SUFFIX_LENGTHS:
+            if n <= len(lower):
+                features.append((20 + n, lower[-n:]))
+        mask = self.mask
+        return [hash(feature) & mask for feature in features]
+
+    def _best(self, scores):
+        """Return the number of the best scoring tag."""
+        best, best_score = 0, None
+        for t, score in enumerate(scores):
+            if best_score is None or score > best_score:
+                best, best_score = t, score
+        return best
+
+    def _predict(self, buckets):
+        """Return the number of the best tag for a word's buckets."""
+        scores = [0.0] * len(self.tags)
+        rows = self.rows
+        for bucket in buckets:
+            row = rows.get(bucket)
+            if row is not None:
+                for t, weight in izip(*row):
+                    scores[t] += weight
+        return self._best(scores)
+
+    def _make_tagdict(self, sentences):
+        """Fill the tag dictionary from the training sentences."""
+        counts = collections.defaultdict(collections.Counter)
+        for sentence in sentences:
+            for word, tag in sentence:
+                counts[word][tag] += 1
+        self.tagdict = {}
+        for word, tags in counts.iteritems():
+            tag, count = tags.most_common(1)[0]
+            total = sum(tags.itervalues())
+            if (total >= TAGDICT_MIN_COUNT and
+                    float(count) / total >= TAGDICT_MIN_SHARE):
+                self.tagdict[word] = tag
+
+    def train(self, sentences, iterations=None):
+        """Learn the weights from tagged sentences (replacing any before).
+
+           Parameters
+           ----------
+             sentences (list) : lists of (word, tag) tuples
+             iterations (int) : number of passes (self.iterations if None)
+        """
+        if iterations is None:
+            iterations = self.iterations
+        sentences = [list(sentence) for sentence in sentences if sentence]
+        with trace.span('perceptron.train', sentences=len(sentences),
+                        iterations=iterations) as span:
+            self._make_tagdict(sentences)
+            tag_ids = {}
+            self.tags = []
+            for sentence in sentences:
+                for word, tag in sentence:
+                    if tag not in tag_ids:
+                        tag_ids[tag] = len(self.tags)
+                        self.tags.append(tag)
+            # bucket: {tag number: weight}, and per (bucket, tag number)
+            # the sum of the weight over all steps up to the last change
+            # and the step of that change (for averaging)
+            weights = collections.defaultdict(dict)
+            totals = collections.defaultdict(float)
+            stamps = collections.defaultdict(int)
+            tagdict = self.tagdict
+            tag_of = self.tags
+            step = 0
+            order = list(sentences)
+            shuffle = random.Random(self.seed).shuffle
+            for iteration in xrange(iterations):
+                correct = total = 0
+                for sentence in order:
+                    words = [word for word, tag in sentence]
+                    prev, prev2 = None, None
+                    for i, (word, tag) in enumerate(sentence):
+                        guess = tagdict.get(word)
+                        if guess is None:
+                            buckets = self._features(words, i, prev, prev2)
+                            scores = [0.0] * len(tag_of)
+                            for bucket in buckets:
+                                row = weights.get(bucket)
+                                if row:
+                                    for t, weight in row.iteritems():
+                                        scores[t] += weight
+                            guess = tag_of[self._best(scores)]
+                            if guess != tag:
+                                truth = tag_ids[tag]
+                                wrong = tag_ids[guess]
+                                for bucket in buckets:
+                                    row = weights[bucket]
+                                    for t, change in ((truth, 1.0),
+                                                      (wrong, -1.0)):
+                                        key = (bucket, t)
+                                        weight = row.get(t, 0.0)
+                                        totals[key] += \
+                                            (step - stamps[key]) * weight
+                                        stamps[key] = step
+                                        row[t] = weight + change
+                            step += 1
+                        correct += guess == tag
+                        total += 1
+                        prev2, prev = prev, guess
+                shuffle(order)
+                span.set(**{'accuracy_{}'.format(iteration + 1):
+                            float(correct) / total if total else None})
+            self._average(weights, totals, stamps, step)
+            span.set(tokens=total if iterations else None,
+                     tags=len(self.tags), buckets=len(self.rows),
+                     tagdict=len(self.tagdict))
+        return self
+
+    def _average(self, weights, totals, stamps, step):
+        """Pack the averaged weights into compact per-bucket arrays."""
+        code = 'H' if len(self.tags) <= 0xffff else 'I'
+        self.rows = {}
+        for bucket, row in weights.iteritems():
+            ids, values = array.array(code), array.array('f')
+            for t, weight in sorted(row.iteritems()):
+                key = (bucket, t)
+                total = totals[key] + (step - stamps[key]) * weight
+                average = total / step if step else 0.0
+                if average:
+                    ids.append(t)
+                    values.append(average)
+            if ids:
+                self.rows[bucket] = (ids, values)
+
+    def tag(self, tokens):
+        """Tag a sentence, a list of words, left to right."""
+        words = list(tokens)
+        tagged = []
+        tagdict = self.tagdict
+        if not self.tags:
+            return [(word, None) for word in words]
+        prev, prev2 = None, None
+        for i, word in enumerate(words):
+            tag = tagdict.get(word)
+            if tag is None:
+                tag = self.tags[self._predict(
+                        self._features(words, i, prev, prev2))]
+            tagged.append((word, tag))
+            prev2, prev = prev, tag
+        return tagged
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Keep warm Stanford tagger processes around for repeated tagging.
+
+   Every call to StanfordPOSTagger.tag() or tag_sents() starts a new JVM and
+   deserializes the model from scratch. A TaggerPool instead starts one or
+   more `MaxentTagger` processes per model and talks to them over stdin and
+   stdout, one sentence per line, for as long as the pool is open.
+"""
+
+import os
+import Queue
+import sys
+import threading
+import subprocess32
+
+from nltk.tag.api import TaggerI
+
+from . import ten
+from .config import PATH_TO_JAR
+from .files import to_unicode_or_bust as tuob
+
+def maxent_command(model_path, jar_path=PATH_TO_JAR, heap_size='-mx1g',
+                   encoding='utf-8'):
+    """Return the command line for a MaxentTagger reading from stdin."""
+    return ['java', heap_size, '-classpath', jar_path,
+            'edu.stanford.nlp.tagger.maxent.MaxentTagger',
+            '-model', model_path, '-tokenize', 'false',
+            '-sentenceDelimiter', 'newline', '-encoding', encoding]
+
+def stub_command(model_path=None, separator='_'):
+    """Return the command line for the Java-free stub tagger."""
+    command = [sys.executable, '-m', 'razmetka.tag.stub',
+               '--separator', separator]
+    if model_path is not None:
+        command += ['--model', model_path]
+    return command
+
+class TaggerWorkerError(RuntimeError):
+    """A tagger process died and could not be brought back."""
+
+class TaggerWorker(object):
+    """A single long-lived tagger process speaking the line protocol."""
+
+    def __init__(self, command, separator='_', encoding='utf-8'):
+        """Initialize the worker; the process is started lazily.
+
+           Parameters
+           ----------
+             command (list) : the command line that starts the tagger
+             separator (basestring) : the character the tagger uses to
+               separate words from their part-of-speech tags
+             encoding (str) : encoding used on the tagger's stdin/stdout
+        """
+        self.command = command
+        self.sep = tuob(separator)
+        self.enc = encoding
+        self.proc = None
+        self.started = False
+        self.restarts = 0
+        self.write_error = None
+
+    def start(self):
+        """Start (or restart) the tagger process."""
+        if self.started:
+            self.restarts += 1
+        self.stop()
+        self.started = True
+        with open(os.devnull, 'wb') as devnull:
+            self.proc = subprocess32.Popen(
+                    self.command, stdin=subprocess32.PIPE,
+                    stdout=subprocess32.PIPE, stderr=devnull,
+                    bufsize=1, close_fds=True)
+
+    def stop(self):
+        """Close the tagger's stdin and wait for it to exit."""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except IOError:
+            pass
+        try:
+            proc.wait(timeout=5)
+        except subprocess32.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def alive(self):
+        """Return True if the tagger process is running."""
+        return self.proc is not None and self.proc.poll() is None
+
+    def parse_line(self, line):
+        """Turn one line of tagger output into a list of (word, tag)."""
+        return [tuple(t.rsplit(self.sep, 1)) for t in tuob(line,
+                self.enc).split()]
+
+    def _write(self, lines):
+        """Feed lines to the tagger (run alongside the reader thread)."""
+        try:
+            for line in lines:
+                self.proc.stdin.write(line)
+            self.proc.stdin.flush()
+        except IOError as e:
+            self.write_error = e
+
+    def tag_sents(self, sentences):
+        """Tag a batch of tokenized sentences.
+
+           Raises TaggerWorkerError (after stopping the process) if the
+           tagger exits or closes its output mid-batch.
+        """
+        if not self.alive():
+            self.start()
+        wanted = [i for i, s in enumerate(sentences) if s]
+        lines = [(u' '.join(tuob(w) for w in sentences[i]) +
+                  u'\n').encode(self.enc) for i in wanted]
+        # write from a second thread so that a batch bigger than the pipe
+        # buffers can't deadlock against the tagger's own output
+        self.write_error = None
+        writer = threading.Thread(target=self._write, args=(lines,))
+        writer.daemon = True
+        writer.start()
+        results = [[] for s in sentences]
+        try:
+            for i in wanted:
+                line = self.proc.stdout.readline()
+                # the Java tagger may put blank lines between sentences
+                while line and not line.strip():
+                    line = self.proc.stdout.readline()
+                if not line:
+                    raise IOError(self.write_error or
+                                  'tagger closed its output')
+                results[i] = self.parse_line(line)
+        except IOError as e:
+            self.stop()
+            writer.join()
+            raise TaggerWorkerError('{}: {}'.format(self.command[0], e))
+        writer.join()
+        return results
+
+class TaggingRequest(object):
+    """A batch of sentences waiting for (or holding) its tagged result."""
+
+    def __init__(self, sentences):
+        self.sentences = sentences
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self):
+        """Block until the batch is tagged, then return the result."""
+        # a timeout keeps the wait interruptible with Ctrl-C on Python 2
+        while not self.done.wait(1):
+            pass
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class TaggerPool(TaggerI):
+    """A pool of warm tagger processes sharing one model."""
+
+    def __init__(self, model_path, num_workers=1, batch_size=100,
+                 max_pending=None, max_retries=2, separator='_',
+                 jar_path=PATH_TO_JAR, heap_size='-mx1g', encoding='utf-8',
+                 command=None):
+        """Initialize the pool and start its workers.
+
+           Parameters
+           ----------
+             model_path (str) : path to the trained tagger model
+             num_workers (int) : number of tagger processes to keep running
+             batch_size (int) : number of sentences sent to a worker at once
+             max_pending (int) : number of batches which may wait for a free
+               worker before tag_sents() blocks; defaults to 2 * num_workers
+             max_retries (int) : number of times a batch is retried on a
+               freshly restarted worker after its worker crashed
+             separator (basestring) : word/tag separator in tagger output
+             jar_path (str) : path to the stanford-postagger.jar file
+             heap_size (str) : Java heap option for each worker
+             encoding (str) : encoding used to talk to the workers
+             command (list) : command line which starts a worker; if None,
+               the Stanford MaxentTagger is used
+        """
+        if command is None:
+            command = maxent_command(model_path, jar_path=jar_path,
+                                     heap_size=heap_size, encoding=encoding)
+        if max_pending is None:
+            max_pending = 2 * num_workers
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.requests = Queue.Queue(maxsize=max_pending)
+        self.workers = [TaggerWorker(command, separator=separator,
+                                     encoding=encoding)
+                        for i in xrange(num_workers)]
+        self.threads = []
+        for worker in self.workers:
+            thread = threading.Thread(target=self._serve, args=(worker,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _serve(self, worker):
+        """Hand queued batches to one worker until told to stop."""
+        while True:
+            request = self.requests.get()
+            if request is None:
+                worker.stop()
+                return
+            try:
+                for attempt in xrange(self.max_retries + 1):
+                    try:
+                        request.result = worker.tag_sents(request.sentences)
+                        request.error = None
+                        break
+                    except TaggerWorkerError as e:
+                        request.error = e
+                    except Exception as e:
+                        # e.g., an OSError if the tagger can't be started
+                        request.error = TaggerWorkerError('{}: {}'.format(
+                                worker.command[0], e))
+            finally:
+                # whatever happened, never leave the caller waiting
+                request.done.set()
+
+    def submit(self, sentences):
+        """Queue a batch of sentences and return its TaggingRequest.
+
+           Blocks while max_pending batches are already waiting.
+        """
+        if not self.threads:
+            raise TaggerWorkerError('the tagger pool has been closed')
+        request = TaggingRequest(sentences)
+        self.requests.put(request)
+        return request
+
+    def tag_sents(self, sentences):
+        """Tag a list of tokenized sentences across the pool's workers."""
+        sentences = list(sentences)
+        requests = [self.submit(batch) for batch in
+                    ten.chunks(sentences, n=max(self.batch_size, 1))]
+        return [s for r in requests for s in r.wait()]
+
+    def tag(self, tokens):
+        """Tag a single tokenized sentence."""
+        return self.tag_sents([tokens])[0]
+
+    def restarts(self):
+        """Return the total number of worker restarts so far."""
+        return sum(w.restarts for w in self.workers)
+
+    def close(self):
+        """Stop every worker once the batches already queued are done."""
+        for thread in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        with _POOLS_LOCK:
+            if _POOLS.get(self.model_path) is self:
+                del _POOLS[self.model_path]
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(model_path, **kwargs):
+    """Return the running TaggerPool for a model, starting it if need be."""
+    with _POOLS_LOCK:
+        if model_path not in _POOLS:
+            _POOLS[model_path] = TaggerPool(model_path, **kwargs)
+        return _POOLS[model_path]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Apply Brill rules only where they can fire.
+
+   nltk.tag.BrillTagger tries every one of its rules on every sentence.
+   Most rules can't fire in most sentences: a rule needs a token with its
+   original tag, and a rule with a word condition needs that word in the
+   sentence. CompiledBrillTagger indexes its rules by the word they need
+   (words never change) and by their original tag, queues only the rules
+   a sentence can trigger, and queues more as rules introduce new tags.
+   Queued rules are applied in their original order, so the output is
+   exactly that of applying every rule in turn.
+"""
+
+import collections
+import heapq
+
+from nltk.tag.brill import BrillTagger, Pos, Word
+
+_WORD, _POS, _OTHER = 0, 1, 2
+
+class CompiledBrillTagger(BrillTagger):
+    """A BrillTagger whose rules are indexed by what triggers them."""
+
+    def __init__(self, initial_tagger, rules, training_stats=None,
+                 tag_counts=None):
+        """Construct the tagger; see nltk.tag.BrillTagger.
+
+           Parameters
+           ----------
+             tag_counts (dict) : how often each tag occurs (e.g., in the
+               training data). A rule is only queued once the rarest of
+               the tags it needs is present, so counts make for fewer
+               queued rules; without them the tag of one of the rule's
+               conditions is used. Either way the output is the same.
+        """
+        BrillTagger.__init__(self, initial_tagger, rules, training_stats)
+        self._tag_counts = dict(tag_counts) if tag_counts else {}
+        self._compile()
+
+    @classmethod
+    def from_brill_tagger(cls, tagger, tag_counts=None):
+        """Return a CompiledBrillTagger with the rules of a BrillTagger."""
+        return cls(tagger._initial_tagger, tagger.rules(),
+                   tagger.train_stats(), tag_counts=tag_counts)
+
+    def tag_counts(self):
+        """Return the tag counts used to pick rule triggers."""
+        return dict(self._tag_counts)
+
+    def _compile(self):
+        """Build the rule tables and the trigger indexes."""
+        self._compiled = []
+        # rule numbers, by the word they need and by their original tag
+        self._by_word = collections.defaultdict(list)
+        self._by_tag = collections.defaultdict(list)
+        for i, rule in enumerate(self._rules):
+            conditions = []
+            words = []
+            tags = [rule.original_tag]
+            for feature, value in rule._conditions:
+                if type(feature) is Word:
+                    kind = _WORD
+                    words.append(value)
+                elif type(feature) is Pos:
+                    kind = _POS
+                    tags.append(value)
+                else:
+                    kind = _OTHER
+                conditions.append((kind, feature.positions, value, feature))
+            self._compiled.append((rule.original_tag, rule.replacement_tag,
+                                   tuple(conditions), frozenset(words),
+                                   frozenset(tags)))
+            if words:
+                self._by_word[words[0]].append(i)
+            elif self._tag_counts:
+                trigger = min(tags, key=lambda t: (
+                        self._tag_counts.get(t, 0), t))
+                self._by_tag[trigger].append(i)
+            else:
+                self._by_tag[tags[-1]].append(i)
+        self._word_keys = frozenset(self._by_word)
+        self._tag_keys = frozenset(self._by_tag)
+
+    def tag(self, tokens):
+        tagged_tokens = self._initial_tagger.tag(tokens)
+        tags = [t for w, t in tagged_tokens]
+        queue = self._triggered(tokens, tags)
+        if not queue:
+            return tagged_tokens
+        words = [w for w, t in tagged_tokens]
+        self.apply_rules(words, tags, queue)
+        return zip(words, tags)
+
+    def _triggered(self, words, tags):
+        """Return the numbers of the rules a sentence triggers at first."""
+        compiled = self._compiled
+        queued = set()
+        if self._word_keys:
+            found = self._word_keys.intersection(words)
+            if found:
+                word_set = frozenset(words)
+                for word in found:
+                    for r in self._by_word[word]:
+                        if compiled[r][3] <= word_set:
+                            queued.add(r)
+        for tag in self._tag_keys.intersection(tags):
+            queued.update(self._by_tag[tag])
+        return queued
+
+    def apply_rules(self, words, tags, queued=None):
+        """Apply the rules, in order, to a sentence's tags (in place).
+
+           Parameters
+           ----------
+             words (list) : the words of the sentence
+             tags (list) : their tags, as given by the initial tagger
+             queued (set) : the rules the sentence triggers, if already
+               worked out
+        """
+        compiled = self._compiled
+        by_tag = self._by_tag
+        if queued is None:
+            queued = self._triggered(words, tags)
+        if not queued:
+            return tags
+        tag_to_positions = collections.defaultdict(set)
+        for i, tag in enumerate(tags):
+            tag_to_positions[tag].add(i)
+        queue = list(queued)
+        heapq.heapify(queue)
+
+        length = len(tags)
+        while queue:
+            r = heapq.heappop(queue)
+            original, replacement, conditions, _, needed = compiled[r]
+            positions = tag_to_positions.get(original)
+            if not positions:
+                continue
+            for tag in needed:
+                if not tag_to_positions.get(tag):
+                    break
+            else:
+                needed = None
+            if needed is not None:
+                continue
+            change = []
+            for index in positions:
+                for kind, offsets, value, feature in conditions:
+                    for offset in offsets:
+                        j = index + offset
+                        if not 0 <= j < length:
+                            continue
+                        if kind == _POS:
+                            if tags[j] == value:
+                                break
+                        elif kind == _WORD:
+                            if words[j] == value:
+                                break
+                        elif feature.extract_property(
+                                zip(words, tags), j) == value:
+                            break
+                    else:
+                        break
+                else:
+                    change.append(index)
+            if not change:
+                continue
+            targets = tag_to_positions[replacement]
+            if not targets:
+                # a new tag: rules further on that start from it may fire
+                for later in by_tag.get(replacement, ()):
+                    if later > r and later not in queued:
+                        queued.add(later)
+                        heapq.heappush(queue, later)
+            for index in change:
+                tags[index] = replacement
+                positions.discard(index)
+                targets.add(index)
+        return tags
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Run cross-validation folds side by side within a memory budget."""
+
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+JVM_OVERHEAD = 256 * 1024 ** 2
+"""Memory (in bytes) a JVM uses on top of its maximum heap size."""
+
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+def heap_bytes(heap_size):
+    """Return the number of bytes in a Java heap option or size string.
+
+       Accepts '-mx1g', '-Xmx512m', '4g', '1000m', or a plain int.
+    """
+    if isinstance(heap_size, (int, long)):
+        return heap_size
+    match = re.match(r'^(?:-X?mx)?(\d+)([kmgt]?)$', heap_size.strip().lower())
+    if match is None:
+        raise ValueError('not a heap size: {!r}'.format(heap_size))
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+def physical_memory():
+    """Return the machine's physical memory in bytes (or None)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+class FoldScheduler(object):
+    """Run jobs concurrently without overcommitting cores or memory."""
+
+    def __init__(self, max_workers=None, memory_budget=None):
+        """Initialize the scheduler.
+
+           Parameters
+           ----------
+             max_workers (int) : maximum number of jobs running at once;
+               defaults to the number of CPUs
+             memory_budget (int / str) : total memory (bytes, or a size
+               such as '24g') the running jobs may claim; defaults to 80%
+               of physical memory
+        """
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        if memory_budget is None:
+            memory = physical_memory()
+            memory_budget = int(memory * 0.8) if memory else None
+        else:
+            memory_budget = heap_bytes(memory_budget)
+        self.max_workers = max(max_workers, 1)
+        self.memory_budget = memory_budget
+        self.condition = threading.Condition()
+        self.running = 0
+        self.memory_used = 0
+
+    def fits(self, memory):
+        """Return True if a job needing this much memory may start now."""
+        if self.running >= self.max_workers:
+            return False
+        if self.memory_budget is None or self.running == 0:
+            # a job larger than the whole budget still runs, just alone
+            return True
+        return self.memory_used + memory <= self.memory_budget
+
+    def run(self, jobs, callback=None):
+        """Run every job and return a dict of key: (result, seconds).
+
+           Parameters
+           ----------
+             jobs (list) : 3-tuples of (key, memory in bytes, function),
+               started in the given order as cores and memory allow
+             callback (function) : called as callback(key, result, seconds)
+               as soon as each job finishes
+        """
+        results = {}
+        errors = []
+
+        def work(key, memory, function):
+            start = time.time()
+            try:
+                result = function()
+            except Exception as e:
+                result = None
+                errors.append((key, e))
+            seconds = time.time() - start
+            with self.condition:
+                results[key] = (result, seconds)
+                if callback is not None and result is not None:
+                    callback(key, result, seconds)
+                self.running -= 1
+                self.memory_used -= memory
+                self.condition.notify_all()
+
+        threads = []
+        for key, memory, function in jobs:
+            with self.condition:
+                while not self.fits(memory):
+                    self.condition.wait(1)
+                self.running += 1
+                self.memory_used += memory
+            thread = threading.Thread(target=work,
+                                      args=(key, memory, function))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+        if errors:
+            raise errors[0][1]
+        return results
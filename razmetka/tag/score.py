@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Score tagger output against hand-tagged sentences, a fold at a time.
+
+   A FoldScorer collects the gold and predicted tags of a whole fold as
+   integer-encoded arrays (plus one flag per token saying whether the word
+   was seen in training). FoldScorer.score() then works out every figure
+   at once -- token and sentence accuracy, known and unknown word accuracy,
+   the confusion matrix and per-tag precision, recall and F1 -- with NumPy
+   if it is installed, and in plain Python otherwise. Sentences whose
+   gold and predicted lengths differ are never scored; they are listed in
+   the report instead.
+"""
+
+import array
+import collections
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .encoded import Vocabulary
+
+Misaligned = collections.namedtuple('Misaligned', 'idx gold_length '
+                                    'predicted_length')
+
+TagScore = collections.namedtuple('TagScore', 'precision recall f1 support')
+
+def _ratio(numerator, denominator):
+    return float(numerator) / denominator if denominator else 0.0
+
+def _as_numpy(column):
+    """Return a NumPy view of an array.array, without copying it."""
+    dtype = numpy.dtype('u{}'.format(column.itemsize))
+    if not column:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.frombuffer(column, dtype=dtype)
+
+class FoldScorer(object):
+    """Accumulate the gold and predicted tags of one or more folds."""
+
+    def __init__(self, known_words=None, tag_vocab=None):
+        """Initialize an empty scorer.
+
+           Parameters
+           ----------
+             known_words (set) : words seen in the training data; tokens
+               whose word is not in it count as unknown. If None, known
+               and unknown word accuracy are not reported.
+             tag_vocab (Vocabulary) : ids for the tags (a new one if None)
+        """
+        self.known_words = known_words
+        self.tag_vocab = tag_vocab if tag_vocab is not None else Vocabulary()
+        self.gold = array.array('I')
+        self.predicted = array.array('I')
+        self.known = array.array('B')
+        self.offsets = array.array('L', [0])
+        self.misaligned = []
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def add(self, gold_tags, predicted_tags, words=None, idx=None):
+        """Add one sentence; return False (and record it) if misaligned.
+
+           Parameters
+           ----------
+             gold_tags (list) : the hand-assigned tags
+             predicted_tags (list) : the tags the tagger assigned
+             words (list) : the words, used to tell known from unknown
+             idx (int / str) : where the sentence came from, for reporting
+        """
+        if len(gold_tags) != len(predicted_tags):
+            self.misaligned.append(Misaligned(idx, len(gold_tags),
+                                              len(predicted_tags)))
+            return False
+        intern = self.tag_vocab.intern
+        self.gold.extend(intern(t) for t in gold_tags)
+        self.predicted.extend(intern(t) for t in predicted_tags)
+        if self.known_words is not None and words is not None:
+            known_words = self.known_words
+            self.known.extend(1 if w in known_words else 0 for w in words)
+        else:
+            self.known.extend(itertools.repeat(1, len(gold_tags)))
+        self.offsets.append(len(self.gold))
+        return True
+
+    def add_pair(self, sentence_pair):
+        """Add a SentencePair whose auto_tagged list has been tagged."""
+        words, gold_tags = sentence_pair.split_training_tags()
+        predicted_tags = [t for w, t in sentence_pair.auto_tagged]
+        return self.add(gold_tags, predicted_tags, words=words,
+                        idx=sentence_pair.idx)
+
+    @classmethod
+    def merge(cls, scorers):
+        """Return one scorer holding the sentences of all the given ones."""
+        merged = cls()
+        merged.known_words = set()
+        for scorer in scorers:
+            # translate this scorer's tag ids into the merged vocabulary
+            mapping = [merged.tag_vocab.intern(t)
+                       for t in scorer.tag_vocab.items]
+            base = len(merged.gold)
+            merged.gold.extend(mapping[i] for i in scorer.gold)
+            merged.predicted.extend(mapping[i] for i in scorer.predicted)
+            merged.known.extend(scorer.known)
+            merged.offsets.extend(base + o for o in scorer.offsets[1:])
+            merged.misaligned.extend(scorer.misaligned)
+            if scorer.known_words is None:
+                merged.known_words = None
+            elif merged.known_words is not None:
+                merged.known_words.update(scorer.known_words)
+        return merged
+
+    def score(self):
+        """Return a ScoreReport for everything added so far."""
+        if numpy is not None:
+            counts = self._count_numpy()
+        else:
+            counts = self._count_python()
+        return ScoreReport(tags=list(self.tag_vocab.items),
+                           misaligned=list(self.misaligned),
+                           unknown_words=self.known_words is not None,
+                           **counts)
+
+    def _count_numpy(self):
+        """Work out the counts for a report with vectorized NumPy."""
+        n = len(self.tag_vocab)
+        gold = _as_numpy(self.gold)
+        predicted = _as_numpy(self.predicted)
+        known = _as_numpy(self.known).astype(bool)
+        offsets = _as_numpy(self.offsets).astype(numpy.int64)
+        correct = gold == predicted
+        # errors per sentence, from a running total of errors
+        errors = numpy.concatenate(([0], numpy.cumsum(~correct)))
+        sentence_errors = errors[offsets[1:]] - errors[offsets[:-1]]
+        pairs = gold.astype(numpy.int64) * n + predicted
+        confusion = numpy.bincount(pairs, minlength=n * n).reshape(n, n)
+        return {
+            'tokens': int(gold.size),
+            'correct': int(correct.sum()),
+            'sentences': len(self),
+            'correct_sentences': int((sentence_errors == 0).sum()),
+            'known_tokens': int(known.sum()),
+            'known_correct': int((correct & known).sum()),
+            'confusion': confusion.tolist(),
+            }
+
+    def _count_python(self):
+        """Work out the counts for a report without NumPy."""
+        n = len(self.tag_vocab)
+        confusion = [[0] * n for i in xrange(n)]
+        correct = known_tokens = known_correct = correct_sentences = 0
+        for start, end in itertools.izip(self.offsets, self.offsets[1:]):
+            sentence_correct = 0
+            for g, p, k in itertools.izip(self.gold[start:end],
+                                          self.predicted[start:end],
+                                          self.known[start:end]):
+                confusion[g][p] += 1
+                hit = g == p
+                sentence_correct += hit
+                known_tokens += k
+                known_correct += hit and k
+            correct += sentence_correct
+            correct_sentences += sentence_correct == end - start
+        return {
+            'tokens': len(self.gold),
+            'correct': correct,
+            'sentences': len(self),
+            'correct_sentences': correct_sentences,
+            'known_tokens': known_tokens,
+            'known_correct': known_correct,
+            'confusion': confusion,
+            }
+
+class ScoreReport(object):
+    """Accuracy figures and confusion matrix for one or more folds."""
+
+    def __init__(self, tags, tokens, correct, sentences, correct_sentences,
+                 known_tokens, known_correct, confusion, misaligned=(),
+                 unknown_words=True):
+        """Initialize the report (normally done by FoldScorer.score()).
+
+           Parameters
+           ----------
+             tags (list) : tag names, in confusion matrix order
+             tokens, correct (int) : scored tokens, and how many were right
+             sentences, correct_sentences (int) : scored sentences, and how
+               many had every token right
+             known_tokens, known_correct (int) : tokens whose word was seen
+               in training, and how many of them were right
+             confusion (list) : confusion[gold][predicted] token counts
+             misaligned (list) : Misaligned tuples for unscored sentences
+             unknown_words (boolean) : whether known_* are meaningful
+        """
+        self.tags = tags
+        self.tokens = tokens
+        self.correct = correct
+        self.sentences = sentences
+        self.correct_sentences = correct_sentences
+        self.known_tokens = known_tokens
+        self.known_correct = known_correct
+        self.confusion = confusion
+        self.misaligned = list(misaligned)
+        self.unknown_words = unknown_words
+
+    @property
+    def token_accuracy(self):
+        return _ratio(self.correct, self.tokens)
+
+    @property
+    def sentence_accuracy(self):
+        return _ratio(self.correct_sentences, self.sentences)
+
+    @property
+    def known_accuracy(self):
+        return _ratio(self.known_correct, self.known_tokens)
+
+    @property
+    def unknown_accuracy(self):
+        return _ratio(self.correct - self.known_correct,
+                      self.tokens - self.known_tokens)
+
+    def results(self):
+        """Return [matches, misses, total tokens, percent accuracy]."""
+        return [self.correct, self.tokens - self.correct, self.tokens,
+                100 * self.token_accuracy]
+
+    def tag_scores(self):
+        """Return an OrderedDict of tag: TagScore, most frequent first."""
+        n = len(self.tags)
+        predicted_totals = [sum(row[j] for row in self.confusion)
+                            for j in xrange(n)]
+        scores = []
+        for i, tag in enumerate(self.tags):
+            support = sum(self.confusion[i])
+            hits = self.confusion[i][i]
+            precision = _ratio(hits, predicted_totals[i])
+            recall = _ratio(hits, support)
+            f1 = _ratio(2 * precision * recall, precision + recall)
+            scores.append((tag, TagScore(precision, recall, f1, support)))
+        scores.sort(key=lambda item: (-item[1].support, item[0]))
+        return collections.OrderedDict(scores)
+
+    def confusions(self, limit=None):
+        """Return (count, gold, predicted) for errors, most common first."""
+        pairs = [(count, self.tags[i], self.tags[j])
+                 for i, row in enumerate(self.confusion)
+                 for j, count in enumerate(row) if count and i != j]
+        pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+        return pairs[:limit] if limit is not None else pairs
+
+    def lines(self, max_tags=20, max_confusions=10, confusion_matrix=False):
+        """Return the report as a list of printable lines.
+
+           Parameters
+           ----------
+             max_tags (int) : number of tags in the per-tag table (the
+               most frequent ones); None for all of them
+             max_confusions (int) : number of most common confusions
+               listed; None for all of them
+             confusion_matrix (boolean) : also print the full matrix
+        """
+        lines = [u'TOKENS:\t{} of {} correct ({:.2f}%)'.format(
+                     self.correct, self.tokens, 100 * self.token_accuracy),
+                 u'SENTENCES:\t{} of {} entirely correct ({:.2f}%)'.format(
+                     self.correct_sentences, self.sentences,
+                     100 * self.sentence_accuracy)]
+        if self.unknown_words:
+            lines.append(u'KNOWN:\t{:.2f}% of {} tokens\t'
+                         u'UNKNOWN:\t{:.2f}% of {} tokens'.format(
+                             100 * self.known_accuracy, self.known_tokens,
+                             100 * self.unknown_accuracy,
+                             self.tokens - self.known_tokens))
+        if self.misaligned:
+            lines.append(u'MISALIGNED:\t{} sentences not scored'.format(
+                    len(self.misaligned)))
+            for m in self.misaligned:
+                lines.append(u'\t{}\t{} gold tokens, {} tagged'.format(
+                        m.idx, m.gold_length, m.predicted_length))
+        lines.append(u'TAG\tPREC\tREC\tF1\tSUPPORT')
+        for tag, s in itertools.islice(self.tag_scores().iteritems(),
+                                       max_tags):
+            lines.append(u'{}\t{:.2f}\t{:.2f}\t{:.2f}\t{}'.format(
+                    tag, 100 * s.precision, 100 * s.recall, 100 * s.f1,
+                    s.support))
+        confusions = self.confusions(max_confusions)
+        if confusions:
+            lines.append(u'COUNT\tGOLD\tPREDICTED')
+            for count, gold, predicted in confusions:
+                lines.append(u'{}\t{}\t{}'.format(count, gold, predicted))
+        if confusion_matrix:
+            lines.append(u'GOLD \\ PREDICTED\t' + u'\t'.join(self.tags))
+            for tag, row in zip(self.tags, self.confusion):
+                lines.append(u'\t'.join([tag] + [unicode(c) for c in row]))
+        return lines
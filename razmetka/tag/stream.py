@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tag arbitrarily large amounts of text in bounded batches.
+
+   Sentences are read one line at a time, tagged a batch at a time and
+   written out as soon as their batch is done, so memory use depends on the
+   batch size and the number of batches in flight, never on the input.
+"""
+
+import collections
+import multiprocessing
+import sys
+
+def read_sentences(streams, encoding='utf-8'):
+    """Yield each line of each (byte) stream as a list of tokens."""
+    for stream in streams:
+        # readline, unlike iteration, doesn't read ahead on pipes
+        for line in iter(stream.readline, b''):
+            yield line.decode(encoding).split()
+
+def batches(sentences, batch_size=1000):
+    """Yield lists of up to batch_size sentences."""
+    batch = []
+    for sentence in sentences:
+        batch.append(sentence)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _tag_batch(tagger, batch):
+    """Tag the non-empty sentences of a batch, keeping empty ones empty."""
+    tagged = iter(tagger.tag_sents([s for s in batch if s]))
+    return [next(tagged) if s else [] for s in batch]
+
+class _Done(object):
+    """A finished result, with the same get() as an AsyncResult."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def get(self):
+        return self.result
+
+class _Submitted(object):
+    """A batch queued in a TaggerPool, with empty sentences put back."""
+
+    def __init__(self, pool, batch):
+        self.batch = batch
+        self.request = pool.submit([s for s in batch if s])
+
+    def get(self):
+        tagged = iter(self.request.wait())
+        return [next(tagged) if s else [] for s in self.batch]
+
+# the tagger of a tagging process, set before the pool forks
+_TAGGER = {}
+
+def _init_process(tagger=None):
+    if tagger is not None:
+        _TAGGER['tagger'] = tagger
+
+def _tag_in_process(batch):
+    return _tag_batch(_TAGGER['tagger'], batch)
+
+def tag_stream(tagger, sentences, batch_size=1000, processes=1,
+               max_pending=None):
+    """Yield the tagged sentences, in order, as their batches finish.
+
+       Parameters
+       ----------
+         tagger (TaggerI) : any tagger; a TaggerPool's workers are kept
+           busy by queueing several batches with it at once
+         sentences (iterable) : lists of tokens; empty ones stay empty
+         batch_size (int) : number of sentences tagged at once
+         processes (int) : number of processes to tag in (ignored for a
+           TaggerPool, which has its own workers)
+         max_pending (int) : number of batches in flight at once; defaults
+           to twice the number of workers or processes (one batch at a
+           time when tagging in this process)
+    """
+    pool = None
+    submit = None
+    if hasattr(tagger, 'submit'):
+        submit = lambda batch: _Submitted(tagger, batch)
+        workers = len(getattr(tagger, 'workers', ())) or 1
+    elif processes > 1:
+        _TAGGER['tagger'] = tagger
+        # forked workers inherit the tagger; others are sent a copy
+        initargs = (tagger,) if sys.platform == 'win32' else ()
+        pool = multiprocessing.Pool(processes, initializer=_init_process,
+                                    initargs=initargs)
+        submit = lambda batch: pool.apply_async(_tag_in_process, (batch,))
+        workers = processes
+    else:
+        submit = lambda batch: _Done(_tag_batch(tagger, batch))
+        workers = 0
+    if max_pending is None:
+        max_pending = max(2 * workers, 1)
+
+    pending = collections.deque()
+    try:
+        for batch in batches(sentences, batch_size=batch_size):
+            pending.append(submit(batch))
+            while len(pending) >= max_pending:
+                for tagged in pending.popleft().get():
+                    yield tagged
+        while pending:
+            for tagged in pending.popleft().get():
+                yield tagged
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _TAGGER.clear()
+
+def write_tagged(tagged_sents, stream, separator='_', encoding='utf-8',
+                 flush_every=1000):
+    """Write tagged sentences as 'word<separator>tag' lines to a stream.
+
+       Returns the number of sentences written.
+    """
+    count = 0
+    for count, sentence in enumerate(tagged_sents, 1):
+        stream.write(u' '.join(u'{}{}{}'.format(w, separator, t)
+                               for w, t in sentence).encode(encoding))
+        stream.write(b'\n')
+        if count % flush_every == 0:
+            stream.flush()
+    stream.flush()
+    return count
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Stand in for the Stanford MaxentTagger's stdin/stdout line protocol.
+
+   The stub reads one whitespace-tokenized sentence per line from stdin and
+   writes one tagged sentence per line to stdout, flushing after every line,
+   just like `MaxentTagger -model ... -sentenceDelimiter newline`. It lets
+   the worker pool (and anything else that drives the Java tagger) run on a
+   machine without Java:
+
+       python -m razmetka.tag.stub --model uyghurtagger.train
+"""
+
+import argparse
+import codecs
+import collections
+import sys
+
+def read_lexicon(file_name, separator='_', encoding='utf-8'):
+    """Return a dict mapping each word to its most frequent tag."""
+    counts = collections.defaultdict(collections.Counter)
+    with codecs.open(file_name, mode='r', encoding=encoding) as f:
+        for line in f:
+            for token in line.split():
+                word, _, tag = token.rpartition(separator)
+                if word:
+                    counts[word][tag] += 1
+    return dict((w, c.most_common(1)[0][0]) for w, c in counts.iteritems())
+
+def main(argv=None):
+    """Tag stdin line by line until it is closed."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--model', default=None,
+                        help='hand-tagged file to draw a lexicon from')
+    parser.add_argument('--tag', default='N',
+                        help='tag given to words missing from the lexicon')
+    parser.add_argument('--separator', default='_')
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--crash-after', type=int, default=None,
+                        help='exit abruptly after this many sentences')
+    args = parser.parse_args(argv)
+
+    lexicon = {}
+    if args.model is not None:
+        lexicon = read_lexicon(args.model, separator=args.separator,
+                               encoding=args.encoding)
+
+    tagged_count = 0
+    for line in iter(sys.stdin.readline, ''):
+        if args.crash_after is not None and tagged_count >= args.crash_after:
+            sys.exit(1)
+        words = line.decode(args.encoding).split()
+        output = u' '.join(u'{}{}{}'.format(w, args.separator,
+                                            lexicon.get(w, args.tag))
+                           for w in words)
+        sys.stdout.write(output.encode(args.encoding) + '\n')
+        sys.stdout.flush()
+        tagged_count += 1
+
+if __name__ == '__main__':
+    main()
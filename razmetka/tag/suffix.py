@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Guess the tags of unknown words from their endings.
+
+   Uyghur is suffixing, so the last few letters of a word say a good deal
+   about its part of speech. A SuffixTagger counts, over its training
+   data, the tags of every word ending of up to max_length letters, and
+   compiles the counts into a trie read from the end of the word: each
+   node holds the most frequent tag of its ending, or nothing if that is
+   the tag of the shorter ending it extends. Guessing a tag walks the trie
+   one letter at a time and keeps the last tag met, so it takes at most
+   max_length dictionary lookups and no regular expressions. Words with no
+   known ending get the most frequent tag of all.
+"""
+
+import collections
+
+from nltk.tag.sequential import SequentialBackoffTagger
+
+SUFFIX_LENGTH = 5
+"""Default length of the longest word ending a SuffixTagger learns."""
+
+def _best(counts):
+    """Return the most frequent tag of a Counter (ties by tag name)."""
+    return max(counts.iteritems(), key=lambda item: (item[1], item[0]))[0]
+
+class SuffixCounts(object):
+    """Tag counts of word endings, which can grow a slice at a time."""
+
+    def __init__(self, max_length=SUFFIX_LENGTH, min_count=1):
+        """Initialize the counts.
+
+           Parameters
+           ----------
+             max_length (int) : length of the longest ending counted
+             min_count (int) : number of times an ending must be seen
+               for the trie to keep it
+        """
+        self.max_length = max_length
+        self.min_count = min_count
+        self.tags = collections.Counter()
+        # ending: Counter of tags
+        self.endings = collections.defaultdict(collections.Counter)
+
+    def add(self, tagged_sents):
+        """Count the word endings of more training sentences."""
+        tags, endings = self.tags, self.endings
+        max_length = self.max_length
+        for sentence in tagged_sents:
+            for word, tag in sentence:
+                tags[tag] += 1
+                for n in xrange(1, min(len(word), max_length) + 1):
+                    endings[word[-n:]][tag] += 1
+
+    def trie(self):
+        """Compile the counts into a trie of (tag, {letter: node}) nodes.
+
+           The root's tag is the most frequent tag of all (None if nothing
+           was counted).
+        """
+        root = (_best(self.tags) if self.tags else None, {})
+        # shorter endings first, so each node's parent already exists
+        kept = {u'': root}
+        for ending in sorted(self.endings, key=len):
+            counts = self.endings[ending]
+            parent = kept.get(ending[1:])
+            if parent is None or sum(counts.itervalues()) < self.min_count:
+                continue
+            kept[ending] = node = [None, {}]
+            tag = _best(counts)
+            if tag != _effective(kept, ending[1:]):
+                node[0] = tag
+            parent[1][ending[0]] = node
+        return _freeze(root)
+
+    def tagger(self, backoff=None):
+        """Return a SuffixTagger with the counts so far."""
+        return SuffixTagger(trie=self.trie(), max_length=self.max_length,
+                            backoff=backoff)
+
+def _effective(kept, ending):
+    """Return the tag the trie gives an ending it holds."""
+    while True:
+        tag = kept[ending][0]
+        if tag is not None or not ending:
+            return tag
+        ending = ending[1:]
+
+def _freeze(node):
+    """Turn a trie of lists into one of tuples, dropping tagless leaves."""
+    children = {}
+    for letter, child in node[1].iteritems():
+        child = _freeze(child)
+        if child is not None:
+            children[letter] = child
+    if node[0] is None and not children:
+        return None
+    return (node[0], children)
+
+class SuffixTagger(SequentialBackoffTagger):
+    """Tag words by their endings (see the module docstring)."""
+
+    def __init__(self, train=None, max_length=SUFFIX_LENGTH, min_count=1,
+                 trie=None, backoff=None):
+        """Train the tagger, or build it from a trie.
+
+           Parameters
+           ----------
+             train (list) : tagged sentences to learn endings from
+             max_length (int) : length of the longest ending learned
+             min_count (int) : number of times an ending must be seen to
+               be learned
+             trie (tuple) : a trie from SuffixCounts.trie(), instead of
+               training data
+             backoff (TaggerI) : tagger for words the trie has no tag for
+               (only words when nothing was learned at all)
+        """
+        SequentialBackoffTagger.__init__(self, backoff)
+        if trie is None:
+            counts = SuffixCounts(max_length=max_length,
+                                  min_count=min_count)
+            counts.add(train or ())
+            trie = counts.trie()
+        self.max_length = max_length
+        self._trie = trie if trie is not None else (None, {})
+
+    def __repr__(self):
+        return '<SuffixTagger: max_length={}>'.format(self.max_length)
+
+    def guess(self, word):
+        """Return the tag of the longest known ending of a word."""
+        tag, children = self._trie
+        for letter in reversed(word[-self.max_length:]):
+            node = children.get(letter)
+            if node is None:
+                break
+            if node[0] is not None:
+                tag = node[0]
+            children = node[1]
+        return tag
+
+    def choose_tag(self, tokens, index, history):
+        return self.guess(tokens[index])
+
+    def table(self):
+        """Return the trie as a dict of ending: tag, for the tagged nodes.
+
+           The root's tag is under the ending u''.
+        """
+        table = {}
+        stack = [(u'', self._trie)]
+        while stack:
+            ending, (tag, children) = stack.pop()
+            if tag is not None:
+                table[ending] = tag
+            for letter, child in children.iteritems():
+                stack.append((letter + ending, child))
+        return table
+
+    @classmethod
+    def from_table(cls, table, max_length=SUFFIX_LENGTH, backoff=None):
+        """Rebuild a tagger from a table() (tags may be any values)."""
+        root = [table.get(u''), {}]
+        for ending, tag in table.iteritems():
+            node = root
+            for letter in reversed(ending):
+                node = node[1].setdefault(letter, [None, {}])
+            if ending:
+                node[0] = tag
+        return cls(trie=_freeze(root) or (None, {}), max_length=max_length,
+                   backoff=backoff)
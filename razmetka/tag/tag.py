@@ -36,6 +36,8 @@ class FilePair(object):
             self.props_name = '{}{}.props'.format(props, self.idx)
         # self.all_files = file_dict
         self.sep = separator
+        # settings of the last props file written, other than its paths
+        self.props_params = None
         self.prop_template = (
             "model = {p_model}\n"
             "trainFile = {p_train_file}\n"
@@ -53,7 +55,11 @@ class FilePair(object):
             tag_separator=None, encoding="UTF-8", verbose="true",
             verbose_results="true", tokenize="false", arch="generic",
             learn_closed_class_tags='', closed_class_tag_threshold=5):
-        """Write a props file to disk."""
+        """Write a props file to disk.
+
+           The settings written, other than the model and training file
+           paths, are kept in self.props_params (see ModelCache).
+        """
         if props_name == None:
             props_name = self.props_name
         if model == None:
@@ -73,3 +79,9 @@ class FilePair(object):
             )
         write_to_directory(dir_name=DATA_DIR_NAME, file_name=props_name,
                            a_string=output_string)
+        self.props_params = {
+            'tag_separator': tag_separator, 'encoding': encoding,
+            'verbose': verbose, 'verbose_results': verbose_results,
+            'tokenize': tokenize, 'arch': arch,
+            'learn_closed_class_tags': learn_closed_class_tags,
+            'closed_class_tag_threshold': closed_class_tag_threshold}
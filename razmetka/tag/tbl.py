@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Train Brill taggers with indexed, incremental rule scoring.
+
+   NLTK's BrillTaggerTrainer re-checks candidate rules against the corpus
+   every time it looks for the next best rule. IndexedBrillTrainer instead
+   keeps, in the style of fnTBL, an exact score for every candidate rule:
+
+     * E[rule] counts the tagging errors a rule would fix, and
+     * C[context] counts the correctly tagged positions a rule with that
+       context and original tag would break (whatever it changes them to),
+
+   so a rule's score is E[rule] - C[context]. When a rule is applied, only
+   positions whose context includes a changed tag have their counts taken
+   out and put back in; nothing else is rescored. Positions are indexed by
+   their current tag and by word, so finding where a rule applies never
+   scans the whole corpus.
+
+   Most positions are tagged correctly by a good initial tagger, and most
+   contexts belong to no rule that could ever win, so C is counted only
+   for the context of a rule that reaches the top of the queue on E
+   alone (its score can only go down from there), and kept up to date
+   from then on.
+
+   It takes the same NLTK templates (built from nltk.tag.brill.Word and
+   Pos features) and returns the same nltk.tag.BrillTagger as NLTK's
+   trainer. Ties between rules with equal scores are broken by their repr,
+   as NLTK does with deterministic=True, so both learn the same rules.
+"""
+
+import collections
+import heapq
+import itertools
+
+from nltk.tag.brill import BrillTagger, Pos, Word
+from nltk.tag.util import untag
+from nltk.tbl.rule import Rule
+
+class IndexedBrillTrainer(object):
+    """A drop-in replacement for nltk.tag.BrillTaggerTrainer."""
+
+    def __init__(self, initial_tagger, templates, trace=0,
+                 deterministic=True, ruleformat='str'):
+        """Construct a trainer from a baseline tagger and templates.
+
+           Parameters
+           ----------
+             initial_tagger (TaggerI) : the baseline tagger
+             templates (list) : nltk.tbl.Template objects whose features
+               are all nltk.tag.brill.Word or nltk.tag.brill.Pos
+             trace, deterministic, ruleformat : accepted for compatibility
+               with NLTK's trainer; ties are always broken
+               deterministically
+        """
+        self._initial_tagger = initial_tagger
+        self._templates = templates
+        self._trace = trace
+        # templates with the same features make equal rules (NLTK's Rule
+        # equality ignores the template id), so they share a signature
+        self._signatures = []
+        self._signature_templates = []
+        seen = {}
+        for template in templates:
+            features = template._features
+            for feature in features:
+                if not isinstance(feature, (Word, Pos)):
+                    raise ValueError('unsupported feature: {!r}'.format(
+                            feature))
+            signature = tuple((isinstance(f, Pos), tuple(f.positions))
+                              for f in features)
+            if signature not in seen:
+                seen[signature] = len(self._signatures)
+                self._signatures.append(signature)
+                self._signature_templates.append(template)
+        # offsets whose tags feed into some template's context
+        self._tag_offsets = sorted(set([0] + [
+            o for signature in self._signatures
+            for is_pos, positions in signature if is_pos
+            for o in positions]))
+
+    def train(self, train_sents, max_rules=200, min_score=2, min_acc=None):
+        """Train a Brill tagger on train_sents; see BrillTaggerTrainer.
+
+           Returns
+           -------
+             (BrillTagger) : the initial tagger plus the learned rules
+        """
+        test_sents = [list(self._initial_tagger.tag(untag(sent)))
+                      for sent in train_sents]
+        self._setup(train_sents, test_sents)
+
+        initial_errors = sum(1 for c, g in itertools.izip(self._cur,
+                                                          self._gold)
+                             if c != g)
+        token_count = len(self._gold)
+        rules = []
+        scores = []
+        while len(rules) < max_rules:
+            best = self._best_rule(min_score, min_acc)
+            if best is None:
+                break
+            rule, score = best
+            rules.append(self._nltk_rule(rule))
+            scores.append(score)
+            self._apply(rule)
+
+        final_errors = initial_errors - sum(scores)
+        trainstats = {
+            'min_acc': min_acc,
+            'min_score': min_score,
+            'tokencount': token_count,
+            'sequencecount': len(test_sents),
+            'templatecount': len(self._templates),
+            'rulescores': scores,
+            'initialerrors': initial_errors,
+            'initialacc': 1 - float(initial_errors) / max(token_count, 1),
+            'finalerrors': final_errors,
+            'finalacc': 1 - float(final_errors) / max(token_count, 1),
+            }
+        self._clean()
+        return BrillTagger(self._initial_tagger, rules, trainstats)
+
+    def _setup(self, train_sents, test_sents):
+        """Encode the corpus and count every position's contexts."""
+        self._words = []
+        self._gold = []
+        self._cur = []
+        self._start = []
+        self._end = []
+        self._word_ids = {}
+        self._tag_ids = {}
+        self._tag_names = []
+        self._word_names = []
+        for gold_sent, test_sent in itertools.izip(train_sents, test_sents):
+            start = len(self._gold)
+            end = start + len(gold_sent)
+            for (word, gold_tag), (_, tag) in itertools.izip(gold_sent,
+                                                             test_sent):
+                self._words.append(self._intern(word, self._word_ids,
+                                                self._word_names))
+                self._gold.append(self._intern(gold_tag, self._tag_ids,
+                                               self._tag_names))
+                self._cur.append(self._intern(tag, self._tag_ids,
+                                              self._tag_names))
+                self._start.append(start)
+                self._end.append(end)
+
+        self._tag_positions = collections.defaultdict(set)
+        self._word_positions = collections.defaultdict(list)
+        for q, (word, tag) in enumerate(itertools.izip(self._words,
+                                                       self._cur)):
+            self._tag_positions[tag].add(q)
+            self._word_positions[word].append(q)
+
+        self._fixes = {}        # rule: errors it would fix (always > 0)
+        self._breaks = {}       # context: correct tags (once tracked)
+        self._replacements = collections.defaultdict(set) # context: tags
+        self._scores = {}
+        self._heap = []
+        self._dirty = set()
+        self._nltk_rules = {}
+        # no context is tracked yet, so correct positions count for nothing
+        for q in xrange(len(self._gold)):
+            if self._cur[q] != self._gold[q]:
+                self._count(q, 1)
+        self._push_dirty()
+
+    def _clean(self):
+        """Drop the training tables."""
+        for name in ('_words', '_gold', '_cur', '_start', '_end',
+                     '_tag_positions', '_word_positions', '_fixes',
+                     '_breaks', '_replacements', '_scores', '_heap',
+                     '_dirty', '_nltk_rules'):
+            setattr(self, name, None)
+
+    @staticmethod
+    def _intern(item, ids, names):
+        try:
+            return ids[item]
+        except KeyError:
+            ids[item] = len(names)
+            names.append(item)
+            return ids[item]
+
+    def _contexts(self, q):
+        """Yield (signature, values) for each rule context at position q."""
+        start, end = self._start[q], self._end[q]
+        words, cur = self._words, self._cur
+        for s, signature in enumerate(self._signatures):
+            conditions = []
+            for is_pos, positions in signature:
+                column = cur if is_pos else words
+                values = [column[q + o] for o in positions
+                          if start <= q + o < end]
+                if not values:
+                    break
+                conditions.append(values)
+            else:
+                # a value seen at two positions still makes one rule
+                for values in set(itertools.product(*conditions)):
+                    yield s, values
+
+    def _count(self, q, sign):
+        """Add (sign=1) or remove (sign=-1) position q's contributions."""
+        tag, gold = self._cur[q], self._gold[q]
+        fixes, breaks = self._fixes, self._breaks
+        replacements, dirty = self._replacements, self._dirty
+        for s, values in self._contexts(q):
+            context = (s, tag, values)
+            if tag == gold:
+                if context in breaks:
+                    breaks[context] += sign
+                    for replacement in replacements.get(context, ()):
+                        dirty.add((s, tag, replacement, values))
+            else:
+                rule = (s, tag, gold, values)
+                count = fixes.get(rule, 0) + sign
+                if count:
+                    fixes[rule] = count
+                    replacements[context].add(gold)
+                else:
+                    del fixes[rule]
+                    replacements[context].discard(gold)
+                dirty.add(rule)
+
+    def _track(self, context):
+        """Count the correct tags a context's rules would break, from now."""
+        s, tag, values = context
+        cur, gold = self._cur, self._gold
+        rule = (s, tag, None, values)
+        self._breaks[context] = sum(
+                1 for q in self._candidates(rule)
+                if 0 <= q < len(cur) and cur[q] == gold[q] and
+                self._applies(rule, q))
+        for replacement in self._replacements.get(context, ()):
+            self._dirty.add((s, tag, replacement, values))
+
+    def _push_dirty(self):
+        """Rescore the rules whose counts changed.
+
+           A rule whose context isn't tracked yet is scored by its fixes
+           alone, an upper bound on its true score.
+        """
+        fixes, breaks, scores = self._fixes, self._breaks, self._scores
+        for rule in self._dirty:
+            if rule in fixes:
+                s, tag, replacement, values = rule
+                score = fixes[rule] - breaks.get((s, tag, values), 0)
+                if scores.get(rule) != score:
+                    scores[rule] = score
+                    heapq.heappush(self._heap, (-score, rule))
+            else:
+                scores.pop(rule, None)
+        self._dirty = set()
+        if len(self._heap) > 4 * len(scores) + 1024:
+            self._heap = [(-score, rule) for rule, score in
+                          scores.iteritems()]
+            heapq.heapify(self._heap)
+
+    def _best_rule(self, min_score, min_acc):
+        """Return (rule, score) for the next rule to learn, or None."""
+        heap, scores = self._heap, self._scores
+        while heap:
+            top = -heap[0][0]
+            if top < min_score or top <= 0:
+                return None
+            # every live rule with the top score, ordered as NLTK would
+            tied = set()
+            untracked = set()
+            while heap and -heap[0][0] == top:
+                score, rule = heapq.heappop(heap)
+                if scores.get(rule) == top:
+                    s, tag, replacement, values = rule
+                    if (s, tag, values) in self._breaks:
+                        tied.add(rule)
+                    else:
+                        untracked.add(rule)
+            if untracked:
+                # their scores were only bounds: score them exactly and
+                # look again
+                for s, tag, replacement, values in untracked:
+                    if (s, tag, values) not in self._breaks:
+                        self._track((s, tag, values))
+                self._push_dirty()
+                for rule in tied | untracked:
+                    if rule in scores:
+                        heapq.heappush(heap, (-scores[rule], rule))
+                heap = self._heap
+                continue
+            if not tied:
+                continue # only stale entries had that score
+            ranked = sorted(tied, key=lambda r: repr(self._nltk_rule(r)))
+            chosen = None
+            for rule in ranked:
+                if min_acc is None or self._accuracy(rule) >= min_acc:
+                    chosen = rule
+                    break
+            for rule in ranked:
+                heapq.heappush(heap, (-top, rule))
+            if chosen is not None:
+                return chosen, top
+            if min_acc is None:
+                return None
+            # every rule at this score is too inaccurate: look lower down,
+            # leaving them where they are for later iterations
+            self._heap = [entry for entry in heap if -entry[0] < top]
+            heapq.heapify(self._heap)
+            best = self._best_rule(min_score, min_acc)
+            for rule in ranked:
+                heapq.heappush(self._heap, (-top, rule))
+            return best
+        return None
+
+    def _accuracy(self, rule):
+        """Return fixed / (fixed + broken) for a rule."""
+        s, tag, replacement, values = rule
+        fixed = self._fixes.get(rule, 0)
+        broken = self._breaks.get((s, tag, values), 0)
+        return float(fixed) / (fixed + broken)
+
+    def _nltk_rule(self, rule):
+        """Return (and remember) the nltk Rule object for a rule key."""
+        try:
+            return self._nltk_rules[rule]
+        except KeyError:
+            s, tag, replacement, values = rule
+            template = self._signature_templates[s]
+            conditions = tuple(
+                (feature, (self._tag_names if isinstance(feature, Pos)
+                           else self._word_names)[value])
+                for feature, value in zip(template._features, values))
+            self._nltk_rules[rule] = Rule(template.id, self._tag_names[tag],
+                                          self._tag_names[replacement],
+                                          conditions)
+            return self._nltk_rules[rule]
+
+    def _applies(self, rule, q):
+        """Return True if rule would change the tag at position q."""
+        s, tag, replacement, values = rule
+        if self._cur[q] != tag:
+            return False
+        start, end = self._start[q], self._end[q]
+        for (is_pos, positions), value in zip(self._signatures[s], values):
+            column = self._cur if is_pos else self._words
+            for o in positions:
+                if start <= q + o < end and column[q + o] == value:
+                    break
+            else:
+                return False
+        return True
+
+    def _candidates(self, rule):
+        """Return the smallest indexed set of positions rule could fire at."""
+        s, tag, replacement, values = rule
+        best = self._tag_positions[tag]
+        for (is_pos, positions), value in zip(self._signatures[s], values):
+            if len(positions) != 1:
+                continue
+            index = self._tag_positions if is_pos else self._word_positions
+            hits = index.get(value, ())
+            if len(hits) < len(best):
+                o = positions[0]
+                best = [p - o for p in hits]
+        return best
+
+    def _apply(self, rule):
+        """Apply rule everywhere it fires and update the affected counts."""
+        s, tag, replacement, values = rule
+        changed = [q for q in self._candidates(rule)
+                   if 0 <= q < len(self._cur) and self._applies(rule, q)]
+        affected = set()
+        for p in changed:
+            start, end = self._start[p], self._end[p]
+            for o in self._tag_offsets:
+                if start <= p - o < end:
+                    affected.add(p - o)
+        for q in affected:
+            self._count(q, -1)
+        for p in changed:
+            self._cur[p] = replacement
+            self._tag_positions[tag].discard(p)
+            self._tag_positions[replacement].add(p)
+        for q in affected:
+            self._count(q, 1)
+        self._push_dirty()
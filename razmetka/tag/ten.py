@@ -3,6 +3,10 @@
 
 """Split a provided training file into ten parts for cross-validation."""
 
+import array
+import codecs
+import json
+import os
 import random
 import subprocess32
 
@@ -17,18 +21,152 @@ def chunks(l, n=10):
     for i in xrange(0, len(l), n):
         yield l[i:i+n]
 
-def create_groups(number_of_items, n=10):
-    """Create n random groups of equal length.
+def create_groups(number_of_items, n=10, seed=None):
+    """Create n random groups of (nearly) equal length.
+
+    Every item is placed in exactly one group; group lengths differ by
+    at most one.
 
     Parameters
     ----------
       number_of_items : int -- size of the thing we're splitting
       n : int               -- the number of groups we want
+      seed : hashable       -- seed for the shuffle (random if None)
     """
-    items = range(1, number_of_items)
-    group_length = number_of_items / n
-    random.shuffle(items)
-    return chunks(l=items, n=group_length)
+    return iter(FoldPlan.build(number_of_items, n=n, seed=seed).groups())
+
+class FoldPlan(object):
+    """Assignment of every sentence in a corpus to a cross-validation fold.
+
+       Folds are numbered from zero. Looking up the fold of a sentence is a
+       single array index, so a whole corpus can be split in one pass.
+    """
+
+    manifest_version = 1
+
+    def __init__(self, number_of_items, n=10, seed=None):
+        """Shuffle the sentence positions and deal them out to n folds.
+
+           Parameters
+           ----------
+             number_of_items (int) : number of sentences in the corpus
+             n (int) : number of folds
+             seed (int) : seed for the shuffle; the same seed, n and
+               number_of_items always produce the same plan. If None, a
+               seed is drawn at random (and recorded in the manifest).
+        """
+        if seed is None:
+            seed = random.SystemRandom().randint(0, 2**31 - 1)
+        self.number_of_items = number_of_items
+        self.number_of_groups = n
+        self.seed = seed
+        positions = range(number_of_items)
+        random.Random(seed).shuffle(positions)
+        self.assignments = array.array('I', [0]) * number_of_items
+        for rank, position in enumerate(positions):
+            self.assignments[position] = rank % n
+
+    @classmethod
+    def build(cls, number_of_items, n=10, seed=None):
+        """Return a new FoldPlan (an alias of the constructor)."""
+        return cls(number_of_items, n=n, seed=seed)
+
+    @classmethod
+    def from_file(cls, file_name, n=10, seed=None, encoding='utf-8'):
+        """Return a FoldPlan covering every line of a file."""
+        with codecs.open(file_name, mode='r', encoding=encoding) as f:
+            number_of_items = sum(1 for line in f)
+        return cls(number_of_items, n=n, seed=seed)
+
+    def __len__(self):
+        return self.number_of_items
+
+    def fold_of(self, position):
+        """Return the (zero-based) fold containing a sentence position."""
+        return self.assignments[position]
+
+    def groups(self):
+        """Return a list of n lists of sentence positions, one per fold."""
+        groups = [[] for i in xrange(self.number_of_groups)]
+        for position, fold in enumerate(self.assignments):
+            groups[fold].append(position)
+        return groups
+
+    def manifest(self):
+        """Return the plan as a small JSON-serializable dict."""
+        return {'version': self.manifest_version, 'seed': self.seed,
+                'number_of_groups': self.number_of_groups,
+                'number_of_items': self.number_of_items}
+
+    def save(self, path):
+        """Write the plan's manifest to a JSON file."""
+        with open(path, 'w') as f:
+            json.dump(self.manifest(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild a plan from a manifest written by save()."""
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != cls.manifest_version:
+            raise ValueError('unsupported fold manifest: {}'.format(path))
+        return cls(manifest['number_of_items'],
+                   n=manifest['number_of_groups'], seed=manifest['seed'])
+
+    def write_folds(self, sentences, dest_dir, test_name='test_',
+                    train_name='train_', starting_idx=1, encoding='utf-8',
+                    callback=None):
+        """Write every fold's test and training file in a single pass.
+
+           The test file for fold k holds the sentences in fold k; the
+           training file for fold k holds every other sentence. Files are
+           named like the ones BaseFile.split_groups() always produced,
+           e.g. test_01.txt and train_01.train.
+
+           Parameters
+           ----------
+             sentences (iterable) : (position, sentence) pairs, in any
+               order, e.g. BaseFile.sentences()
+             dest_dir (str) : directory the files are written to
+             callback (function) : called as callback(fold, position,
+               sentence) for every sentence written
+        """
+        try:
+            os.makedirs(dest_dir)
+        except OSError:
+            pass # destination directory already exists
+        n = self.number_of_groups
+        tests, trains = [], []
+        try:
+            for k in xrange(n):
+                idx = str(k + starting_idx).rjust(2, '0')
+                tests.append(codecs.open(
+                    os.path.join(dest_dir, '{}{}.txt'.format(test_name, idx)),
+                    mode='w', encoding=encoding))
+                trains.append(codecs.open(
+                    os.path.join(dest_dir,
+                                 '{}{}.train'.format(train_name, idx)),
+                    mode='w', encoding=encoding))
+            # sentences are newline-separated, without a trailing newline
+            test_started = [False] * n
+            train_started = [False] * n
+            for position, sentence in sentences:
+                fold = self.assignments[position]
+                if test_started[fold]:
+                    tests[fold].write(u'\n')
+                tests[fold].write(sentence)
+                test_started[fold] = True
+                for k in xrange(n):
+                    if k != fold:
+                        if train_started[k]:
+                            trains[k].write(u'\n')
+                        trains[k].write(sentence)
+                        train_started[k] = True
+                if callback is not None:
+                    callback(fold, position, sentence)
+        finally:
+            for f in tests + trains:
+                f.close()
 
 def train_single_tagger(jar_path, props_file):
     """Train a single POS tagger from a props file."""
@@ -1,15 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import codecs
 import os
+import time
 
 from nltk.tag.stanford import StanfordPOSTagger
 
+from razmetka.util import trace
+from razmetka.util.store import CorpusStore
+
+from . import ten
+from .backends import get_backend
 from .config import DATA_DIR_NAME, PATH_TO_DATA_DIR, PATH_TO_JAR
 from .files import TrainingFile, write_to_directory
 from .files import to_unicode_or_bust as tuob
-from .tag import FilePair
+from .modelcache import PATH_TO_MODEL_CACHE, ModelCache
+from .schedule import FoldScheduler
+from .score import FoldScorer
 from .train import train_tagger
 
 def repeat_tagger_tests(fname, number_of_tests=2, **kwargs):
@@ -27,7 +34,9 @@ class TaggerTester(object):
     def __init__(self, file_name, language='', test_name='test_',
                  train_name='train_', model_name='model_',
                  props_name='props_', separator='_', ws_delim=True,
-                 starting_idx=1, number_of_groups=10, encoding='utf-8'):
+                 starting_idx=1, number_of_groups=10, encoding='utf-8',
+                 cache_dir=PATH_TO_MODEL_CACHE, cache_size=4 * 1024 ** 3,
+                 trainer=train_tagger, backend='stanford'):
         """Initialize the test suite.
 
            Parameters
@@ -51,6 +60,16 @@ class TaggerTester(object):
              number_of_groups (int) : number of groups that the file will
                be split into for cross-validation
              encoding (str) : encoding of the input file
+             cache_dir (str) : directory where trained models are cached
+               between folds and runs (see ModelCache); None disables it
+             cache_size (int) : size limit of the cache, in bytes
+             trainer (function) : trains a model from a props file, as
+               train_tagger() does (e.g., stub_train_tagger() for runs
+               without Java)
+             backend (str / TaggerBackend) : what trains and runs each
+               fold's tagger: 'stanford' (MaxentTagger models, trained by
+               trainer) or 'perceptron' (an AveragedPerceptronTagger
+               trained in-process, without Java), or a TaggerBackend
         """
         self.file_name = file_name
         self.language = language
@@ -64,6 +83,15 @@ class TaggerTester(object):
         self.number_of_groups = number_of_groups
         self.encoding = encoding
         self.results_dict = {}
+        self.fold_plan = None
+        self.fold_times = {}
+        self.fold_scores = {}
+        self.wall_time = None
+        self.trainer = trainer
+        self.backend = get_backend(backend)
+        self.model_cache = None
+        if cache_dir is not None:
+            self.model_cache = ModelCache(cache_dir, max_bytes=cache_size)
 
         self.training_file = TrainingFile(
                 file_name=self.file_name, language=self.language,
@@ -72,68 +100,241 @@ class TaggerTester(object):
                 number_of_groups=self.number_of_groups,
                 encoding=self.encoding)
 
-    def split_groups(self, num_of_groups=None, verbose=False):
+    def split_groups(self, num_of_groups=None, verbose=False, seed=None):
         """Return random groupings of sentences in the main file."""
         if num_of_groups is None:
             num_of_groups = self.number_of_groups
-        self.training_file.split_groups(num_of_groups=num_of_groups,
-                                        verbose=verbose)
+        with trace.span('tester.split', groups=num_of_groups) as span:
+            self.fold_plan = self.training_file.split_groups(
+                    num_of_groups=num_of_groups, verbose=verbose, seed=seed,
+                    test_name=self.test_name, train_name=self.train_name)
+            span.set(sentences=len(self.fold_plan))
+        return self.fold_plan
 
     def contents(self, file_name=None):
-        """Return the contents of the main file."""
+        """Return the contents of the main file (as a CorpusStore)."""
         if file_name is None:
-            file_name = self.file_name
-        pass
+            return self.training_file.store
+        return CorpusStore(file_name, encoding=self.encoding)
 
     def estimate_tagger_accuracy(self, as_percent=True, verbose=False,
-                                 big_file=False):
-        """"""
-        for n in xrange(1, self.number_of_groups + 1):
-            # [matches, misses, total tokens, percent accuracy]
-            group_results = [0, 0, 0, 0]
-            str_idx = str(n).rjust(2, '0')
-            test_file = '{}{}.txt'.format(self.test_name, str_idx)
-            test_file_path = os.path.join(PATH_TO_DATA_DIR, test_file)
-            train_file = '{}{}.train'.format(self.train_name, str_idx)
-
-            fp = FilePair(idx=n, testfile=test_file, trainfile=train_file,
-                          separator=self.sep, props=self.props_name)
-            fp.write_props()
-
-            if big_file == False:
-                train_tagger(props_file=fp.props_name)
-            else:
-                train_tagger(props_file=fp.props_name, heap_size='-mx4g')
-
-            model_file = '{}{}.model'.format(self.model_name, str_idx)
-            model_path = os.path.join(PATH_TO_DATA_DIR, model_file)
-
-            uy = StanfordPOSTagger(model_path, PATH_TO_JAR)
-
-            with codecs.open(test_file_path, mode='r+',
-                             encoding=self.encoding) as f:
-                for s in [l[:-1] for l in f.readlines()]:
-                    sp = SentencePair(hand_tagged_sentence=s,
-                                      language=self.language,
-                                      separator=self.sep)
-                    tagged = sp.tag(model_name=model_path)
-                    # sp.compare_sentences(auto_tagged=tagged)
-                    sp.comparison()
-                    tup = sp.accuracy()
-                    group_results[0] += tup[0]
-                    group_results[1] += tup[1]
-                    group_results[2] += (tup[0]+tup[1])
-                    # sp.accuracy(as_percent=True)
-                group_results[3] = 100 * (float(group_results[0]) /
-                        group_results[2])
-                self.results_dict[n] = group_results
+                                 big_file=False, batch_size=None,
+                                 workers=None, parallel=1,
+                                 memory_budget=None):
+        """Train and test a tagger for each group of the cross-validation.
+
+           Parameters
+           ----------
+             verbose (boolean) : print each stage of each fold as it
+               finishes (unless a trace sink is already installed; see
+               razmetka.util.trace)
+             big_file (boolean) : start training the Java tagger with a
+               4 GB heap, instead of one sized from the fold's training
+               data (Stanford backend only)
+             batch_size (int) : maximum number of sentences passed to the
+               tagger in a single call. If None, each test file is tagged
+               all at once (i.e., with a single launch of the JVM).
+             workers (int) : if given, tag each test file with a TaggerPool
+               of this many warm tagger processes instead of a
+               StanfordPOSTagger (Stanford backend only)
+             parallel (int) : number of folds to train and test at once;
+               None means one per CPU
+             memory_budget (int / str) : total memory the concurrently
+               running folds may claim, e.g. '24g' (defaults to 80% of
+               physical memory); each fold's share comes from the backend
+        """
+        heap_size = '-mx4g' if big_file else None
+
+        def record(n, group_results, seconds):
+            self.results_dict[n] = group_results
+            self.fold_times[n] = seconds
+
+        def fold_job(n):
+            return lambda: self.run_fold(n, heap_size=heap_size,
+                                         batch_size=batch_size,
+                                         workers=workers)
+
+        scheduler = FoldScheduler(max_workers=parallel,
+                                  memory_budget=memory_budget)
+        jobs = [(n, self.backend.fold_memory(self, n, heap_size=heap_size,
+                                             workers=workers), fold_job(n))
+                for n in xrange(1, self.number_of_groups + 1)]
+        start = time.time()
+        with trace.printing(verbose == True):
+            with trace.span('tester.cross_validate',
+                            folds=self.number_of_groups, parallel=parallel,
+                            backend=self.backend.name):
+                scheduler.run(jobs, callback=record)
+        self.wall_time = time.time() - start
         return self.results_dict
 
-    def print_results(self, source_dict=None):
+    def run_fold(self, n, heap_size=None, batch_size=None, workers=None):
+        """Train a tagger on fold n's training file and score its test file.
+
+           Returns
+           -------
+             (list) : [matches, misses, total tokens, percent accuracy]
+        """
+        with trace.span('tester.fold', fold=n) as span:
+            results = self._run_fold(n, heap_size=heap_size,
+                                     batch_size=batch_size, workers=workers)
+            span.set(results=results)
+        return results
+
+    def _run_fold(self, n, heap_size=None, batch_size=None, workers=None):
+        """Do the work of run_fold()."""
+        str_idx = str(n).rjust(2, '0')
+        test_file = '{}{}.txt'.format(self.test_name, str_idx)
+        test_file_path = os.path.join(PATH_TO_DATA_DIR, test_file)
+        train_file = '{}{}.train'.format(self.train_name, str_idx)
+
+        with self.backend.tagger(self, n, heap_size=heap_size,
+                                 workers=workers) as tagger:
+            with trace.span('tester.known_words', fold=n):
+                scorer = FoldScorer(known_words=self.known_words(
+                        os.path.join(PATH_TO_DATA_DIR, train_file)))
+            self.fold_scores[n] = scorer
+            return self.evaluate_test_file(
+                    tagger=tagger, test_file_path=test_file_path,
+                    batch_size=batch_size, scorer=scorer)
+
+    def fold_training_sentences(self, n):
+        """Return fold n's training sentences as lists of (word, tag).
+
+           If the main file was split in this run, the sentences outside
+           fold n are read from it by the fold plan; otherwise the fold's
+           training file is read. Words and tags are split at the first
+           separator, as the test sentences are.
+        """
+        sep = self.sep
+
+        def parse(sentence):
+            return [tuple(w.split(sep, 1)) if sep in w else (w, None)
+                    for w in sentence.split()]
+
+        if self.fold_plan is not None:
+            fold = n - 1
+            assignments = self.fold_plan.assignments
+            return [parse(sentence) for position, sentence
+                    in self.training_file.sentences()
+                    if assignments[position] != fold and sentence.strip()]
+        train_file = '{}{}.train'.format(self.train_name,
+                                         str(n).rjust(2, '0'))
+        with CorpusStore(os.path.join(PATH_TO_DATA_DIR, train_file),
+                         encoding=self.encoding) as store:
+            return [parse(sentence) for sentence in store
+                    if sentence.strip()]
+
+    def known_words(self, train_file_path):
+        """Return the set of words in a hand-tagged training file."""
+        words = set()
+        sep = self.sep
+        with CorpusStore(train_file_path, encoding=self.encoding) as store:
+            for sentence in store:
+                words.update(w.split(sep, 1)[0] for w in sentence.split())
+        return words
+
+    def test_sentences(self, test_file_path, positions=None):
+        """Return a list of SentencePair objects from a hand-tagged file.
+
+           Parameters
+           ----------
+             test_file_path (str) : path to a file of hand-tagged sentences
+             positions (list) : line numbers of the sentences wanted; if
+               None, every non-empty line is used
+        """
+        with CorpusStore(test_file_path, encoding=self.encoding) as store:
+            if positions is None:
+                positions = [i for i in xrange(len(store))
+                             if store.token_count(i)]
+            return self._sentence_pairs(store, positions)
+
+    def _sentence_pairs(self, store, positions):
+        """Return SentencePair objects for lines of an open CorpusStore."""
+        return [SentencePair(hand_tagged_sentence=store[i],
+                             language=self.language, idx=i,
+                             separator=self.sep)
+                for i in positions]
+
+    def evaluate_test_file(self, tagger, test_file_path, batch_size=None,
+                           scorer=None):
+        """Tag a whole test file in batches and score the results.
+
+           Only one batch of sentences is held in memory at a time; the
+           tags themselves are kept, integer-encoded, in a FoldScorer.
+           Sentences the tagger returns with a different number of tokens
+           are left out of the totals and listed by the scorer.
+
+           Parameters
+           ----------
+             tagger (TaggerI) : a trained tagger with a tag_sents() method,
+               e.g., a StanfordPOSTagger
+             test_file_path (str) : path to a file of hand-tagged sentences
+             batch_size (int) : maximum number of sentences per call to
+               tagger.tag_sents(). If None, tag the file in a single call.
+             scorer (FoldScorer) : scorer to add the sentences to
+
+           Returns
+           -------
+             (list) : [matches, misses, total tokens, percent accuracy]
+        """
+        if scorer is None:
+            scorer = FoldScorer()
+        with CorpusStore(test_file_path, encoding=self.encoding) as store:
+            positions = [i for i in xrange(len(store))
+                         if store.token_count(i)]
+            if batch_size is None:
+                batch_size = max(len(positions), 1)
+            test_file = os.path.basename(test_file_path)
+            chunks = ten.chunks(positions, n=batch_size)
+            for number, chunk in enumerate(chunks):
+                batch = self._sentence_pairs(store, chunk)
+                with trace.span('tester.tag', test_file=test_file,
+                                batch=number) as span:
+                    # the Java tagger(s) are child processes
+                    span.watch(children=True)
+                    tagged_sents = tagger.tag_sents(
+                            [sp.auto_tagged for sp in batch])
+                    if span.enabled:
+                        span.set(sentences=len(batch), tokens=sum(
+                                len(sp.auto_tagged) for sp in batch))
+                with trace.span('tester.score', test_file=test_file,
+                                batch=number) as span:
+                    for sp, tagged in zip(batch, tagged_sents):
+                        sp.auto_tagged = tagged
+                        scorer.add_pair(sp)
+                    if span.enabled:
+                        span.set(sentences=len(batch),
+                                 tokens=sum(len(t) for t in tagged_sents))
+        with trace.span('tester.summarize', test_file=test_file,
+                        sentences=len(scorer)):
+            return scorer.score().results()
+
+    def score(self):
+        """Return a ScoreReport combining every scored fold."""
+        return FoldScorer.merge(
+                [v for k, v in sorted(self.fold_scores.iteritems())]).score()
+
+    def print_results(self, source_dict=None, detail=True, max_tags=20,
+                      max_confusions=10, confusion_matrix=False):
+        """Print the per-fold results, the totals and the score report.
+
+           Parameters
+           ----------
+             source_dict (dict) : fold number: [matches, misses, total,
+               percent]; defaults to the results of the last run
+             detail (boolean) : also print sentence, known/unknown word and
+               per-tag accuracy and the commonest confusions for all folds
+             max_tags, max_confusions, confusion_matrix : passed on to
+               ScoreReport.lines()
+        """
         if source_dict is None:
             source_dict = self.results_dict
-        for k, v in source_dict.iteritems():
-            print '{}\t{}'.format(k,v)
+        for k, v in sorted(source_dict.iteritems()):
+            if k in self.fold_times:
+                print '{}\t{}\t{:.1f}s'.format(k, v, self.fold_times[k])
+            else:
+                print '{}\t{}'.format(k,v)
         sum_hits = sum(v[0] for k, v in source_dict.iteritems())
         sum_misses = sum(v[1] for k, v in source_dict.iteritems())
         sum_length = sum(v[2] for k, v in source_dict.iteritems())
@@ -141,6 +342,18 @@ class TaggerTester(object):
         pct = float('{0:.2f}'.format(pct_unrounded))
         print "TOTALS:\t[{}, {}, {}, {}]\n".format(
                 sum_hits, sum_misses, sum_length, pct)
+        if self.wall_time:
+            fold_time = sum(self.fold_times.itervalues())
+            print "TIME:\t{:.1f}s for all folds, {:.1f}s elapsed " \
+                  "({:.2f}x speedup)\n".format(
+                        fold_time, self.wall_time,
+                        fold_time / self.wall_time)
+        if detail and self.fold_scores and source_dict is self.results_dict:
+            for line in self.score().lines(
+                    max_tags=max_tags, max_confusions=max_confusions,
+                    confusion_matrix=confusion_matrix):
+                print line
+            print
 
 class SentencePair(object):
     """Pair of sentences: one tagged by hand, one by a POS tagger."""
@@ -190,7 +403,18 @@ class SentencePair(object):
             sep = self.sep
         return [w.split(sep, 1)[0] for w in sentence]
 
-    def tag(self, model_name, sentence=None, jarpath=PATH_TO_JAR):
+    def split_training_tags(self, sentence=None, sep=None):
+        """Return the words and the tags of a hand-tagged sentence."""
+        if sentence is None:
+            sentence = self.hand_tagged
+        if sep is None:
+            sep = self.sep
+        split = [w.split(sep, 1) for w in sentence]
+        return ([parts[0] for parts in split],
+                [parts[1] if len(parts) > 1 else None for parts in split])
+
+    def tag(self, model_name, sentence=None, jarpath=PATH_TO_JAR,
+            tagger=None):
         """Tag a sentence by calling the StanfordPOSTagger.
 
            Parameters
@@ -199,11 +423,14 @@ class SentencePair(object):
                to tag the sentence. Located in the DATA_DIR, most likely.
              sentence (list) : the sentence to be tagged.
              jarpath (filepath) : path to the stanford-postagger.jar file
+             tagger (TaggerI) : an already running tagger to use instead of
+               a new StanfordPOSTagger, e.g., razmetka.tag.get_pool(model)
         """
         if sentence is None:
             sentence = self.auto_tagged
-        self.auto_tagged = StanfordPOSTagger(
-                model_name, jarpath).tag(sentence)
+        if tagger is None:
+            tagger = StanfordPOSTagger(model_name, jarpath)
+        self.auto_tagged = tagger.tag(sentence)
         return self.auto_tagged
 
     def compare_sentences(self, hand_tagged=None, auto_tagged=None):
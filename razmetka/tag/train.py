@@ -3,15 +3,94 @@
 
 """Train a part-of-speech tagger from provided training and props files."""
 
+import codecs
+import collections
 import os
+import shutil
+import sys
+import time
 import subprocess32
 
+from razmetka.util import trace
+from razmetka.util.memory import PeakSampler
+
 from .config import DATA_DIR_NAME, PATH_TO_DATA_DIR, PATH_TO_JAR
 
+OUT_OF_MEMORY = b'java.lang.OutOfMemoryError'
+"""What a JVM writes to stderr when its heap runs out."""
+
+TrainingRun = collections.namedtuple('TrainingRun', [
+    'returncode', 'heap_size', 'peak_rss', 'out_of_memory', 'seconds'])
+"""The outcome of training a model.
+
+   returncode (int) : exit status of the trainer (0 if it succeeded)
+   heap_size (str) : the Java heap option it ran with
+   peak_rss (int) : peak resident memory of the Java process, in bytes
+     (None if not measured)
+   out_of_memory (boolean) : the JVM ran out of heap
+   seconds (float) : time spent training
+"""
+
+class TrainingError(RuntimeError):
+    """Raised when a model could not be trained."""
+
 def train_tagger(props_file, heap_size='-mx1g', jar_path=PATH_TO_JAR):
-    """Train a part-of-speech tagger from a provided properties file."""
+    """Train a part-of-speech tagger from a provided properties file.
+
+       The Java process's resident memory is sampled while it runs, and
+       its stderr is passed on and watched for an OutOfMemoryError.
+
+       Returns
+       -------
+         (TrainingRun) : the exit status, peak memory and so on
+    """
     # we assume that the props file is in the 'datafiles' directory
     path_to_props = os.path.join(PATH_TO_DATA_DIR, props_file)
-    subprocess32.call(['java', heap_size, '-classpath', jar_path,
-                       'edu.stanford.nlp.tagger.maxent.MaxentTagger',
-                       '-props', path_to_props])
+    start = time.time()
+    with trace.span('train_tagger', props=props_file,
+                    heap_size=heap_size) as span:
+        proc = subprocess32.Popen(
+                ['java', heap_size, '-classpath', jar_path,
+                 'edu.stanford.nlp.tagger.maxent.MaxentTagger',
+                 '-props', path_to_props], stderr=subprocess32.PIPE)
+        sampler = PeakSampler(pids=lambda: [proc.pid], include_self=False,
+                              interval=0.1)
+        sampler.start()
+        out_of_memory = False
+        try:
+            for line in iter(proc.stderr.readline, b''):
+                sys.stderr.write(line)
+                if OUT_OF_MEMORY in line:
+                    out_of_memory = True
+            returncode = proc.wait()
+        finally:
+            peak_rss = sampler.stop()
+        span.set(returncode=returncode, peak_rss=peak_rss,
+                 out_of_memory=out_of_memory)
+    return TrainingRun(returncode=returncode, heap_size=heap_size,
+                       peak_rss=peak_rss, out_of_memory=out_of_memory,
+                       seconds=time.time() - start)
+
+def read_props(props_file):
+    """Return the settings of a props file as a dict."""
+    path_to_props = os.path.join(PATH_TO_DATA_DIR, props_file)
+    props = {}
+    with codecs.open(path_to_props, mode='r', encoding='utf-8') as f:
+        for line in f:
+            key, sep, value = line.partition('=')
+            if sep:
+                props[key.strip()] = value.strip()
+    return props
+
+def stub_train_tagger(props_file, heap_size='-mx1g', jar_path=PATH_TO_JAR):
+    """Stand in for train_tagger() without Java.
+
+       The "model" is a copy of the training file, which is what the stub
+       tagger (razmetka.tag.stub) draws its lexicon from.
+    """
+    props = read_props(props_file)
+    start = time.time()
+    with trace.span('train_tagger', props=props_file, stub=True):
+        shutil.copyfile(props['trainFile'], props['model'])
+    return TrainingRun(returncode=0, heap_size=heap_size, peak_rss=None,
+                       out_of_memory=False, seconds=time.time() - start)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-__all__ = ['to_unicode_or_bust']
+__all__ = ['to_unicode_or_bust', 'CorpusStore', 'TaggedSegmentedCorpusReader',
+           'DiskCache', 'ShardedStore', 'open_corpus']
 
 __version__ = '0.0.1'
 __author__ = 'Matthew Menzenski'
@@ -10,5 +11,8 @@ __author_email__ = 'menzenski@ku.edu'
 def get_version():
     return __version__
 
+from .cache import DiskCache
 from .corpus import TaggedSegmentedCorpusReader
+from .shards import ShardedStore, open_corpus
+from .store import CorpusStore
 from .util import to_unicode_or_bust
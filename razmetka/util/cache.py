@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Provide a size-bounded, content-addressed cache of files on disk."""
+
+import cPickle as pickle
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+
+def content_key(*parts):
+    """Return a hex digest identifying the given strings (or unicode)."""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, unicode):
+            part = part.encode('utf-8')
+        digest.update(str(len(part)))
+        digest.update(b':')
+        digest.update(part)
+    return digest.hexdigest()
+
+class DiskCache(object):
+    """A directory of cached entries, evicted least-recently-used first.
+
+       Each entry is one file named by its key. Entries are written to a
+       temporary file and renamed into place, so readers (including other
+       processes) never see a partly written entry. Reading an entry bumps
+       its modification time, which is what eviction orders by.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 ** 2):
+        """Initialize the cache.
+
+           Parameters
+           ----------
+             directory (str) : where entries are kept (created if needed)
+             max_bytes (int) : total size the entries may take up; the
+               least recently used are removed when it is exceeded
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def path(self, key):
+        """Return the path an entry is (or would be) stored at."""
+        return os.path.join(self.directory, key)
+
+    def get_path(self, key):
+        """Return the path of a cached entry, or None on a miss."""
+        path = self.path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put_file(self, key, source_path):
+        """Copy a file into the cache and return its cached path."""
+        handle, temp_path = tempfile.mkstemp(dir=self.directory,
+                                             prefix='.tmp-')
+        os.close(handle)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.rename(temp_path, self.path(key))
+        except Exception:
+            os.remove(temp_path)
+            raise
+        self.evict()
+        return self.path(key)
+
+    def get(self, key, default=None):
+        """Return the object cached under key, or default on a miss."""
+        path = self.get_path(key)
+        if path is None:
+            return default
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            # evicted by another process, or unreadable: treat as a miss
+            self.hits -= 1
+            self.misses += 1
+            return default
+
+    def put(self, key, obj):
+        """Pickle an object into the cache."""
+        handle, temp_path = tempfile.mkstemp(dir=self.directory,
+                                             prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self.path(key))
+        except Exception:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """Return (mtime, size, path) for every entry, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        """Return the total size in bytes of the cached entries."""
+        return sum(size for mtime, size, path in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits."""
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass # already removed by another process
+            total -= size
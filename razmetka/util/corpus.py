@@ -1,23 +1,289 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Provide corpora objects for part-of-speech tagging and segmentation."""
+"""Provide corpora objects for part-of-speech tagging and segmentation.
 
-import codecs
-import os
+   Tagged and segmented text has one sentence per line, and tokens like
+   'yégen+lik+ing+ge_Vt-NZR-POSS2si2-DAT': the word, its morphs separated
+   by '+', then the tag after the last '_'. Each file of a corpus is read
+   through a CorpusStore, whose index of sentence offsets is persisted
+   next to the file, so any sentence can be read without scanning the ones
+   before it, and sentences are only parsed when they are asked for.
+"""
 
-from nltk.corpus.reader import TaggedCorpusReader
+import bisect
+import functools
+import multiprocessing
 
-from .util import to_unicode_or_bust
+from nltk.collections import LazyConcatenation
+from nltk.corpus.reader.api import CorpusReader
 
-class TaggedSegmentedCorpusReader(TaggedCorpusReader):
+from .store import CorpusStore
+
+VIEWS = ('words', 'tagged', 'segmented', 'tagged_segmented')
+"""The ways a sentence can be parsed (see parse_sentence())."""
+
+def parse_token(token, view='tagged', sep='_', morph_sep='+'):
+    """Parse one 'morph+morph_TAG' token.
+
+       Parameters
+       ----------
+         token (unicode) : the token; one without a separator is a word
+           without a tag (None)
+         view (str) : what to return for the token:
+             'words' -- the word, without morph separators
+             'tagged' -- a (word, tag) tuple
+             'segmented' -- a tuple of the word's morphs
+             'tagged_segmented' -- a (tuple of morphs, tag) tuple
+         sep (unicode) : separator between the word and its tag
+         morph_sep (unicode) : separator between the morphs of the word
+    """
+    word, found, tag = token.rpartition(sep)
+    if not found:
+        word, tag = tag, None
+    if view == 'words' or view == 'tagged':
+        if morph_sep and len(word) > len(morph_sep):
+            word = word.replace(morph_sep, u'') or word
+        return word if view == 'words' else (word, tag)
+    morphs = None
+    if morph_sep:
+        morphs = tuple(m for m in word.split(morph_sep) if m)
+    if not morphs:
+        # a word that is nothing but separators (e.g., '+') is one morph
+        morphs = (word,)
+    return morphs if view == 'segmented' else (morphs, tag)
+
+def parse_sentence(line, view='tagged', sep='_', morph_sep='+'):
+    """Parse a line of tokens (see parse_token()) into a list."""
+    if view not in VIEWS:
+        raise ValueError('unknown view {!r} (expected one of {})'.format(
+                view, ', '.join(VIEWS)))
+    return [parse_token(token, view, sep, morph_sep)
+            for token in line.split()]
+
+class SentenceSequence(object):
+    """A read-only sequence of the parsed sentences of several files.
+
+       Holds nothing but the files' stores: sentence k is found through
+       their offset indexes and parsed when it is asked for (by
+       parse_sentence(), or by parse if given).
+    """
+
+    def __init__(self, stores, view='tagged', sep='_', morph_sep='+',
+                 parse=None):
+        self.stores = stores
+        if parse is None:
+            parse = functools.partial(parse_sentence, view=view, sep=sep,
+                                      morph_sep=morph_sep)
+        self.parse = parse
+        # index of the first sentence of each store, and the total
+        self.starts = [0]
+        for store in stores:
+            self.starts.append(self.starts[-1] + len(store))
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in xrange(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('sentence index out of range')
+        i = bisect.bisect_right(self.starts, key) - 1
+        return self.parse(self.stores[i][key - self.starts[i]])
+
+    def __iter__(self):
+        parse = self.parse
+        for store in self.stores:
+            for line in store:
+                yield parse(line)
+
+def _parse_chunk(job):
+    """Parse a range of sentences of one file (pool task)."""
+    path, encoding, index_name, start, stop, view, sep, morph_sep = job
+    with CorpusStore(path, encoding=encoding,
+                     index_name=index_name) as store:
+        return [parse_sentence(store[i], view, sep, morph_sep)
+                for i in xrange(start, stop)]
+
+def _index_file(job):
+    """Build (or check) and persist the index of one file (pool task)."""
+    path, encoding, index_name = job
+    with CorpusStore(path, encoding=encoding,
+                     index_name=index_name) as store:
+        return len(store)
+
+class TaggedSegmentedCorpusReader(CorpusReader):
     """A corpus reader for texts which are both tagged and segmented."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, root, fileids, sep='_', morph_sep='+',
+                 encoding='utf-8', index_names=None):
         """Initialize the TaggedSegmentedCorpusReader object.
 
            Parameters
            ----------
-             arg (type) :
+             root (str) : the directory of the corpus
+             fileids (list / str) : the files, or a regular expression
+               matching their paths relative to root
+             sep (unicode) : separator between words and their tags
+             morph_sep (unicode) : separator between the morphs of a word
+             encoding (str) : encoding of the files
+             index_names (function) : given the path of a file, return
+               where to persist its index (default: the path plus '.idx')
+        """
+        CorpusReader.__init__(self, root, fileids, encoding)
+        self._sep = sep
+        self._morph_sep = morph_sep
+        self._index_names = index_names
+        self._stores = {}
+
+    def _fileid_list(self, fileids):
+        if fileids is None:
+            return self._fileids
+        if isinstance(fileids, basestring):
+            return [fileids]
+        return fileids
+
+    def _path(self, fileid):
+        return self.abspath(fileid).path
+
+    def _index_name(self, path):
+        if self._index_names is None:
+            return None
+        return self._index_names(path)
+
+    def store(self, fileid):
+        """Return the CorpusStore of a file (opened on first use)."""
+        if fileid not in self._stores:
+            path = self._path(fileid)
+            self._stores[fileid] = CorpusStore(
+                    path, encoding=self.encoding(fileid),
+                    index_name=self._index_name(path))
+        return self._stores[fileid]
+
+    def sentences(self, fileids=None, view='tagged'):
+        """Return a lazy SentenceSequence of the files' sentences."""
+        if view not in VIEWS:
+            raise ValueError('unknown view {!r} (expected one of {})'.format(
+                    view, ', '.join(VIEWS)))
+        return SentenceSequence([self.store(f)
+                                 for f in self._fileid_list(fileids)],
+                                view, self._sep, self._morph_sep)
+
+    def raw(self, fileids=None):
+        """Return the text of the files as one unicode string."""
+        return u''.join(u'\n'.join(self.store(f)) + u'\n'
+                        for f in self._fileid_list(fileids)
+                        if len(self.store(f)))
+
+    def sents(self, fileids=None):
+        """Return the sentences as lists of words."""
+        return self.sentences(fileids, 'words')
+
+    def tagged_sents(self, fileids=None):
+        """Return the sentences as lists of (word, tag) tuples."""
+        return self.sentences(fileids, 'tagged')
+
+    def segmented_sents(self, fileids=None):
+        """Return the sentences as lists of tuples of morphs."""
+        return self.sentences(fileids, 'segmented')
+
+    def tagged_segmented_sents(self, fileids=None):
+        """Return the sentences as lists of (tuple of morphs, tag) tuples."""
+        return self.sentences(fileids, 'tagged_segmented')
+
+    def words(self, fileids=None):
+        return LazyConcatenation(self.sents(fileids))
+
+    def tagged_words(self, fileids=None):
+        return LazyConcatenation(self.tagged_sents(fileids))
+
+    def segmented_words(self, fileids=None):
+        return LazyConcatenation(self.segmented_sents(fileids))
+
+    def sentence_counts(self, fileids=None):
+        """Return the number of sentences of each file, in order."""
+        return [len(self.store(f)) for f in self._fileid_list(fileids)]
+
+    def build_indexes(self, fileids=None, processes=None):
+        """Build and persist the index of every file not yet indexed.
+
+           With several files, each is indexed in its own worker process
+           (one per CPU if processes is None).
+        """
+        fileids = self._fileid_list(fileids)
+        jobs = [(self._path(f), self.encoding(f),
+                 self._index_name(self._path(f)))
+                for f in fileids if f not in self._stores]
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(processes, len(jobs)))
+            try:
+                pool.map(_index_file, jobs)
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        # the indexes are on disk now: opening the stores just loads them
+        return self.sentence_counts(fileids)
+
+    def parse(self, fileids=None, view='tagged', processes=None,
+              chunk_size=10000):
+        """Parse every sentence of the files at once, in worker processes.
+
+           Each worker opens the files itself (the indexes are built first,
+           so it reads only the chunks it is given) and parses chunks of
+           chunk_size sentences; the sentences come back in corpus order.
+
+           Parameters
+           ----------
+             fileids (list) : the files (all of them if None)
+             view (str) : one of VIEWS (see parse_sentence())
+             processes (int) : number of worker processes (one per CPU if
+               None; 1 parses in this process)
+             chunk_size (int) : number of sentences parsed per task
+
+           Returns
+           -------
+             (list) : the parsed sentences
         """
-        super(TaggedSegmentedCorpusReader, self).__init__(*args, **kwargs)
+        if view not in VIEWS:
+            raise ValueError('unknown view {!r} (expected one of {})'.format(
+                    view, ', '.join(VIEWS)))
+        fileids = self._fileid_list(fileids)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        counts = self.build_indexes(fileids, processes=processes)
+        if processes <= 1:
+            return list(self.sentences(fileids, view))
+        jobs = []
+        for fileid, count in zip(fileids, counts):
+            path = self._path(fileid)
+            for start in xrange(0, count, chunk_size):
+                jobs.append((path, self.encoding(fileid),
+                             self._index_name(path), start,
+                             min(start + chunk_size, count), view,
+                             self._sep, self._morph_sep))
+        sentences = []
+        if len(jobs) <= 1:
+            for job in jobs:
+                sentences.extend(_parse_chunk(job))
+            return sentences
+        pool = multiprocessing.Pool(min(processes, len(jobs)))
+        try:
+            for chunk in pool.imap(_parse_chunk, jobs):
+                sentences.extend(chunk)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        return sentences
+
+    def close(self):
+        """Close the files' stores."""
+        for store in self._stores.itervalues():
+            store.close()
+        self._stores = {}
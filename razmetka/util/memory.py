@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Report how much memory a process (and its children) is using."""
+
+import os
+import resource
+import threading
+
+_PAGE_SIZE = resource.getpagesize()
+
+def rss_bytes(pid=None):
+    """Return the resident set size of a process (this one by default).
+
+       Read from /proc where there is one; otherwise, for this process
+       only, the peak resident size is returned instead. None if unknown.
+    """
+    path = '/proc/{}/statm'.format('self' if pid is None else pid)
+    try:
+        with open(path) as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (IOError, OSError, IndexError, ValueError):
+        pass
+    if pid is None or pid == os.getpid():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on OS X
+        return peak if os.uname()[0] == 'Darwin' else peak * 1024
+    return None
+
+def child_pids(pid=None):
+    """Return the ids of the running child processes of a process.
+
+       Found by reading /proc, so always empty where there is none.
+    """
+    if pid is None:
+        pid = os.getpid()
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(entry)) as f:
+                # "pid (command) state ppid ...": the command may hold spaces
+                fields = f.read().rpartition(')')[2].split()
+        except (IOError, OSError):
+            continue # the process has just exited
+        if len(fields) > 1 and int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+class PeakSampler(threading.Thread):
+    """Sample the total resident memory of some processes until stopped.
+
+       Usage:
+
+           sampler = PeakSampler(pids=lambda: [proc.pid])
+           sampler.start()
+           ...
+           peak = sampler.stop()
+    """
+
+    def __init__(self, pids=None, include_self=True, interval=0.01):
+        """Initialize the sampler (it starts sampling when started).
+
+           Parameters
+           ----------
+             pids (callable) : returns the ids of the processes to sample
+               (it is called for every sample, so they may change)
+             include_self (boolean) : count this process too
+             interval (float) : seconds between samples
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.pids = pids
+        self.include_self = include_self
+        self.interval = interval
+        self.peak = 0
+        self.finished = threading.Event()
+
+    def sample(self):
+        """Take one sample, updating the peak."""
+        total = (rss_bytes() or 0) if self.include_self else 0
+        for pid in (self.pids() if self.pids is not None else ()):
+            total += rss_bytes(pid) or 0
+        self.peak = max(self.peak, total)
+
+    def run(self):
+        while not self.finished.is_set():
+            self.sample()
+            self.finished.wait(self.interval)
+
+    def stop(self):
+        """Stop sampling and return the peak, in bytes."""
+        self.finished.set()
+        if self.is_alive():
+            self.join()
+        self.sample()
+        return self.peak
+
+def format_bytes(size):
+    """Return a size in bytes as a short human-readable string."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            break
+        size /= 1024.0
+    return '{:.1f} {}'.format(size, unit) if unit != 'B' else \
+           '{} B'.format(size)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Read a corpus kept as many (possibly compressed) one-sentence-per-line
+   shards as if it were one file.
+
+   Shards ending in '.gz', '.bz2' or '.xz' are decompressed as they are
+   read, never to disk. A compressed shard can't be memory-mapped, so its
+   number of sentences and their token counts are found in one pass and
+   kept in `<shard>.idx`, like a CorpusStore's index; indexes of several
+   shards are built in parallel worker processes. Reading sentence k of a
+   compressed shard decompresses the shard (which is then kept in memory
+   until another shard is read that way); reading in order just streams.
+"""
+
+import array
+import bisect
+import bz2
+import glob
+import gzip
+import io
+import multiprocessing
+import os
+import struct
+import sys
+
+import subprocess32
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+from .store import CorpusStore
+from .util import to_unicode_or_bust
+
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+def is_compressed(path):
+    """Return True if a file is read through a decompressor."""
+    return path.endswith(COMPRESSED_EXTENSIONS)
+
+def expand_shards(file_names):
+    """Return the shard paths named by a path, a glob, or a list of them.
+
+       Globs are expanded in sorted order, so the sentences of a corpus
+       always come in the same order; lists keep their order. The indexes
+       kept next to shards are never matched.
+    """
+    if isinstance(file_names, basestring):
+        file_names = [file_names]
+    paths = []
+    for name in file_names:
+        if glob.has_magic(name):
+            matches = sorted(m for m in glob.glob(name)
+                             if not m.endswith(('.idx', '.tmp')))
+            if not matches:
+                raise IOError('no files match {!r}'.format(name))
+            paths.extend(matches)
+        else:
+            paths.append(name)
+    return paths
+
+class _XZPipe(object):
+    """The output of `xz -dc`, for Pythons without an lzma module."""
+
+    def __init__(self, path):
+        self.proc = subprocess32.Popen(['xz', '-dc', path],
+                                       stdout=subprocess32.PIPE)
+
+    def __iter__(self):
+        return iter(self.proc.stdout)
+
+    def close(self):
+        self.proc.stdout.close()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+def open_compressed(path):
+    """Open a shard for reading (binary lines), decompressing as it goes."""
+    if path.endswith('.gz'):
+        return io.BufferedReader(gzip.open(path, 'rb'))
+    if path.endswith('.bz2'):
+        return bz2.BZ2File(path, 'rb')
+    if path.endswith('.xz'):
+        if lzma is not None:
+            return lzma.open(path, 'rb')
+        return _XZPipe(path)
+    return open(path, 'rb')
+
+class CompressedShard(object):
+    """A compressed one-sentence-per-line file, read like a CorpusStore."""
+
+    index_magic = b'RZMSHD01'
+    index_header = CorpusStore.index_header
+
+    def __init__(self, file_name, encoding='utf-8', index_name=None,
+                 cache_index=True):
+        """Open the shard and load (or build) its index.
+
+           Parameters
+           ----------
+             file_name (str) : name of the shard, with extension
+             encoding (str) : encoding of the text
+             index_name (str) : where to cache the index; defaults to the
+               file name plus '.idx'
+             cache_index (boolean) : write the index to disk
+        """
+        self.file_name = file_name
+        self.enc = encoding
+        if index_name is None:
+            index_name = file_name + '.idx'
+        self.index_name = index_name
+        stat = os.stat(file_name)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self._lines = None
+        if not self._load_index():
+            self._build_index()
+            if cache_index:
+                self._save_index()
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in xrange(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('sentence index out of range')
+        return to_unicode_or_bust(self.raw(key), self.enc)
+
+    def __iter__(self):
+        for line in self._raw_lines():
+            yield to_unicode_or_bust(line, self.enc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _raw_lines(self):
+        """Yield each line as undecoded bytes, without its newline."""
+        f = open_compressed(self.file_name)
+        try:
+            for line in f:
+                yield line.rstrip(b'\r\n')
+        finally:
+            f.close()
+
+    def raw(self, i):
+        """Return sentence i as undecoded bytes, without its newline."""
+        if self._lines is None:
+            self._lines = list(self._raw_lines())
+        return self._lines[i]
+
+    def token_count(self, i):
+        """Return the number of whitespace-separated tokens in sentence i."""
+        return self.tokens[i]
+
+    def total_tokens(self):
+        """Return the number of tokens in the whole shard."""
+        return sum(self.tokens)
+
+    def changed(self):
+        """Return True if the shard was modified since it was opened."""
+        stat = os.stat(self.file_name)
+        return stat.st_size != self.size or stat.st_mtime != self.mtime
+
+    def close(self):
+        """Drop the decompressed sentences kept for random access."""
+        self._lines = None
+
+    def _build_index(self):
+        """Count the tokens of every line in one pass."""
+        self.tokens = array.array('I')
+        for line in self._raw_lines():
+            self.tokens.append(len(line.split()))
+
+    def _load_index(self):
+        """Read a cached index, returning False if it is stale or absent."""
+        try:
+            with open(self.index_name, 'rb') as f:
+                header = f.read(self.index_header.size)
+                magic, order, itemsize, mtime, size, count = \
+                    self.index_header.unpack(header)
+                if (magic != self.index_magic or mtime != self.mtime or
+                        size != self.size or order != sys.byteorder[0] or
+                        itemsize != array.array('I').itemsize):
+                    return False
+                self.tokens = array.array('I')
+                self.tokens.fromfile(f, count)
+        except (IOError, OSError, EOFError, struct.error):
+            return False
+        return True
+
+    def _save_index(self):
+        """Write the index next to the shard (skipped if read-only)."""
+        temp_name = '{}.{}.tmp'.format(self.index_name, os.getpid())
+        try:
+            with open(temp_name, 'wb') as f:
+                f.write(self.index_header.pack(
+                    self.index_magic, sys.byteorder[0],
+                    self.tokens.itemsize, self.mtime, self.size,
+                    len(self)))
+                self.tokens.tofile(f)
+            os.rename(temp_name, self.index_name)
+        except (IOError, OSError):
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+
+def open_shard(file_name, encoding='utf-8'):
+    """Return a CorpusStore, or a CompressedShard for a compressed file."""
+    if is_compressed(file_name):
+        return CompressedShard(file_name, encoding=encoding)
+    return CorpusStore(file_name, encoding=encoding)
+
+def _index_shard(job):
+    """Build (or check) the index of one shard (pool task)."""
+    file_name, encoding = job
+    with open_shard(file_name, encoding=encoding) as shard:
+        return len(shard)
+
+def _parse_shard(job):
+    """Parse every sentence of one shard (pool task)."""
+    file_name, encoding, parse = job
+    with open_shard(file_name, encoding=encoding) as shard:
+        return [parse(line) for line in shard]
+
+def _pool_map(function, jobs, processes):
+    """Yield function(job) for each job, in order, from worker processes."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield function(job)
+        return
+    pool = multiprocessing.Pool(min(processes, len(jobs)))
+    try:
+        for result in pool.imap(function, jobs):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class ShardedStore(object):
+    """The sentences of several shards, as one sequence.
+
+       Supports what a CorpusStore does (len(), indexing, iteration,
+       token_count(), total_tokens()), numbering sentences across shards
+       in order.
+    """
+
+    def __init__(self, file_names, encoding='utf-8', processes=None):
+        """Open the shards, indexing them in parallel where needed.
+
+           Parameters
+           ----------
+             file_names (str / list) : a path, a glob, or a list of them
+               (see expand_shards())
+             encoding (str) : encoding of the shards
+             processes (int) : number of worker processes used to index
+               and parse shards (one per CPU if None)
+        """
+        self.file_names = file_names
+        self.enc = encoding
+        self.processes = processes
+        self.paths = expand_shards(file_names)
+        jobs = [(path, encoding) for path in self.paths]
+        if len(jobs) > 1:
+            # build missing indexes side by side; opening then loads them
+            for _ in _pool_map(_index_shard, jobs, processes):
+                pass
+        self.shards = [open_shard(path, encoding=encoding)
+                       for path in self.paths]
+        self._decompressed = None
+        self.starts = [0]
+        for shard in self.shards:
+            self.starts.append(self.starts[-1] + len(shard))
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def _locate(self, i):
+        """Return the shard holding sentence i, and its number there."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('sentence index out of range')
+        n = bisect.bisect_right(self.starts, i) - 1
+        return self.shards[n], i - self.starts[n]
+
+    def _read(self, i):
+        """Return the shard holding sentence i, ready to be indexed."""
+        shard, i = self._locate(i)
+        if shard is not self._decompressed:
+            # keep at most one compressed shard decompressed in memory
+            if self._decompressed is not None:
+                self._decompressed.close()
+            self._decompressed = None
+            if isinstance(shard, CompressedShard):
+                self._decompressed = shard
+        return shard, i
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in xrange(*key.indices(len(self)))]
+        shard, i = self._read(key)
+        return shard[i]
+
+    def __iter__(self):
+        for shard in self.shards:
+            for sentence in shard:
+                yield sentence
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def raw(self, i):
+        """Return sentence i as undecoded bytes, without its newline."""
+        shard, i = self._read(i)
+        return shard.raw(i)
+
+    def token_count(self, i):
+        """Return the number of whitespace-separated tokens in sentence i."""
+        shard, i = self._locate(i)
+        return shard.token_count(i)
+
+    def total_tokens(self):
+        """Return the number of tokens in all the shards."""
+        return sum(shard.total_tokens() for shard in self.shards)
+
+    def parsed(self, parse, processes=None):
+        """Yield parse(sentence) for every sentence, in order.
+
+           Shards are parsed in worker processes (as many as the store was
+           opened with, unless processes is given), so parse must be a
+           module-level function (or a functools.partial of one).
+        """
+        if processes is None:
+            processes = self.processes
+        jobs = [(path, self.enc, parse) for path in self.paths]
+        for sentences in _pool_map(_parse_shard, jobs, processes):
+            for sentence in sentences:
+                yield sentence
+
+    def changed(self):
+        """Return True if a shard was modified, added or removed."""
+        try:
+            return (expand_shards(self.file_names) != self.paths or
+                    any(shard.changed() for shard in self.shards))
+        except (IOError, OSError):
+            return True
+
+    def close(self):
+        """Close every shard."""
+        for shard in self.shards:
+            shard.close()
+
+def open_corpus(file_names, encoding='utf-8', processes=None):
+    """Open a corpus given as a file, a glob, or a list of shards.
+
+       A single uncompressed file is opened as a CorpusStore; anything
+       else as a ShardedStore.
+    """
+    paths = expand_shards(file_names)
+    if len(paths) == 1 and not is_compressed(paths[0]):
+        return CorpusStore(paths[0], encoding=encoding)
+    return ShardedStore(file_names, encoding=encoding, processes=processes)
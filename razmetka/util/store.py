@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Provide lazy, memory-mapped access to one-sentence-per-line corpora."""
+
+import array
+import mmap
+import os
+import struct
+import sys
+
+from .util import to_unicode_or_bust
+
+class CorpusStore(object):
+    """Random access to the sentences (lines) of a memory-mapped file.
+
+       The byte offset of every line and its number of tokens are found
+       once and cached in `<file_name>.idx`, next to the file. The cache is
+       rebuilt whenever the file's size or modification time changes.
+       Sentences are only decoded when they are asked for.
+    """
+
+    index_magic = b'RZMIDX01'
+    index_header = struct.Struct('<8s1sBdQQ')
+
+    def __init__(self, file_name, encoding='utf-8', index_name=None,
+                 cache_index=True):
+        """Open the file and load (or build) its line index.
+
+           Parameters
+           ----------
+             file_name (str) : name of the file, with extension
+             encoding (str) : encoding of the file
+             index_name (str) : where to cache the index; defaults to the
+               file name plus '.idx'
+             cache_index (boolean) : write the index to disk (if False, it
+               is rebuilt every time the store is opened)
+        """
+        self.file_name = file_name
+        self.enc = encoding
+        if index_name is None:
+            index_name = file_name + '.idx'
+        self.index_name = index_name
+        self.cache_index = cache_index
+        self._file = open(file_name, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        else:
+            # an empty file can't be memory-mapped
+            self._map = b''
+        if not self._load_index():
+            self._build_index()
+            if self.cache_index:
+                self._save_index()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in xrange(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('sentence index out of range')
+        return to_unicode_or_bust(self.raw(key), self.enc)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def raw(self, i):
+        """Return sentence i as undecoded bytes, without its newline."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self._map[start:end].rstrip(b'\r\n')
+
+    def token_count(self, i):
+        """Return the number of whitespace-separated tokens in sentence i."""
+        return self.tokens[i]
+
+    def total_tokens(self):
+        """Return the number of tokens in the whole file."""
+        return sum(self.tokens)
+
+    def parsed(self, parse, processes=None):
+        """Yield parse(sentence) for every sentence, in order.
+
+           (processes is accepted for compatibility with ShardedStore; a
+           single file is parsed in this process.)
+        """
+        for sentence in self:
+            yield parse(sentence)
+
+    def changed(self):
+        """Return True if the file was modified since it was opened."""
+        stat = os.stat(self.file_name)
+        return stat.st_size != self.size or stat.st_mtime != self.mtime
+
+    def close(self):
+        """Release the memory map and the underlying file."""
+        if self._map:
+            self._map.close()
+        self._map = b''
+        self._file.close()
+
+    def _build_index(self):
+        """Find the start of every line and count its tokens."""
+        self.offsets = array.array('L', [0])
+        self.tokens = array.array('I')
+        data = self._map
+        start = 0
+        while start < self.size:
+            end = data.find(b'\n', start)
+            end = self.size if end == -1 else end + 1
+            self.offsets.append(end)
+            self.tokens.append(len(data[start:end].split()))
+            start = end
+
+    def _load_index(self):
+        """Read a cached index, returning False if it is stale or absent."""
+        try:
+            with open(self.index_name, 'rb') as f:
+                header = f.read(self.index_header.size)
+                magic, order, itemsize, mtime, size, count = \
+                    self.index_header.unpack(header)
+                if (magic != self.index_magic or mtime != self.mtime or
+                        size != self.size or order != sys.byteorder[0] or
+                        itemsize != array.array('L').itemsize):
+                    return False
+                self.offsets = array.array('L')
+                self.offsets.fromfile(f, count + 1)
+                self.tokens = array.array('I')
+                self.tokens.fromfile(f, count)
+        except (IOError, OSError, EOFError, struct.error):
+            return False
+        return True
+
+    def _save_index(self):
+        """Write the index next to the file (silently skipped if read-only)."""
+        temp_name = '{}.{}.tmp'.format(self.index_name, os.getpid())
+        try:
+            with open(temp_name, 'wb') as f:
+                f.write(self.index_header.pack(
+                    self.index_magic, sys.byteorder[0],
+                    self.offsets.itemsize, self.mtime, self.size,
+                    len(self)))
+                self.offsets.tofile(f)
+                self.tokens.tofile(f)
+            os.rename(temp_name, self.index_name)
+        except (IOError, OSError):
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
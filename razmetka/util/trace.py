@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Record where the time of a long run goes, as a stream of spans.
+
+   A stage of work is marked with a span:
+
+       from razmetka.util import trace
+
+       with trace.span('train_tagger', fold=3) as span:
+           proc = subprocess32.Popen(...)
+           span.watch(proc.pid)
+           proc.wait()
+           span.set(tokens=n)
+
+   When the block ends, the span is handed to the current sink as an event
+   (a dict): its name, fields, wall time, CPU time of this process and of
+   the child processes it waited for, the peak resident memory of any
+   watched processes, and the id of the span it was nested in (ids are
+   numbered per process, and events carry the pid). JSONLinesSink writes
+   each event as one line of JSON; TextSink prints a readable line, and is
+   what `verbose` options use. Any object with an `enabled` attribute and
+   an `emit(event)` method can be a sink.
+
+   No sink is installed by default, and span() then returns one shared
+   span that does nothing, so instrumented code costs next to nothing.
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+from .memory import PeakSampler, child_pids, format_bytes
+
+class NullSink(object):
+    """A sink that is switched off: spans are not even measured."""
+
+    enabled = False
+
+    def emit(self, event):
+        pass
+
+class JSONLinesSink(object):
+    """Write each event as a line of JSON to a file or stream."""
+
+    enabled = True
+
+    def __init__(self, target):
+        """Initialize the sink.
+
+           Parameters
+           ----------
+             target (str / file) : a path, appended to, or an open stream.
+               Each event is written (and flushed) as a single line, so
+               processes forked while the sink is installed may share it.
+        """
+        if isinstance(target, basestring):
+            target = open(target, 'a')
+        self.stream = target
+        self.lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event, sort_keys=True) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+class TextSink(object):
+    """Print each event as a line of text (stdout by default)."""
+
+    enabled = True
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def emit(self, event):
+        fields = ' '.join('{}={}'.format(k, v)
+                          for k, v in sorted(event['fields'].iteritems()))
+        if 'child_peak_rss' in event:
+            fields += ' child_peak_rss={}'.format(
+                    format_bytes(event['child_peak_rss']))
+        if 'error' in event:
+            fields += ' error={}'.format(event['error'])
+        line = '{:<24} {:>8.2f}s {:>8.2f}s cpu  {}\n'.format(
+                event['span'], event['wall'], event['cpu'], fields)
+        with self.lock:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write(line)
+            stream.flush()
+
+_SINK = NullSink()
+_IDS = itertools.count(1)
+_LOCAL = threading.local()
+
+def get_sink():
+    """Return the sink spans are currently sent to."""
+    return _SINK
+
+def set_sink(sink):
+    """Send spans to a sink (None switches them off); return the old one."""
+    global _SINK
+    previous = _SINK
+    _SINK = sink if sink is not None else NullSink()
+    return previous
+
+def enabled():
+    """Return True if spans are being recorded."""
+    return _SINK.enabled
+
+@contextlib.contextmanager
+def using(sink):
+    """Send spans to a sink for the duration of a `with` block."""
+    previous = set_sink(sink)
+    try:
+        yield sink
+    finally:
+        set_sink(previous)
+
+def printing(verbose):
+    """Print spans during a `with` block if verbose and none are recorded.
+
+       Used for `verbose` options: a sink already installed is left alone.
+    """
+    if verbose and not enabled():
+        return using(TextSink())
+    return using(_SINK)
+
+class _NullSpan(object):
+    """The span given out when no sink is enabled."""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **fields):
+        pass
+
+    def watch(self, pid=None, children=False, interval=0.1):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def _seconds(difference):
+    """Round a difference of os.times() (which may be a hair below 0)."""
+    return max(round(difference, 6), 0.0)
+
+class Span(object):
+    """A timed stage of work, sent to a sink when it ends."""
+
+    enabled = True
+
+    def __init__(self, sink, name, fields):
+        self.sink = sink
+        self.name = name
+        self.fields = fields
+        self.id = next(_IDS)
+        self.samplers = []
+
+    def __enter__(self):
+        stack = getattr(_LOCAL, 'stack', None)
+        if stack is None:
+            stack = _LOCAL.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.id)
+        self.start = time.time()
+        self.times = os.times()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        times = os.times()
+        wall = time.time() - self.start
+        _LOCAL.stack.pop()
+        event = {'span': self.name, 'id': self.id, 'parent': self.parent,
+                 'pid': os.getpid(), 'start': self.start, 'wall': wall,
+                 'cpu': _seconds(times[0] + times[1] -
+                                 self.times[0] - self.times[1]),
+                 'child_cpu': _seconds(times[2] + times[3] -
+                                       self.times[2] - self.times[3]),
+                 'fields': self.fields}
+        if self.samplers:
+            event['child_peak_rss'] = max(s.stop() for s in self.samplers)
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        self.sink.emit(event)
+        return False
+
+    def set(self, **fields):
+        """Add fields (e.g., tokens=...) to the span's event."""
+        self.fields.update(fields)
+
+    def watch(self, pid=None, children=False, interval=0.1):
+        """Sample the memory of another process until the span ends.
+
+           Parameters
+           ----------
+             pid (int) : the process to watch (e.g., a Java tagger)
+             children (boolean) : watch every child process of this one
+               instead, e.g. those a library starts out of sight
+             interval (float) : seconds between samples
+        """
+        if children:
+            pids = child_pids
+        else:
+            pids = lambda: [pid]
+        sampler = PeakSampler(pids=pids, include_self=False,
+                              interval=interval)
+        sampler.start()
+        self.samplers.append(sampler)
+
+def span(name, **fields):
+    """Return a span (a context manager) for a named stage of work.
+
+       Parameters
+       ----------
+         name (str) : the stage, e.g. 'tester.train_tagger'
+         fields : anything else to record (JSON-serializable), e.g. fold=3
+    """
+    sink = _SINK
+    if not sink.enabled:
+        return _NULL_SPAN
+    return Span(sink, name, fields)
@@ -10,6 +10,10 @@ setup(
     license='MIT',
     description='Train and test a part-of-speech tagger',
     install_requires=['subprocess32'],
+    extras_require={'fast': ['numpy']},
+    entry_points={
+        'console_scripts': ['razmetka = razmetka.cli:main'],
+        },
     url='https://github.com/menzenski/tagger-tester',
     author='Matt Menzenski',
     author_email='matt.menzenski@gmail.com'
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Run the benchmark on a small corpus and compare it with the baseline."""
+
+import copy
+import json
+import os
+import unittest
+
+from razmetka.bench import compare, run
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'bench_baseline.json')
+
+class BenchmarkTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # the settings of bench_baseline.json, which was written by
+        # python -m razmetka.bench --tokens 10000 --output ...
+        cls.results = run(tokens=10000)
+        with open(BASELINE) as f:
+            cls.baseline = json.load(f)
+
+    def test_stages(self):
+        stages = self.results['stages']
+        self.assertEqual(set(stages), set(self.baseline['stages']))
+        for name, record in stages.iteritems():
+            self.assertTrue(record['seconds'] > 0, name)
+            self.assertTrue(record['repeats'] >= 1, name)
+        self.assertTrue(self.results['reference_speed'] > 0)
+
+    def test_against_baseline(self):
+        # generous, as the test may share the machine with anything
+        self.assertEqual(compare(self.results, self.baseline,
+                                 tolerance=0.5), [])
+
+    def test_against_itself(self):
+        self.assertEqual(compare(self.results, self.results), [])
+
+    def test_regression(self):
+        baseline = copy.deepcopy(self.results)
+        # the longest stage, which is long enough to be timed
+        name = max(baseline['stages'],
+                   key=lambda name: baseline['stages'][name]['seconds'])
+        record = baseline['stages'][name]
+        record['tokens_per_second'] *= 3
+        record['peak_rss'] //= 3
+        regressions = compare(self.results, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith(name + ':') for r in regressions))
+
+    def test_settings_must_match(self):
+        baseline = dict(self.baseline, seed=1)
+        self.assertRaises(ValueError, compare, self.results, baseline)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Test the model cache with the Java-free stub trainer."""
+
+import codecs
+import os
+import shutil
+import tempfile
+import unittest
+
+from razmetka.tag.modelcache import ModelCache
+from razmetka.tag.train import stub_train_tagger
+
+PROPS_PARAMS = {'arch': 'generic', 'tagSeparator': '_'}
+
+class ModelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='razmetka-test-')
+        self.model_cache = ModelCache(os.path.join(self.directory, 'cache'))
+        self.model = os.path.join(self.directory, 'model_01.model')
+        self.trained = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, text):
+        """Write a file in the test directory and return its path."""
+        path = os.path.join(self.directory, name)
+        with codecs.open(path, mode='w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def train(self, train_file, props_params=PROPS_PARAMS):
+        """Put a model for train_file in place; return True on a hit."""
+        # an absolute path is used as it is, not looked up in datafiles
+        props = self.write('model.props', u'model = {}\ntrainFile = {}\n'
+                           .format(self.model, train_file))
+
+        def train():
+            self.trained.append(train_file)
+            return stub_train_tagger(props)
+
+        return self.model_cache.train(train_file, props_params, self.model,
+                                      train)
+
+    def test_hit(self):
+        train_file = self.write('train01.train', u'Men_PN1s ._PUNCT\n')
+        self.assertFalse(self.train(train_file))
+        os.remove(self.model)
+        self.assertTrue(self.train(train_file))
+        self.assertEqual(self.trained, [train_file])
+        self.assertEqual((self.model_cache.hits, self.model_cache.misses),
+                         (1, 1))
+        with codecs.open(self.model, mode='r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), u'Men_PN1s ._PUNCT\n')
+
+    def test_training_file_changed(self):
+        train_file = self.write('train01.train', u'Men_PN1s ._PUNCT\n')
+        self.train(train_file)
+        self.write('train01.train', u'Sen_PN2si ._PUNCT\n')
+        self.assertFalse(self.train(train_file))
+        self.assertEqual(len(self.trained), 2)
+        with codecs.open(self.model, mode='r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), u'Sen_PN2si ._PUNCT\n')
+
+    def test_props_params_changed(self):
+        train_file = self.write('train01.train', u'Men_PN1s ._PUNCT\n')
+        self.train(train_file)
+        self.assertFalse(self.train(train_file, dict(PROPS_PARAMS,
+                                                     arch='left3words')))
+        self.assertEqual(len(self.trained), 2)
+        # and the original settings are still cached
+        self.assertTrue(self.train(train_file))
+
+    def test_eviction(self):
+        text = u'{}_N ._PUNCT\n'
+        paths = [self.write('train{:02}.train'.format(i),
+                            text.format(word))
+                 for i, word in enumerate([u'at', u'it', u'ot'])]
+        size = len(text.format(u'at'))
+        self.model_cache = ModelCache(os.path.join(self.directory, 'small'),
+                                      max_bytes=2 * size)
+        cache = self.model_cache.cache
+        self.train(paths[0])
+        self.train(paths[1])
+        # make the order of use unambiguous, whatever the clock resolution
+        os.utime(cache.path(self.model_cache.key(paths[0], PROPS_PARAMS)),
+                 (1000, 1000))
+        os.utime(cache.path(self.model_cache.key(paths[1], PROPS_PARAMS)),
+                 (2000, 2000))
+        self.assertTrue(self.train(paths[0]))
+        self.train(paths[2])
+        self.assertEqual(len(cache.entries()), 2)
+        self.assertTrue(cache.size() <= 2 * size)
+        self.assertTrue(self.train(paths[0]))
+        self.assertTrue(self.train(paths[2]))
+        # the least recently used model was evicted
+        self.assertFalse(self.train(paths[1]))
+        self.assertEqual(self.trained, [paths[0], paths[1], paths[2],
+                                        paths[1]])
+
+if __name__ == '__main__':
+    unittest.main()
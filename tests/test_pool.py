@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Test the tagger pool against the Java-free stub tagger."""
+
+import codecs
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from razmetka.tag.pool import TaggerPool, TaggerWorkerError, stub_command
+
+class TaggerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='razmetka-test-')
+        self.model = os.path.join(self.directory, 'lexicon.train')
+        with codecs.open(self.model, mode='w', encoding='utf-8') as f:
+            f.write(u'Men_PN1s kitab_N oqudum_Vt-PST ._PUNCT\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def sentences(self, n):
+        """Return n sentences, each of which can be told from the others."""
+        return [[u'Men', u'kitab', u'w{}'.format(i), u'.']
+                for i in xrange(n)]
+
+    def test_tag_sents(self):
+        with TaggerPool(self.model, command=stub_command(self.model)) as pool:
+            self.assertEqual(
+                    pool.tag_sents([[u'Men', u'kitab', u'oqudum', u'.'],
+                                    []]),
+                    [[(u'Men', u'PN1s'), (u'kitab', u'N'),
+                      (u'oqudum', u'Vt-PST'), (u'.', u'PUNCT')], []])
+            self.assertEqual(pool.tag([u'yéngi']), [(u'yéngi', u'N')])
+
+    def test_order_across_workers(self):
+        sentences = self.sentences(200)
+        with TaggerPool(self.model, num_workers=3, batch_size=7,
+                        command=stub_command(self.model)) as pool:
+            tagged = pool.tag_sents(sentences)
+        self.assertEqual([[w for w, t in s] for s in tagged], sentences)
+        self.assertEqual(tagged[5][2], (u'w5', u'N'))
+
+    def test_restart_after_crash(self):
+        command = stub_command(self.model) + ['--crash-after', '4']
+        sentences = self.sentences(10)
+        with TaggerPool(self.model, batch_size=3, max_retries=2,
+                        command=command) as pool:
+            tagged = pool.tag_sents(sentences)
+            self.assertTrue(pool.restarts() > 0)
+        self.assertEqual([[w for w, t in s] for s in tagged], sentences)
+
+    def test_crash_beyond_retries(self):
+        command = stub_command(self.model) + ['--crash-after', '0']
+        with TaggerPool(self.model, max_retries=1, command=command) as pool:
+            self.assertRaises(TaggerWorkerError, pool.tag_sents,
+                              self.sentences(2))
+
+    def test_worker_cannot_start(self):
+        pool = TaggerPool(self.model, command=[os.path.join(
+                self.directory, 'no-such-java')])
+        result = {}
+
+        def tag():
+            try:
+                pool.tag_sents(self.sentences(1))
+            except TaggerWorkerError as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=tag)
+        thread.daemon = True
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive(), 'tag_sents() hung')
+        self.assertIn('error', result)
+        # the worker's thread survives to serve (and fail) the next batch
+        self.assertRaises(TaggerWorkerError, pool.tag_sents,
+                          self.sentences(1))
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main()